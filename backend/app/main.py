@@ -1,11 +1,32 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import honda
+from app.services.browser_pool import browser_pool
+from app.services.download_engine import download_engine
+from app.services.tiered_fetch import tiered_fetcher
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pool de conexiones compartido para todas las descargas
+    await download_engine.start()
+    # Navegadores calientes solo si algún origen quedó recordado como "browser"
+    # (en segundo plano: Chrome tarda); con HTTP suficiente no se lanza Chrome
+    warm_up = None
+    if tiered_fetcher.expects_browser():
+        warm_up = asyncio.create_task(asyncio.to_thread(browser_pool.warm))
+    yield
+    await download_engine.close()
+    if warm_up:
+        await warm_up
+    await asyncio.to_thread(browser_pool.close)
 
 app = FastAPI(
     title="Honda 360° Extractor API",
     description="Sistema de extracción de imágenes 360° para Honda City - Paths CORREGIDOS",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan
 )
 
 # ✅ ARREGLAR CORS - SOPORTE COMPLETO
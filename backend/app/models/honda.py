@@ -21,7 +21,9 @@ class TileInfo(BaseModel):
     url: str
     level: int
     column: Optional[int] = None  # Para Object2VR (exterior)
+    row: Optional[int] = None     # Para Object2VR con varias filas
     face: Optional[int] = None    # Para Pano2VR (interior)
+    tile_path: Optional[str] = None  # Path relativo según el patrón del XML (clave del manifest)
     x: int
     y: int
     downloaded: bool = False
@@ -33,6 +35,29 @@ class ExtractionRequest(BaseModel):
     view_type: ViewType = Field(..., description="Tipo de vista a extraer") 
     quality_level: int = Field(0, description="Nivel de calidad (0=máxima, 2=mínima)")
     download_path: Optional[str] = Field(None, description="Path personalizado de descarga")
+    sync_mode: str = Field("resume", description="resume = saltar lo verificado, incremental = revalidar con ETag/If-Modified-Since")
+    ordering: str = Field("progressive", description="progressive = nivel más grueso primero, sequential = orden del plan")
+    hedge: bool = Field(False, description="Pedir dos veces los tiles más lentos que el p95 del job")
+    max_bandwidth_mbps: Optional[float] = Field(None, gt=0, description="Tope de ancho de banda del job en megabits/s")
+    shards: int = Field(1, ge=1, description="Procesos worker entre los que se reparten columnas/caras")
+
+class BatchItem(BaseModel):
+    """Combinación año / vista / calidad dentro de un batch"""
+    year: HondaYear
+    view_type: ViewType
+    quality_level: int = Field(0, ge=0)
+
+class BatchExtractionRequest(BaseModel):
+    """Request de /batch: lista explícita de items o matriz years x view_types x quality_levels"""
+    items: Optional[List[BatchItem]] = None
+    years: List[HondaYear] = []
+    view_types: List[ViewType] = [ViewType.EXTERIOR, ViewType.INTERIOR]
+    quality_levels: List[int] = [0]
+    sync_mode: str = "resume"
+    ordering: str = "progressive"
+    hedge: bool = False
+    max_bandwidth_mbps: Optional[float] = Field(None, gt=0, description="Tope de ancho de banda de todo el batch en megabits/s")
+    shards: int = Field(1, ge=1, description="Procesos worker por item")
 
 class ExtractionResponse(BaseModel):
     """Response de estado de extracción"""
@@ -43,7 +68,11 @@ class ExtractionResponse(BaseModel):
     total_tiles: int
     downloaded_tiles: int = 0
     failed_tiles: int = 0
+    unchanged_tiles: int = 0  # Revalidados con 304 (modo incremental)
     progress_percentage: float = 0.0
+    preview_ready: bool = False  # Nivel más grueso completo: el viewer ya es usable
+    preview_ready_at: Optional[str] = None
+    preview_error: Optional[str] = None  # Nivel más grueso con tiles fallidos/faltantes
     estimated_time_remaining: Optional[int] = None  # segundos
     created_at: str
     completed_at: Optional[str] = None
@@ -57,6 +86,10 @@ class TileExtractionStats(BaseModel):
     total_size_mb: float
     download_time_seconds: float
     average_speed_mbps: float
+    concurrency_curve: Optional[List[Dict[str, Any]]] = None  # Límites AIMD usados en el tiempo
+    resumed_tiles: int = 0  # Tiles ya verificados en disco (no descargados)
+    unchanged_tiles: int = 0  # Revalidados con 304 (modo incremental)
+    retries: int = 0  # Reintentos (backoff) hechos durante la descarga
 
 class HondaCityModel(BaseModel):
     """Modelo completo Honda City con toda la información"""
@@ -102,3 +135,5 @@ class ConfigInfo(BaseModel):
     levels: int
     max_resolution: Dict[str, int]
     tile_pattern: str
+    level_sizes: List[Dict[str, int]] = []  # width/height de cada nivel (0 = máxima)
+    tile_size: Optional[int] = None         # tilesize declarado en el XML
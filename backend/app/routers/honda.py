@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from fastapi.responses import FileResponse, HTMLResponse
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import uuid
 from datetime import datetime
 from pathlib import Path
@@ -10,22 +10,64 @@ import asyncio
 import aiohttp
 import aiofiles
 import json
-import requests
-from concurrent.futures import ThreadPoolExecutor
-from app.services.honda_selenium_extractor import extract_honda_assets_with_selenium
+from app.services.browser_pool import browser_pool
+from app.services.honda_selenium_extractor import extract_honda_assets_with_selenium, publish_viewer_assets
+from app.services.tiered_fetch import TIER_BROWSER, fetch_viewer_assets, remember_browser_results, tiered_fetcher
+from app.services.download_engine import get_download_engine
+from app.services.scheduler import download_scheduler
+from app.services.rate_limit import BUDGET_KEYS
+from app.services.honda_service import HondaCityExtractor
+from app.models.honda import BatchExtractionRequest
+from app.services.tile_plan import (
+    build_tile_plan, counts_usable, plan_levels, tile_groups, ORDER_PROGRESSIVE, ORDER_SEQUENTIAL
+)
+from app.services.sharding import SHARD_SETTINGS, run_sharded_extraction
+from app.services.job_queue import get_shard_queue
+from app.services.tile_downloader import TileDownloader, TileProgress, extraction_headers
+from app.services.concurrency import AdaptiveConcurrencyController
+from app.services.pipeline import BoundedPipeline
+from app.services.network_capture import load_network_manifest
+from app.services.manifest import TileManifest, MANIFEST_FILENAME, SYNC_RESUME, SYNC_INCREMENTAL
 
 router = APIRouter()
 
 # Storage en memoria para extracciones activas 
 active_extractions: Dict[str, dict] = {}
 
+# Batches: cada item es además una extracción normal en active_extractions
+active_batches: Dict[str, dict] = {}
+
+BATCH_SETTINGS = {
+    "max_items": 64,            # Items por batch
+    "max_parallel_items": 2     # Extracciones del batch corriendo a la vez (cada una abre Selenium)
+}
+
+# Estado de un item en /batch-list (nombres que espera verificar_batch_status.py)
+BATCH_JOB_STATUS = {
+    "pending": "queued",
+    "in_progress": "processing",
+    "completed": "completed",
+    "failed": "failed"
+}
+
 # MODELOS ADAPTADOS SIMPLES (sin dependencias externas)
 class ExtractionRequest:
-    def __init__(self, year: str, view_type: str, quality_level: int = 0, download_path: Optional[str] = None):
+    def __init__(self, year: str, view_type: str, quality_level: int = 0, download_path: Optional[str] = None,
+                 sync_mode: str = SYNC_RESUME, ordering: str = ORDER_PROGRESSIVE, hedge: bool = False,
+                 max_bandwidth_mbps: Optional[float] = None, shards: int = 1):
         self.year = year
         self.view_type = view_type
         self.quality_level = quality_level
         self.download_path = download_path
+        self.sync_mode = sync_mode
+        self.ordering = ordering
+        self.hedge = hedge
+        self.max_bandwidth_mbps = max_bandwidth_mbps
+        self.shards = shards
+
+def throughput_mbps(transferred_bytes: int, seconds: float) -> float:
+    """Megabits/s transferidos (misma unidad que max_bandwidth_mbps)"""
+    return round(transferred_bytes * 8 / 1_000_000 / seconds, 2) if seconds > 0 else 0.0
 
 class ExtractionResponse:
     def __init__(self, **kwargs):
@@ -100,137 +142,155 @@ async def process_honda_files_for_local_system(honda_original_path: Path, system
         print(f"[ERROR] Error procesando archivos Honda: {e}")
 
 # FUNCIÓN DE DESCARGA DUAL (Honda Original + Sistema Funcional)
-async def perform_extraction(extraction_id: str, year: str, view_type: str, quality_level: int, download_path: Optional[str]):
+def extraction_base_url(year: str, view_type: str) -> str:
+    return f"https://www.honda.mx/web/img/cars/models/city/{year}/city_{year}_{view_type[:3]}_360"
+
+def create_extraction_dirs(year: str, view_type: str, quality_level: int = 0) -> Tuple[Path, Path]:
+    """
+    Crear honda_original/ (copia exacta) y la estructura Sistema; devuelve (honda_original, sistema)
+    Cada calidad > 0 tiene carpetas y manifest propios (su plan numera images/ distinto);
+    los tiles comunes entre calidades no ocupan disco extra (hardlinks del blob store)
     """
-    EXTRACCIÓN MASIVA BASADA EN DATOS REALES CONFIRMADOS
-    - Interior: 6 caras × 2 niveles × 2 columnas × 2 tiles = 48 archivos exactos
-    - Exterior: 32 columnas × 2 tiles + assets = 68 archivos exactos
-    - Descarga paralela con 4 hilos
+    base_path = Path(f"downloads/honda_city_{year}")
+    
+    # Estructura Honda Original (copia exacta)
+    honda_original_base = base_path / "honda_original" / f"ViewType.{view_type.upper()}"
+    if quality_level:
+        # Hermana (no subcarpeta): publish_viewer_assets sube dos niveles hasta base_path
+        honda_original_base = honda_original_base.with_name(f"{honda_original_base.name}_Q{quality_level}")
+    honda_original_base.mkdir(parents=True, exist_ok=True)
+    (honda_original_base / "assets").mkdir(exist_ok=True)
+    (honda_original_base / "tiles").mkdir(exist_ok=True)
+    
+    # Estructura Sistema (optimizada para tu uso)
+    system_base = base_path / f"ViewType.{view_type.upper()}"
+    if quality_level:
+        system_base = system_base / str(quality_level)  # Mismo layout que publish_viewer_assets
+    system_base.mkdir(parents=True, exist_ok=True)
+    (system_base / "assets").mkdir(exist_ok=True)
+    (system_base / "images").mkdir(exist_ok=True)
+    return honda_original_base, system_base
+
+def shard_spec(extraction_id: str, year: str, view_type: str, config, levels: List[int],
+               honda_original_base: Path, system_base: Path, ordering: str, incremental: bool,
+               hedge: bool, max_bandwidth_mbps: Optional[float]) -> dict:
+    """Todo lo que un worker (proceso local o nodo de la cola) necesita para descargar su shard"""
+    return {
+        "extraction_id": extraction_id,
+        "year": year,
+        "view_type": view_type,
+        "config_content": config.content,
+        "config_url": config.url,
+        "levels": levels,
+        "base_url": extraction_base_url(year, view_type),
+        "headers": extraction_headers(year),
+        "honda_original_base": str(honda_original_base),
+        "system_base": str(system_base),
+        "manifest_path": str(honda_original_base / MANIFEST_FILENAME),
+        "ordering": ordering,
+        "incremental": incremental,
+        "hedge": hedge,
+        "max_bandwidth_mbps": max_bandwidth_mbps
+    }
+
+async def perform_extraction(extraction_id: str, year: str, view_type: str, quality_level: int, download_path: Optional[str],
+                             sync_mode: str = SYNC_RESUME, ordering: str = ORDER_PROGRESSIVE,
+                             hedge: bool = False, max_bandwidth_mbps: Optional[float] = None,
+                             job_id: Optional[str] = None, shards: int = 1):
+    """
+    EXTRACCIÓN MASIVA BASADA EN LA CONFIGURACIÓN REAL
+    - Plan de tiles derivado del XML (niveles quality_level..más grueso, tiles de borde incluidos)
+    - Descarga asíncrona sobre el pool compartido (DownloadEngine)
+    - Concurrencia adaptativa AIMD según el comportamiento del CDN
     - Estructura dual: Honda Original + Sistema Optimizado
+    - Manifest durable: una re-ejecución solo descarga lo que falta o falló
+    - sync_mode="incremental": revalida tiles existentes con ETag/If-Modified-Since
+    - ordering="progressive": nivel más grueso primero y preview_ready en el registro
+    - hedge=True: tiles más lentos que el p95 del job se piden dos veces (gana el primero)
+    - max_bandwidth_mbps: tope de megabits/s del job (el reporte compara real vs tope)
+    - job_id: turno en el planificador y tope de ancho de banda compartidos (batch);
+      por defecto la extracción es su propio job
+    - shards > 1: el plan se reparte por columnas/caras entre procesos worker (ver sharding)
+    - Assets del viewer por HTTP; Selenium solo ante firmas de bloqueo (ver tiered_fetch)
     """
     
+    manifest = None
+    extraction_started = datetime.now()
+    owns_job = job_id is None
+    job_id = job_id or extraction_id
+    
     try:
         print(f"[EXTRACCION] INICIANDO EXTRACCION MASIVA CON DATOS REALES: {extraction_id}")
         active_extractions[extraction_id]["status"] = "in_progress"
+        active_extractions[extraction_id]["started_at"] = extraction_started.isoformat()
         
         # URLs CORRECTAS PROBADAS
-        base_url = f"https://www.honda.mx/web/img/cars/models/city/{year}/city_{year}_{view_type[:3]}_360"
+        base_url = extraction_base_url(year, view_type)
         print(f"[URL] URL Base: {base_url}")
         
-        # GENERAR LISTA DE ARCHIVOS BASADA EN DATOS REALES
-        files_to_download = []
-        
-        if view_type == "interior":
-            print("[INTERIOR] Generando lista INTERIOR (6 caras x 2 niveles x 2 columnas x 2 tiles = 48 archivos)...")
-            # DATOS REALES: 6 caras x 2 niveles x 2 columnas x 2 tiles = 48 archivos
-            for cf in range(6):  # cf_0 a cf_5
-                for l in [1, 2]:  # SOLO l_1 y l_2 (como en datos reales)
-                    for c in range(2):  # c_0 y c_1
-                        for tile in range(2):  # tile_0.jpg y tile_1.jpg
-                            file_path = f"tiles/node1/cf_{cf}/l_{l}/c_{c}/tile_{tile}.jpg"
-                            files_to_download.append(file_path)
-        
-        else:  # exterior
-            print("[EXTERIOR] Generando lista EXTERIOR (32 columnas x 2 tiles + assets = 68 archivos)...")
-            # DATOS REALES: 32 columnas x 2 tiles = 64 archivos
-            for col in range(32):  # column_00 a column_31
-                for tile in range(2):  # tile_0_0.jpg y tile_0_1.jpg
-                    file_path = f"exterior_level_2/column_{col:02d}/tile_0_{tile}.jpg"
-                    files_to_download.append(file_path)
-            
+        # GENERAR PLAN DE TILES DESDE LA CONFIGURACIÓN REAL (pano.xml / Object2VR XML)
+        # Solo se piden los tiles que la grilla de cada nivel declara (incluye bordes)
+        async with HondaCityExtractor() as extractor:
+            config = await extractor.get_config(year, view_type)
+        levels = plan_levels(config, quality_level)
+        # Plan compacto (arrays de enteros); paths y URLs se generan bajo demanda
+        tile_plan = build_tile_plan(year, view_type, config, levels)
+        print(f"[PLAN] {config.technology}: niveles {levels} -> {len(tile_plan)} tiles")
+        
+        assets = []
+        if view_type != "interior":
             # Assets que SÍ existen según datos reales
             assets = ["config.xml", "viewer.html", "assets/object2vr_player.js", "assets/skin.js"]
-            files_to_download.extend(assets)
         
-        total_files = len(files_to_download)
+        total_files = len(tile_plan) + len(assets)
         active_extractions[extraction_id]["total_tiles"] = total_files
         
         print(f"[LISTA] LISTA GENERADA: {total_files} archivos para descargar")
         
-        # CREAR ESTRUCTURA DE CARPETAS COMPLETA
-        base_path = Path(f"downloads/honda_city_{year}")
-        
-        # Estructura Honda Original (copia exacta)
-        honda_original_base = base_path / "honda_original" / f"ViewType.{view_type.upper()}"
-        honda_original_base.mkdir(parents=True, exist_ok=True)
-        (honda_original_base / "assets").mkdir(exist_ok=True)
-        (honda_original_base / "tiles").mkdir(exist_ok=True)
-        (honda_original_base / "exterior_level_2").mkdir(exist_ok=True)
+        # CREAR ESTRUCTURA DE CARPETAS COMPLETA (Honda Original + Sistema)
+        honda_original_base, system_base = create_extraction_dirs(year, view_type, quality_level)
         
-        # Estructura Sistema (optimizada para tu uso)
-        system_base = base_path / f"ViewType.{view_type.upper()}"
-        system_base.mkdir(parents=True, exist_ok=True)
-        (system_base / "assets").mkdir(exist_ok=True)
-        (system_base / "images").mkdir(exist_ok=True)
+        # MANIFEST DURABLE: permite reanudar saltando tiles ya verificados en disco
+        manifest = await asyncio.to_thread(TileManifest.load, honda_original_base / MANIFEST_FILENAME)
+        manifest.extraction_id = extraction_id
         
         # HEADERS OPTIMIZADOS
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-            'Accept-Language': 'es-MX,es;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Referer': f'https://www.honda.mx/web/img/cars/models/city/{year}/',
-            'Connection': 'keep-alive',
-            'Sec-Fetch-Dest': 'image',
-            'Sec-Fetch-Mode': 'no-cors',
-            'Sec-Fetch-Site': 'same-origin'
-        }
+        headers = extraction_headers(year)
         
-        # PROCESO DE DESCARGA MASIVA CON THREADS
-        downloaded = 0
-        failed = 0
-        skipped = 0
-        successful_files = []
+        # PROCESO DE DESCARGA MASIVA ASÍNCRONA (pool compartido del DownloadEngine)
+        progress = TileProgress()
         
-        import time
+        engine = get_download_engine()
+        await engine.start()
+        if owns_job:
+            engine.limit_job_bandwidth(job_id, max_bandwidth_mbps)
+        active_extractions[extraction_id]["bandwidth"] = {"max_bandwidth_mbps": max_bandwidth_mbps, "actual_mbps": 0.0}
         
-        def download_file(file_info):
-            file_path, index = file_info
-            try:
-                url = f"{base_url}/{file_path}"
-                
-                # Hacer request con timeout
-                response = requests.get(url, headers=headers, timeout=15)
-                
-                if response.status_code == 200 and len(response.content) > 500:  # Archivos válidos
-                    
-                    # Guardar archivo original Honda (estructura exacta)
-                    honda_file = honda_original_base / file_path
-                    honda_file.parent.mkdir(parents=True, exist_ok=True)
-                    with open(honda_file, 'wb') as f:
-                        f.write(response.content)
-                    
-                    # Guardar archivo sistema (optimizado)
-                    if file_path.endswith('.jpg'):
-                        # Imágenes: numeración secuencial
-                        system_filename = f"tile_{len(successful_files):04d}.jpg"
-                        system_file = system_base / "images" / system_filename
-                    else:
-                        # Archivos config/assets: mantener estructura
-                        system_file = system_base / file_path
-                        system_file.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    with open(system_file, 'wb') as f:
-                        f.write(response.content)
-                    
-                    return {
-                        'status': 'success', 
-                        'file': file_path, 
-                        'size': len(response.content),
-                        'index': index
-                    }
-                
-                elif response.status_code == 404:
-                    return {'status': 'skip', 'file': file_path, 'index': index}
-                else:
-                    return {'status': 'error', 'file': file_path, 'code': response.status_code, 'index': index}
-                    
-            except Exception as e:
-                return {'status': 'error', 'file': file_path, 'error': str(e), 'index': index}
+        # Control adaptativo de concurrencia (AIMD) para esta extracción
+        controller = AdaptiveConcurrencyController()
+        active_extractions[extraction_id]["concurrency_curve"] = controller.curve
         
-        # PRIMERO: USAR SELENIUM PARA OBTENER ASSETS PRINCIPALES
-        print(f"[SELENIUM] Iniciando extracción de assets principales con Selenium...")
-        selenium_results = await extract_honda_assets_with_selenium(year, view_type, honda_original_base, quality_level)
+        # PRIMERO: ASSETS PRINCIPALES CON FETCH ESCALONADO
+        # HTTP primero; el navegador solo si hubo firma de bloqueo (o quedó recordado así)
+        print(f"[TIERS] Obteniendo assets principales por HTTP...")
+        selenium_results = await fetch_viewer_assets(year, view_type, honda_original_base, config)
+        fetch_tiers = selenium_results["tiers"]
+        if selenium_results["escalate"]:
+            print(f"[SELENIUM] Escalando al navegador por {selenium_results['escalate']}...")
+            http_results = selenium_results
+            selenium_results = await extract_honda_assets_with_selenium(year, view_type, honda_original_base,
+                                                                        quality_level, config=config, job_id=job_id)
+            remember_browser_results(year, view_type, selenium_results, http_results["blocked"])
+            for asset in http_results["escalate"]:
+                fetch_tiers[asset] = TIER_BROWSER
+            for asset in fetch_tiers:
+                selenium_results[asset] = selenium_results[asset] or http_results[asset]
+            # Sesión del navegador (cookies/tokens, UA, referer) para las transferencias del engine
+            headers = selenium_results.get("session_headers") or headers
+        else:
+            print("[TIERS] Assets obtenidos sin navegador")
+            await publish_viewer_assets(selenium_results, view_type, honda_original_base, quality_level)
+        active_extractions[extraction_id]["fetch_tiers"] = fetch_tiers
         
         selenium_success = 0
         if selenium_results["config_xml"]:
@@ -247,34 +307,112 @@ async def perform_extraction(extraction_id: str, year: str, view_type: str, qual
             print("[SELENIUM] player.js obtenido")
         
         print(f"[SELENIUM] Assets obtenidos: {selenium_success}/4")
+        active_extractions[extraction_id]["selenium_timings"] = selenium_results.get("timings")
+        active_extractions[extraction_id]["network_capture"] = selenium_results.get("network")
         
-        # SEGUNDO: DESCARGA PARALELA DE TILES (4 hilos simultaneos)
-        print(f"[DESCARGA] Iniciando descarga paralela de tiles con 4 hilos...")
+        # SEGUNDO: DESCARGA PARALELA DE TILES (async, concurrencia adaptativa)
+        print(f"[DESCARGA] Iniciando descarga paralela de tiles (concurrencia inicial {controller.current_limit})...")
         
-        # Filtrar solo tiles (excluir assets que ya obtuvimos con Selenium)
-        tiles_only = [f for f in files_to_download if f.endswith('.jpg')]
-        print(f"[DESCARGA] Descargando {len(tiles_only)} tiles...")
+        # REANUDAR: saltar tiles verificados en el manifest (solo stat en disco)
+        # En modo incremental los verificados se revalidan con request condicional
+        # PROGRESIVO: una fase por nivel, del más grueso al más fino; al terminar el
+        # nivel más grueso se publica preview_ready para que QA abra el viewer
+        incremental = sync_mode == SYNC_INCREMENTAL
+        coarsest_level = max(levels)
+        transfer_started = datetime.now()
         
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            file_list = [(file, i) for i, file in enumerate(tiles_only)]
-            results = executor.map(download_file, file_list)
-            
-            for result in results:
-                if result['status'] == 'success':
-                    downloaded += 1
-                    successful_files.append(result['file'])
-                    if downloaded % 10 == 0:  # Log cada 10 archivos
-                        print(f"[PROGRESO] Descargados: {downloaded} | Fallidos: {failed} | Omitidos: {skipped}")
-                elif result['status'] == 'skip':
-                    skipped += 1
-                else:
-                    failed += 1
+        downloader = TileDownloader(engine, tile_plan, manifest, base_url, headers,
+                                    honda_original_base, system_base, controller, job_id,
+                                    hedge=hedge, incremental=incremental)
+        
+        # Tiles que el player ya pidió durante la captura de red: no se vuelven a descargar
+        network_manifest = await asyncio.to_thread(load_network_manifest, honda_original_base)
+        if network_manifest:
+            captured_tiles = await downloader.adopt_captured(network_manifest["entries"])
+            if captured_tiles:
+                print(f"[NETWORK] {captured_tiles} tiles capturados por el navegador registrados en el manifest")
+                await manifest.flush()
+        
+        def publish_progress(progress: TileProgress):
+            extraction = active_extractions[extraction_id]
+            # Plan vacío (ningún nivel o XML sin tiles): no hay nada pendiente
+            extraction["progress_percentage"] = (progress.completed / len(tile_plan)) * 100 if len(tile_plan) else 100.0
+            extraction["downloaded_tiles"] = progress.downloaded
+            extraction["failed_tiles"] = progress.failed
+            extraction["resumed_tiles"] = progress.resumed
+            extraction["unchanged_tiles"] = progress.unchanged
+            extraction["deduplicated_tiles"] = progress.deduplicated
+            extraction["retries"] = progress.retries
+            extraction["retried_tiles"] = progress.retried_tiles
+            extraction["hedged_tiles"] = progress.hedged
+            extraction["hedge_wins"] = progress.hedge_wins
+            extraction["bandwidth"]["actual_mbps"] = throughput_mbps(
+                progress.transferred_bytes, (datetime.now() - transfer_started).total_seconds())
+        
+        async def write_result(result: dict):
+            """Etapa escritora: contadores, progreso y flush del manifest (una sola tarea)"""
+            progress.add(result)
+            if result['status'] == 'success' and progress.downloaded % 10 == 0:  # Log cada 10 archivos
+                print(f"[PROGRESO] Descargados: {progress.downloaded} | Fallidos: {progress.failed} | "
+                      f"Omitidos: {progress.skipped}")
+            publish_progress(progress)
+            if manifest.needs_flush():
+                await manifest.flush()
+        
+        def mark_preview_ready(level_status: dict):
+            # Nivel más grueso en disco para todas las caras/columnas: viewer usable
+            # Si algún tile del nivel falló o no existe (404) no hay vista previa que ofrecer
+            if not counts_usable(level_status):
+                active_extractions[extraction_id]["preview_error"] = (
+                    f"Nivel {coarsest_level} incompleto: {level_status}")
+                print(f"[PREVIEW] Nivel {coarsest_level} incompleto, sin vista previa ({level_status})")
+                return
+            preview_at = datetime.now()
+            active_extractions[extraction_id].update({
+                "preview_ready": True,
+                "preview_ready_at": preview_at.isoformat(),
+                "preview_level": coarsest_level,
+                "time_to_preview_seconds": round((preview_at - extraction_started).total_seconds(), 2)
+            })
+            print(f"[PREVIEW] Nivel {coarsest_level} completo: viewer disponible "
+                  f"({active_extractions[extraction_id]['time_to_preview_seconds']}s)")
+        
+        def on_level_complete(level: int, level_status: dict):
+            if level == coarsest_level:
+                mark_preview_ready(level_status)
+        
+        if shards > 1:
+            # SHARDS: columnas/caras repartidas entre procesos worker (cada uno con su
+            # event loop y pool); progreso y manifests se fusionan aquí
+            spec = shard_spec(extraction_id, year, view_type, config, levels, honda_original_base, system_base,
+                              ordering, incremental, hedge, max_bandwidth_mbps)
+            sharded = await run_sharded_extraction(spec, tile_groups(config), shards, manifest,
+                                                   publish_progress, on_level_complete)
+            progress = sharded["progress"]
+            tile_status = sharded["tile_status"]
+            total_bytes = sharded["total_bytes"]
+            concurrency = sharded["concurrency"]
+            concurrency_curve = sharded["concurrency_curve"]
+        else:
+            for phase_levels, phase_indices in tile_plan.phases(ordering):
+                # PIPELINE ACOTADO: índices perezosos -> cola -> workers -> escritor
+                # (memoria constante aunque el plan tenga cientos de miles de tiles)
+                print(f"[DESCARGA] Niveles {phase_levels}: {tile_plan.level_size(phase_levels)} tiles "
+                      f"(modo {sync_mode}, orden {ordering})...")
+                pipeline = BoundedPipeline()
+                await pipeline.run(phase_indices, downloader.fetch, write_result)
+                print(f"[DESCARGA] Niveles {phase_levels} listos | pipeline: {pipeline.snapshot()}")
                 
-                # Actualizar progreso
-                completed = downloaded + failed + skipped
-                active_extractions[extraction_id]["progress_percentage"] = (completed / len(tiles_only)) * 100
-                active_extractions[extraction_id]["downloaded_tiles"] = downloaded
-                active_extractions[extraction_id]["failed_tiles"] = failed
+                if coarsest_level in phase_levels and not active_extractions[extraction_id].get("preview_ready"):
+                    await manifest.flush()
+                    mark_preview_ready(tile_plan.counts(coarsest_level))
+            
+            tile_status = tile_plan.counts()
+            total_bytes = tile_plan.total_bytes()
+            concurrency = controller.summary()
+            concurrency_curve = controller.curve
+        
+        await manifest.flush()
         
         # 📄 GENERAR CONFIGURACIÓN LOCAL COMPLETA
         config_completo = {
@@ -284,20 +422,37 @@ async def perform_extraction(extraction_id: str, year: str, view_type: str, qual
                 "view_type": view_type,
                 "base_url": base_url,
                 "total_attempted": total_files,
-                "successful_downloads": downloaded,
-                "failed_downloads": failed,
-                "skipped_files": skipped
+                "successful_downloads": progress.downloaded,
+                "failed_downloads": progress.failed,
+                "skipped_files": progress.skipped,
+                "resumed_files": progress.resumed,
+                "unchanged_files": progress.unchanged,
+                "deduplicated_files": progress.deduplicated,
+                "retries": progress.retries,
+                "retried_files": progress.retried_tiles,
+                "hedge": hedge,
+                "bandwidth": active_extractions[extraction_id]["bandwidth"],
+                "hedged_files": progress.hedged,
+                "hedge_wins": progress.hedge_wins,
+                "sync_mode": sync_mode,
+                "ordering": ordering,
+                "time_to_preview_seconds": active_extractions[extraction_id].get("time_to_preview_seconds"),
+                "shards": shards,
+                "tile_status": tile_status,
+                "concurrency_curve": concurrency_curve
             },
             "file_structure": {
                 "honda_original_path": str(honda_original_base),
                 "system_optimized_path": str(system_base),
-                "successful_files": successful_files[:50]  # Primeros 50 para no sobrecargar
+                "manifest_path": str(manifest.path),
+                "successful_files": progress.successful_files  # Primeros 50 para no sobrecargar
             },
             "viewer_config": {
-                "image_base_url": f"http://127.0.0.1:8080/honda_city_{year}/ViewType.{view_type.upper()}/images/",
-                "viewer_url": f"http://127.0.0.1:8080/honda_city_{year}/ViewType.{view_type.upper()}/viewer.html",
-                "total_images": downloaded,
-                "pattern": "tiles/node1/cf_X/l_Y/c_Z/tile_N.jpg" if view_type == "interior" else "exterior_level_2/column_XX/tile_0_N.jpg"
+                "image_base_url": f"http://127.0.0.1:8080/{system_base.relative_to('downloads').as_posix()}/images/",
+                "viewer_url": f"http://127.0.0.1:8080/{system_base.relative_to('downloads').as_posix()}/viewer.html",
+                "total_images": progress.downloaded,
+                "pattern": config.tile_pattern,
+                "levels": levels
             }
         }
         
@@ -309,23 +464,42 @@ async def perform_extraction(extraction_id: str, year: str, view_type: str, qual
         # FINALIZAR EXTRACCION
         extraction = active_extractions[extraction_id]
         extraction["status"] = "completed"
-        extraction["downloaded_tiles"] = downloaded
-        extraction["failed_tiles"] = failed 
+        extraction["downloaded_tiles"] = progress.downloaded
+        extraction["failed_tiles"] = progress.failed
         extraction["progress_percentage"] = 100.0
+        extraction["concurrency"] = concurrency
+        extraction["tile_status"] = tile_status
+        extraction["scheduler"] = download_scheduler.job_summary(job_id)
+        extraction["total_size_mb"] = round(total_bytes / (1024 * 1024), 2)
+        extraction["bandwidth"]["actual_mbps"] = throughput_mbps(
+            progress.transferred_bytes, (datetime.now() - transfer_started).total_seconds())
         extraction["completed_at"] = datetime.now().isoformat()
         
         print(f"[COMPLETADO] EXTRACCION MASIVA COMPLETADA:")
+        if shards > 1:
+            print(f"   [SHARDS] {len(concurrency['shards'])} procesos | límites finales: "
+                  f"{[shard['final_limit'] for shard in concurrency['shards']]}")
+        else:
+            print(f"   [CONCURRENCIA] Límite final: {controller.current_limit} | Ajustes: {len(controller.curve) - 1}")
         print(f"   [SELENIUM] Assets principales: {selenium_success}/4")
-        print(f"   [TILES] Tiles descargados: {downloaded}")
-        print(f"   [ERROR] Archivos fallidos: {failed}")
-        print(f"   [SKIP] Archivos omitidos (404): {skipped}")
+        print(f"   [TILES] Tiles descargados: {progress.downloaded}")
+        print(f"   [ERROR] Archivos fallidos: {progress.failed}")
+        print(f"   [SKIP] Archivos omitidos (404): {progress.skipped}")
+        print(f"   [RESUME] Tiles ya verificados (no descargados): {progress.resumed}")
+        print(f"   [SYNC] Tiles sin cambios en el origen (304): {progress.unchanged}")
+        print(f"   [PREVIEW] Tiempo hasta vista previa: {extraction.get('time_to_preview_seconds')}s (orden {ordering})")
+        print(f"   [BLOBS] Tiles ya presentes en el blob store (sin escribir): {progress.deduplicated}")
+        print(f"   [RETRY] Reintentos: {progress.retries} en {progress.retried_tiles} tiles")
+        if hedge:
+            print(f"   [HEDGE] Tiles cubiertos: {progress.hedged} | Ganó la cobertura: {progress.hedge_wins}")
+        print(f"   [BANDWIDTH] Real: {extraction['bandwidth']['actual_mbps']} Mbps | Tope: {max_bandwidth_mbps or 'sin tope'}")
         print(f"   [FOLDER] Honda Original: {honda_original_base}")
         print(f"   [FOLDER] Sistema Optimizado: {system_base}")
         print(f"   [CONFIG] Config generado: {config_file}")
         
         # SI DESCARGAMOS ALGO, ES EXITO
-        if downloaded > 0 or selenium_success > 0:
-            print(f"[EXITO] EXTRACCION COMPLETADA CON {downloaded} TILES + {selenium_success} ASSETS!")
+        if progress.downloaded > 0 or selenium_success > 0:
+            print(f"[EXITO] EXTRACCION COMPLETADA CON {progress.downloaded} TILES + {selenium_success} ASSETS!")
         else:
             print(f"[WARNING] Sin archivos descargados. Revisar URLs o conectividad.")
             
@@ -335,29 +509,80 @@ async def perform_extraction(extraction_id: str, year: str, view_type: str, qual
         extraction["error_message"] = str(e)
         extraction["completed_at"] = datetime.now().isoformat()
         print(f"[ERROR] ERROR CRITICO EN EXTRACCION MASIVA: {e}")
+        
+        # Guardar lo avanzado para que la siguiente ejecución lo reanude
+        if manifest is not None:
+            try:
+                await manifest.flush()
+            except Exception as flush_error:
+                print(f"[MANIFEST] No se pudo guardar el manifest: {flush_error}")
+    
+    finally:
+        # Las estadísticas de turnos ya quedaron en el registro de la extracción
+        if owns_job:
+            download_scheduler.forget(job_id)
+            get_download_engine().release_job(job_id)
 
-@router.post("/extract")
-async def start_extraction(request: dict, background_tasks: BackgroundTasks):
-    """Iniciar extracción de imágenes Honda City - ENDPOINT ORIGINAL"""
+def parse_extraction_options(request: dict) -> dict:
+    """Validar las opciones comunes de /extract y /batch (400 si alguna es inválida)"""
+    sync_mode = request.get("sync_mode", SYNC_RESUME)
+    if sync_mode not in (SYNC_RESUME, SYNC_INCREMENTAL):
+        raise HTTPException(status_code=400, detail=f"sync_mode debe ser '{SYNC_RESUME}' o '{SYNC_INCREMENTAL}'")
     
-    # Generar ID único para la extracción
-    extraction_id = str(uuid.uuid4())
+    ordering = request.get("ordering", ORDER_PROGRESSIVE)
+    if ordering not in (ORDER_PROGRESSIVE, ORDER_SEQUENTIAL):
+        raise HTTPException(status_code=400, detail=f"ordering debe ser '{ORDER_PROGRESSIVE}' o '{ORDER_SEQUENTIAL}'")
     
-    # Crear response inicial
-    response = {
+    max_bandwidth_mbps = request.get("max_bandwidth_mbps")
+    if max_bandwidth_mbps is not None and (not isinstance(max_bandwidth_mbps, (int, float)) or max_bandwidth_mbps <= 0):
+        raise HTTPException(status_code=400, detail="max_bandwidth_mbps debe ser un número > 0")
+    
+    shards = request.get("shards", 1)
+    if not isinstance(shards, int) or not 1 <= shards <= SHARD_SETTINGS["max_shards"]:
+        raise HTTPException(status_code=400, detail=f"shards debe ser un entero entre 1 y {SHARD_SETTINGS['max_shards']}")
+    
+    return {
+        "sync_mode": sync_mode,
+        "ordering": ordering,
+        "hedge": bool(request.get("hedge", False)),
+        "max_bandwidth_mbps": max_bandwidth_mbps,
+        "shards": shards
+    }
+
+def new_extraction_record(extraction_id: str, year: str, view_type: str, options: dict) -> dict:
+    """Registro inicial de una extracción en active_extractions"""
+    return {
         "extraction_id": extraction_id,
         "status": "pending",
-        "year": request.get("year", "2026"),
-        "view_type": request.get("view_type", "interior"),
+        "year": year,
+        "view_type": view_type,
         "total_tiles": 0,  # Se calculará en background
         "downloaded_tiles": 0,
         "failed_tiles": 0,
+        "unchanged_tiles": 0,
+        **options,
+        "preview_ready": False,
+        "preview_ready_at": None,
+        "preview_error": None,
         "progress_percentage": 0.0,
         "estimated_time_remaining": None,
         "created_at": datetime.now().isoformat(),
         "completed_at": None,
         "error_message": None
     }
+
+@router.post("/extract")
+async def start_extraction(request: dict, background_tasks: BackgroundTasks):
+    """Iniciar extracción de imágenes Honda City - ENDPOINT ORIGINAL"""
+    
+    options = parse_extraction_options(request)
+    
+    # Generar ID único para la extracción
+    extraction_id = str(uuid.uuid4())
+    
+    # Crear response inicial
+    response = new_extraction_record(extraction_id, request.get("year", "2026"),
+                                     request.get("view_type", "interior"), options)
     
     # Guardar en storage
     active_extractions[extraction_id] = response
@@ -369,7 +594,12 @@ async def start_extraction(request: dict, background_tasks: BackgroundTasks):
         request.get("year", "2026"),
         request.get("view_type", "interior"),
         request.get("quality_level", 0),
-        request.get("download_path")
+        request.get("download_path"),
+        options["sync_mode"],
+        options["ordering"],
+        options["hedge"],
+        options["max_bandwidth_mbps"],
+        shards=options["shards"]
     )
     
     return response
@@ -388,6 +618,265 @@ async def list_all_extractions():
     """Listar todas las extracciones (activas y completadas)"""
     return list(active_extractions.values())
 
+def batch_items(request: BatchExtractionRequest) -> List[dict]:
+    """
+    Items de un batch: lista explícita "items" o la matriz years x view_types x quality_levels
+    Sin duplicados y en el orden pedido (años y vistas ya los valida el modelo)
+    """
+    if request.items:
+        raw_items = [(item.year.value, item.view_type.value, item.quality_level) for item in request.items]
+    else:
+        raw_items = [(year.value, view_type.value, quality_level)
+                     for year in request.years
+                     for view_type in request.view_types
+                     for quality_level in request.quality_levels]
+    
+    items = []
+    for year, view_type, quality_level in dict.fromkeys(raw_items):
+        if quality_level < 0:
+            raise HTTPException(status_code=400, detail=f"quality_level inválido: {quality_level}")
+        items.append({"year": year, "view_type": view_type, "quality_level": quality_level})
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="El batch no tiene items (usar 'items' o 'years'/'view_types'/'quality_levels')")
+    if len(items) > BATCH_SETTINGS["max_items"]:
+        raise HTTPException(status_code=400, detail=f"Máximo {BATCH_SETTINGS['max_items']} items por batch")
+    return items
+
+async def perform_batch(batch_id: str, options: dict):
+    """
+    Ejecutar un batch como un solo job del planificador
+    - Todos los items comparten turno round-robin y tope de ancho de banda (job_id = batch_id),
+      además del pool de conexiones, el cache de configuración y el blob store
+    - Cada año/vista/calidad tiene sus carpetas y manifest (create_extraction_dirs):
+      los items corren en paralelo (hasta max_parallel_items)
+    - Con shards > 1 los workers son otros procesos (sin el tope compartido del job):
+      cada item en paralelo recibe su parte del tope del batch
+    """
+    batch = active_batches[batch_id]
+    batch["status"] = "in_progress"
+    batch["started_at"] = datetime.now().isoformat()
+    
+    engine = get_download_engine()
+    await engine.start()
+    cap = options["max_bandwidth_mbps"]
+    engine.limit_job_bandwidth(batch_id, cap)
+    parallel_items = min(BATCH_SETTINGS["max_parallel_items"], len(batch["extraction_ids"]))
+    item_cap = cap / parallel_items if cap and options["shards"] > 1 else cap
+    
+    slots = asyncio.Semaphore(parallel_items)
+    
+    async def run_item(extraction_id: str):
+        extraction = active_extractions[extraction_id]
+        async with slots:
+            await perform_extraction(extraction_id, extraction["year"], extraction["view_type"],
+                                     extraction["quality_level"], None, options["sync_mode"],
+                                     options["ordering"], options["hedge"],
+                                     item_cap, job_id=batch_id, shards=options["shards"])
+    
+    try:
+        await asyncio.gather(*[run_item(extraction_id) for extraction_id in batch["extraction_ids"]])
+    finally:
+        batch["scheduler"] = download_scheduler.job_summary(batch_id)
+        download_scheduler.forget(batch_id)
+        engine.release_job(batch_id)
+    
+    summary = batch_summary(batch_id)
+    batch["status"] = "failed" if summary["failed_items"] == len(batch["extraction_ids"]) else "completed"
+    batch["completed_at"] = datetime.now().isoformat()
+    print(f"[BATCH] {batch_id} terminado: {summary['completed_items']} completos, "
+          f"{summary['failed_items']} fallidos, {summary['downloaded_tiles']} tiles descargados")
+
+def batch_summary(batch_id: str) -> dict:
+    """Progreso agregado del batch a partir de los registros de sus items"""
+    batch = active_batches[batch_id]
+    items = [active_extractions[extraction_id] for extraction_id in batch["extraction_ids"]]
+    statuses = [item["status"] for item in items]
+    return {
+        "total_items": len(items),
+        "pending_items": statuses.count("pending"),
+        "in_progress_items": statuses.count("in_progress"),
+        "completed_items": statuses.count("completed"),
+        "failed_items": statuses.count("failed"),
+        "total_tiles": sum(item["total_tiles"] for item in items),
+        "downloaded_tiles": sum(item["downloaded_tiles"] for item in items),
+        "failed_tiles": sum(item["failed_tiles"] for item in items),
+        "resumed_tiles": sum(item.get("resumed_tiles", 0) for item in items),
+        "deduplicated_tiles": sum(item.get("deduplicated_tiles", 0) for item in items),
+        "total_size_mb": round(sum(item.get("total_size_mb", 0) for item in items), 2),
+        "progress_percentage": round(sum(item["progress_percentage"] for item in items) / len(items), 2)
+    }
+
+def batch_job_view(extraction: dict) -> dict:
+    """Item de batch con el formato de /batch-list (ver verificar_batch_status.py)"""
+    tile_status = extraction.get("tile_status", {})
+    planned = sum(tile_status.values())
+    successful = tile_status.get("done", 0) + tile_status.get("resumed", 0) + tile_status.get("unchanged", 0)
+    started_at = extraction.get("started_at")
+    download_time = None
+    if started_at and extraction["completed_at"]:
+        download_time = round((datetime.fromisoformat(extraction["completed_at"]) -
+                               datetime.fromisoformat(started_at)).total_seconds(), 2)
+    return {
+        "batch_id": extraction["batch_id"],
+        "status": BATCH_JOB_STATUS.get(extraction["status"], extraction["status"]),
+        "year": extraction["year"],
+        "view_type": extraction["view_type"],
+        "quality_level": extraction["quality_level"],
+        "successful_downloads": successful,
+        "total_tiles": planned or extraction["total_tiles"],
+        "total_size_mb": extraction.get("total_size_mb", 0),
+        "download_time_seconds": download_time,
+        "success_rate": round(successful / planned * 100, 2) if planned else 0.0,
+        "progress_percentage": round(extraction["progress_percentage"], 2),
+        "error": extraction["error_message"]
+    }
+
+@router.post("/batch")
+async def start_batch(request: BatchExtractionRequest, background_tasks: BackgroundTasks):
+    """
+    Extracción en batch: matriz years x view_types x quality_levels (o lista "items")
+    Acepta las mismas opciones que /extract; max_bandwidth_mbps es el tope de todo el batch
+    """
+    options = parse_extraction_options(request.model_dump())
+    items = batch_items(request)
+    
+    batch_id = str(uuid.uuid4())
+    extraction_ids = []
+    for item in items:
+        extraction_id = str(uuid.uuid4())
+        active_extractions[extraction_id] = {
+            **new_extraction_record(extraction_id, item["year"], item["view_type"], options),
+            "quality_level": item["quality_level"],
+            "batch_id": batch_id
+        }
+        extraction_ids.append(extraction_id)
+    
+    active_batches[batch_id] = {
+        "batch_id": batch_id,
+        "status": "pending",
+        **options,
+        "extraction_ids": extraction_ids,
+        "created_at": datetime.now().isoformat(),
+        "started_at": None,
+        "completed_at": None
+    }
+    print(f"[BATCH] {batch_id}: {len(items)} items en cola")
+    
+    background_tasks.add_task(perform_batch, batch_id, options)
+    
+    return await get_batch_status(batch_id)
+
+@router.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """Estado agregado del batch y de cada item"""
+    if batch_id not in active_batches:
+        raise HTTPException(status_code=404, detail="Batch no encontrado")
+    
+    batch = active_batches[batch_id]
+    return {
+        **{key: value for key, value in batch.items() if key != "extraction_ids"},
+        **batch_summary(batch_id),
+        "items": {extraction_id: batch_job_view(active_extractions[extraction_id])
+                  for extraction_id in batch["extraction_ids"]}
+    }
+
+@router.get("/batch-list")
+async def list_batch_jobs():
+    """Todos los items de todos los batches (formato de verificar_batch_status.py)"""
+    jobs = {
+        extraction_id: batch_job_view(extraction)
+        for extraction_id, extraction in active_extractions.items()
+        if extraction.get("batch_id")
+    }
+    return {"total_jobs": len(jobs), "total_batches": len(active_batches), "jobs": jobs}
+
+@router.post("/jobs")
+async def enqueue_distributed_extraction(request: dict):
+    """
+    Extracción distribuida: publica los shards del plan en la cola compartida
+    Los descargan los workers (python -m app.worker) de cualquier nodo con el mismo volumen
+    Solo tiles: los assets del viewer los sigue bajando /extract (Selenium)
+    """
+    options = parse_extraction_options({key: value for key, value in request.items() if key != "shards"})
+    shards = request.get("shards", 4)
+    if not isinstance(shards, int) or shards < 1:
+        raise HTTPException(status_code=400, detail="shards debe ser un entero >= 1")
+    
+    year = str(request.get("year", "2026"))
+    view_type = request.get("view_type", "interior")
+    quality_level = request.get("quality_level", 0)
+    
+    async with HondaCityExtractor() as extractor:
+        config = await extractor.get_config(year, view_type)
+    levels = plan_levels(config, quality_level)
+    honda_original_base, system_base = create_extraction_dirs(year, view_type, quality_level)
+    
+    job_id = str(uuid.uuid4())
+    cap = options["max_bandwidth_mbps"]
+    spec = shard_spec(job_id, year, view_type, config, levels, honda_original_base, system_base,
+                      options["ordering"], options["sync_mode"] == SYNC_INCREMENTAL, options["hedge"],
+                      cap / shards if cap else None)
+    await asyncio.to_thread(get_shard_queue().enqueue, spec, tile_groups(config), shards, job_id)
+    return await get_distributed_job(job_id)
+
+@router.get("/jobs")
+async def list_distributed_jobs():
+    """Jobs de la cola compartida"""
+    return await asyncio.to_thread(get_shard_queue().list_jobs)
+
+@router.get("/jobs/{job_id}")
+async def get_distributed_job(job_id: str):
+    """Estado de un job distribuido: shards, progreso sumado y worker de cada shard"""
+    status = await asyncio.to_thread(get_shard_queue().job_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return status
+
+@router.get("/workers")
+async def list_workers():
+    """Workers de la cola compartida con su throughput (tiles/s y Mbps)"""
+    return await asyncio.to_thread(get_shard_queue().workers)
+
+@router.get("/scheduler")
+async def get_scheduler_status():
+    """Estado del planificador global: requests en vuelo por host y por extracción"""
+    return {
+        **download_scheduler.snapshot(),
+        "coalesced_requests": get_download_engine().coalesced,
+        "retries": get_download_engine().retries,
+        "circuit_breakers": get_download_engine().breakers.snapshot(),
+        "hedging": get_download_engine().hedges.snapshot(),
+        "browser_pool": browser_pool.snapshot(),
+        "fetch_tiers": tiered_fetcher.snapshot()
+    }
+
+@router.get("/admin/rate-limits")
+async def get_rate_limits():
+    """Presupuestos de tasa por origen (requests/s y bytes/s)"""
+    return get_download_engine().limiter.snapshot()
+
+@router.put("/admin/rate-limits")
+async def update_rate_limits(request: dict):
+    """
+    Ajustar en caliente el presupuesto de un host (o el por defecto si no se indica host)
+    Body: {"host": "www.honda.mx", "requests_per_second": 10, "bytes_per_second": 2000000}
+    null en una tasa = sin límite (0 no se acepta: no significa "detener" el host)
+    """
+    budget = {key: request[key] for key in BUDGET_KEYS if key in request}
+    if not budget:
+        raise HTTPException(status_code=400, detail=f"Indicar al menos uno de: {', '.join(BUDGET_KEYS)}")
+    for key, value in budget.items():
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+            raise HTTPException(status_code=400, detail=f"{key} debe ser un número > 0 o null (sin límite)")
+    if budget.get("burst_seconds") is None and "burst_seconds" in budget:
+        raise HTTPException(status_code=400, detail="burst_seconds no puede ser null")
+    
+    limiter = get_download_engine().limiter
+    effective = limiter.set_budget(request.get("host"), **budget)
+    await asyncio.to_thread(limiter.save)
+    return {"host": request.get("host") or "default", "budget": effective}
+
 @router.delete("/extract/{extraction_id}")
 async def delete_extraction(extraction_id: str):
     """Eliminar registro de extracción"""
@@ -401,6 +890,8 @@ async def delete_extraction(extraction_id: str):
 @router.get("/images/{year}/{view_type}/{quality_level}")
 async def get_images_list(year: str, view_type: str, quality_level: int):
     base_path = Path(f"downloads/honda_city_{year}/ViewType.{view_type.upper()}")
+    if quality_level:
+        base_path = base_path / str(quality_level)  # Carpeta propia de cada calidad (create_extraction_dirs)
     if not base_path.exists():
         raise HTTPException(status_code=404, detail="Images not found")
     
@@ -3,6 +3,8 @@ import asyncio
 from pathlib import Path
 from typing import List, Dict, Optional
 from datetime import datetime
+from app.services.download_engine import download_engine
+from app.services.manifest import TileManifest, MANIFEST_FILENAME, STATUS_DONE, SYNC_RESUME, SYNC_INCREMENTAL
 
 class HondaAssetsDownloader:
     """
@@ -11,17 +13,20 @@ class HondaAssetsDownloader:
     
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
+        self._owns_engine = False
+        self.unchanged_assets = 0
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers=self.headers)
+        # Mismo pool de conexiones que el extractor de tiles
+        self._owns_engine = not download_engine.running
+        await download_engine.start()
+        self.session = download_engine.session
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        if self._owns_engine:
+            await download_engine.close()
+        self.session = None
     
     def get_assets_urls(self, year: str, view_type: str) -> List[str]:
         """Obtener URLs de assets según año y tipo de vista"""
@@ -40,37 +45,54 @@ class HondaAssetsDownloader:
         else:
             raise ValueError(f"view_type debe ser 'exterior' o 'interior'")
     
-    async def download_asset(self, url: str, download_dir: Path) -> bool:
-        """Descargar un asset individual"""
+    async def download_asset(self, url: str, download_dir: Path,
+                             manifest: Optional[TileManifest] = None,
+                             sync_mode: str = SYNC_RESUME) -> bool:
+        """
+        Descargar un asset individual
+        Con manifest en modo incremental, un asset ya descargado se revalida con
+        ETag/If-Modified-Since y solo se reescribe si el origen responde 200
+        """
+        # Extraer nombre del archivo de la URL
+        filename = url.split('/')[-1]
+        file_path = download_dir / filename
+        
+        headers = None
+        if manifest and manifest.is_verified(filename, file_path):
+            if sync_mode != SYNC_INCREMENTAL:
+                print(f"⏭️ Asset ya verificado: {filename}")
+                return True
+            headers = manifest.conditional_headers(filename)
+        
         try:
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    content = await response.read()
-                    
-                    # Extraer nombre del archivo de la URL
-                    filename = url.split('/')[-1]
-                    file_path = download_dir / filename
-                    
-                    # Crear directorio si no existe
-                    download_dir.mkdir(parents=True, exist_ok=True)
-                    
-                    with open(file_path, 'wb') as f:
-                        f.write(content)
-                    
-                    print(f"✅ Asset descargado: {filename} ({len(content)} bytes)")
-                    return True
-                    
-                else:
-                    print(f"❌ Error descargando {url}: {response.status}")
-                    return False
+            result = await download_engine.download_to_file(url, file_path, headers=headers)
+            
+            if result["status"] == 304 and headers:
+                manifest.mark_unchanged(filename)
+                self.unchanged_assets += 1
+                print(f"⏭️ Asset sin cambios (304): {filename}")
+                return True
+            
+            if result["stored"]:
+                if manifest:
+                    manifest.record(filename, url, file_path, STATUS_DONE, size=result["size"],
+                                    sha256=result["sha256"], etag=result["etag"],
+                                    last_modified=result["last_modified"])
+                
+                print(f"✅ Asset descargado: {filename} ({result['size']} bytes)")
+                return True
+            
+            print(f"❌ Error descargando {url}: {result['status']}")
+            return False
                     
         except Exception as e:
             print(f"❌ Exception descargando {url}: {e}")
             return False
     
     async def download_all_assets(self, year: str, view_type: str, 
-                                download_path: Optional[str] = None) -> Dict:
-        """Descargar todos los assets para un modelo específico"""
+                                download_path: Optional[str] = None,
+                                sync_mode: str = SYNC_RESUME) -> Dict:
+        """Descargar todos los assets para un modelo específico (con manifest de assets)"""
         
         # Crear directorio de assets
         if download_path:
@@ -79,6 +101,8 @@ class HondaAssetsDownloader:
             assets_dir = Path("downloads") / f"honda_city_{year}" / view_type / "assets"
         
         assets_urls = self.get_assets_urls(year, view_type)
+        manifest = await asyncio.to_thread(TileManifest.load, assets_dir / MANIFEST_FILENAME)
+        self.unchanged_assets = 0
         
         print(f"📦 Descargando {len(assets_urls)} assets para {year} {view_type}...")
         
@@ -91,7 +115,7 @@ class HondaAssetsDownloader:
         }
         
         for asset_url in assets_urls:
-            success = await self.download_asset(asset_url, assets_dir)
+            success = await self.download_asset(asset_url, assets_dir, manifest, sync_mode)
             
             asset_info = {
                 "url": asset_url,
@@ -106,6 +130,9 @@ class HondaAssetsDownloader:
             else:
                 results["failed_downloads"] += 1
         
+        await manifest.flush()
+        results["unchanged_assets"] = self.unchanged_assets
+        
         print(f"📊 Assets descargados: {results['successful_downloads']}/{results['total_assets']}")
         
         return results
@@ -0,0 +1,151 @@
+"""
+ALMACÉN DE BLOBS DIRECCIONADO POR CONTENIDO
+Cada archivo descargado se guarda una sola vez bajo su sha256; las
+estructuras honda_original/, images/ y las carpetas por calidad son
+hardlinks a ese blob. Los bytes idénticos entre años, calidades y layouts
+ocupan disco una sola vez.
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+from app.services.download_engine import link_file
+
+BLOB_STORE_ROOT = Path("downloads") / ".blobs"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    """sha256 de un archivo en disco (bloqueante)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_file(path: Path, content: Union[str, bytes]):
+    """
+    Escribir un archivo del layout vía temporal + rename (bloqueante)
+    Si path ya se publicó es un hardlink a un blob: open(path, 'w') truncaría el
+    inodo compartido y cambiaría el blob y todas las copias deduplicadas en él
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        if isinstance(content, str):
+            tmp_path.write_text(content, encoding='utf-8')
+        else:
+            tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class BlobStore:
+    """
+    Blobs en root/ab/cdef... (sha256). Los archivos visibles son hardlinks,
+    así que nunca se deben modificar en sitio: siempre temp + rename
+    """
+
+    def __init__(self, root: Path = BLOB_STORE_ROOT):
+        self.root = root
+        self.blobs_written = 0
+        self.dedup_hits = 0
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def tmp_path(self) -> Path:
+        """Temporal dentro del store (mismo filesystem que los blobs => rename atómico)"""
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        return tmp_dir / f"{uuid.uuid4().hex}.part"
+
+    def _ingest(self, tmp_path: Path, digest: str) -> Tuple[Path, bool]:
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # link() falla si el blob ya existe: atómico aunque dos jobs lleguen a la vez
+            os.link(tmp_path, blob)
+        except FileExistsError:
+            os.remove(tmp_path)
+            self.dedup_hits += 1
+            return blob, False
+        except OSError:
+            # FS sin hardlinks: mover el temporal tal cual
+            os.replace(tmp_path, blob)
+        else:
+            os.remove(tmp_path)
+        self.blobs_written += 1
+        return blob, True
+
+    async def ingest(self, tmp_path: Path, digest: str) -> Tuple[Path, bool]:
+        """
+        Mover un temporal ya hasheado al store
+        Devuelve (path del blob, True si era contenido nuevo)
+        """
+        return await asyncio.to_thread(self._ingest, tmp_path, digest)
+
+    async def materialize(self, blob: Path, *destinations: Path):
+        """Publicar un blob en uno o varios paths del layout (hardlinks atómicos)"""
+        for dest in destinations:
+            await link_file(blob, dest)
+
+    def _adopt(self, source: Path) -> Path:
+        blob = self.blob_path(hash_file(source))
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(source, blob)
+            self.blobs_written += 1
+        except FileExistsError:
+            self.dedup_hits += 1
+            if not os.path.samefile(source, blob):
+                # Reemplazar la copia suelta por un link al blob existente
+                tmp_path = source.with_name(f".{source.name}.{uuid.uuid4().hex[:8]}.part")
+                os.link(blob, tmp_path)
+                os.replace(tmp_path, source)
+        return blob
+
+    async def publish_file(self, source: Path, dest: Path):
+        """
+        Reemplazo de shutil.copy2 para archivos ya escritos por otra vía
+        (p. ej. Selenium): el contenido entra al store y dest queda como hardlink
+        """
+        try:
+            blob = await asyncio.to_thread(self._adopt, source)
+        except OSError:
+            # FS sin hardlinks: el link_file de abajo hace copia
+            blob = source
+        await link_file(blob, dest)
+
+    def _prune(self) -> int:
+        removed = 0
+        if not self.root.exists():
+            return removed
+        for blob in self.root.glob("??/*"):
+            # Solo el store referencia el blob => ningún layout lo usa ya
+            if blob.is_file() and blob.stat().st_nlink == 1:
+                blob.unlink()
+                removed += 1
+        return removed
+
+    async def prune(self) -> int:
+        """Borrar blobs que ya no están enlazados desde ningún layout"""
+        return await asyncio.to_thread(self._prune)
+
+    def stats(self) -> Dict:
+        return {
+            "root": str(self.root),
+            "blobs_written": self.blobs_written,
+            "dedup_hits": self.dedup_hits
+        }
+
+
+# Store único compartido por todas las extracciones
+blob_store = BlobStore()
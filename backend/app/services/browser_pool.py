@@ -0,0 +1,311 @@
+"""
+POOL DE NAVEGADORES HEADLESS
+Chrome tarda varios segundos en arrancar (más ChromeDriverManager().install()
+la primera vez). El pool mantiene sesiones calientes y acotadas que se
+comparten entre extracciones: health check al prestarlas, reciclado tras N
+usos y timeout de espera cuando todas están ocupadas.
+"""
+
+import asyncio
+import platform
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.services.network_capture import enable_network_capture
+
+BROWSER_POOL_SETTINGS = {
+    "max_size": 2,             # Navegadores vivos como máximo (ocupados + libres)
+    "warm_size": 1,            # Navegadores que se lanzan al arrancar la API
+    "max_uses": 20,            # Préstamos antes de reciclar el navegador
+    "max_idle_seconds": 600,   # Un navegador libre más viejo que esto se recicla
+    "checkout_timeout": 30     # Segundos esperando un navegador libre
+}
+
+USER_AGENTS = {
+    "Windows": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "default": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+}
+
+# Rutas de los drivers descargados por webdriver_manager (se resuelven una sola vez)
+_driver_paths: Dict[str, str] = {}
+
+
+class BrowserPoolTimeout(Exception):
+    """No se liberó ningún navegador dentro de checkout_timeout"""
+
+
+def _driver_path(kind: str) -> str:
+    if kind not in _driver_paths:
+        if kind == "chrome":
+            from webdriver_manager.chrome import ChromeDriverManager
+            _driver_paths[kind] = ChromeDriverManager().install()
+        else:
+            from webdriver_manager.microsoft import EdgeChromiumDriverManager
+            _driver_paths[kind] = EdgeChromiumDriverManager().install()
+    return _driver_paths[kind]
+
+
+def chrome_options():
+    """Opciones de Chrome headless para evitar detección"""
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless")  # Ejecutar sin ventana
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--disable-web-security")
+    options.add_argument("--allow-running-insecure-content")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+
+    # COMPATIBILIDAD WINDOWS vs MACBOOK
+    if platform.system() == "Windows":
+        # Headers específicos para Windows (CSP bypass)
+        options.add_argument(f"--user-agent={USER_AGENTS['Windows']}")
+        options.add_argument("--disable-features=VizDisplayCompositor")
+        options.add_argument("--ignore-certificate-errors")
+        options.add_argument("--ignore-ssl-errors")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-plugins")
+        options.add_argument("--disable-images")  # Para acelerar descarga
+    else:
+        options.add_argument(f"--user-agent={USER_AGENTS['default']}")
+    # Eventos CDP Network en el log "performance" (captura de red del viewer)
+    return enable_network_capture(options)
+
+
+def edge_options():
+    from selenium.webdriver.edge.options import Options as EdgeOptions
+
+    options = EdgeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    if platform.system() == "Windows":
+        options.add_argument(f"--user-agent={USER_AGENTS['Windows']} Edg/119.0.0.0")
+        options.add_argument("--disable-features=VizDisplayCompositor")
+        options.add_argument("--ignore-certificate-errors")
+        options.add_argument("--ignore-ssl-errors")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-plugins")
+        options.add_argument("--disable-images")
+    else:
+        options.add_argument(f"--user-agent={USER_AGENTS['default']} Edg/119.0.0.0")
+    return options
+
+
+def launch_browser():
+    """
+    Lanzar un navegador headless: Chrome desde PATH, luego ChromeDriverManager
+    (ruta cacheada en el proceso) y Edge como último recurso
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    try:
+        driver = webdriver.Chrome(options=chrome_options())
+        print("[BROWSER_POOL] ChromeDriver desde PATH exitoso")
+    except Exception as e:
+        print(f"[BROWSER_POOL] Chrome desde PATH falló: {e}")
+        try:
+            driver = webdriver.Chrome(service=Service(_driver_path("chrome")), options=chrome_options())
+            print("[BROWSER_POOL] ChromeDriverManager exitoso")
+        except Exception as e2:
+            print(f"[BROWSER_POOL] ChromeDriverManager falló: {e2}")
+            from selenium.webdriver.edge.service import Service as EdgeService
+            driver = webdriver.Edge(service=EdgeService(_driver_path("edge")), options=edge_options())
+            print("[BROWSER_POOL] Usando Edge como fallback")
+
+    # Script para evitar detección
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    # Timeout MUY CORTO para evitar congelamiento
+    driver.implicitly_wait(3)
+    return driver
+
+
+def browser_session_headers(driver, headers: Dict[str, str], url: str) -> Dict[str, str]:
+    """
+    Headers para pedir url fuera del navegador con su misma sesión: las cookies que
+    Chrome enviaría a esa URL (incluye httpOnly y tokens anti-bot), su User-Agent y
+    la página actual como Referer
+    """
+    try:
+        cookies = driver.execute_cdp_cmd("Network.getCookies", {"urls": [url]})["cookies"]
+    except Exception:
+        # Sin CDP (Edge antiguo): cookies visibles desde la página actual
+        cookies = driver.get_cookies()
+    handoff = {**headers, "User-Agent": driver.execute_script("return navigator.userAgent")}
+    if driver.current_url.startswith("http"):
+        handoff["Referer"] = driver.current_url
+    if cookies:
+        handoff["Cookie"] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+    return handoff
+
+
+class BrowserSession:
+    """Un navegador del pool con sus contadores"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+
+class BrowserPool:
+    """
+    Sesiones de navegador calientes y acotadas (thread-safe: Selenium es síncrono)
+    - checkout() presta una sesión libre que pasó el health check, lanza una
+      nueva si hay cupo o espera hasta checkout_timeout
+    - checkin() la devuelve limpia (sin cookies, en about:blank) o la recicla
+      al llegar a max_uses / si quedó rota
+    """
+
+    def __init__(self, settings: Optional[Dict] = None, launcher: Callable = launch_browser):
+        self.settings = {**BROWSER_POOL_SETTINGS, **(settings or {})}
+        self.launcher = launcher
+        self._idle: List[BrowserSession] = []
+        self._size = 0  # Sesiones vivas o lanzándose
+        self._condition = threading.Condition()
+        self._closed = False
+        self.launched = 0
+        self.recycled = 0
+        self.health_failures = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def _healthy(self, session: BrowserSession) -> bool:
+        if time.monotonic() - session.returned_at > self.settings["max_idle_seconds"]:
+            return False
+        try:
+            return session.driver.execute_script("return 1") == 1
+        except Exception:
+            self.health_failures += 1
+            return False
+
+    def _quit(self, session: BrowserSession):
+        try:
+            session.driver.quit()
+        except Exception as e:
+            print(f"[BROWSER_POOL] Error cerrando navegador: {e}")
+
+    def _launch(self) -> BrowserSession:
+        """Lanzar con el cupo ya reservado (fuera del lock: tarda segundos)"""
+        try:
+            session = BrowserSession(self.launcher())
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self.launched += 1
+        return session
+
+    def checkout(self, timeout: Optional[float] = None) -> BrowserSession:
+        timeout = self.settings["checkout_timeout"] if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.settings["max_size"]:
+                    remaining = deadline - time.monotonic()
+                    if self._closed or remaining <= 0 or not self._condition.wait(remaining):
+                        if self._closed:
+                            raise BrowserPoolTimeout("Pool de navegadores cerrado")
+                        self.timeouts += 1
+                        raise BrowserPoolTimeout(f"Sin navegador libre en {timeout}s")
+                session = self._idle.pop() if self._idle else None
+                if session is None:
+                    self._size += 1  # Reservar cupo antes de lanzar
+            if session is None:
+                session = self._launch()
+            elif not self._healthy(session):
+                # Roto o demasiado viejo: reemplazar sin perder el cupo
+                print("[BROWSER_POOL] Navegador no pasó el health check, reciclando")
+                self._quit(session)
+                self.recycled += 1
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                continue
+            session.uses += 1
+            self.checkouts += 1
+            self.wait_seconds += time.monotonic() - started
+            return session
+
+    def checkin(self, session: BrowserSession, healthy: bool = True):
+        """Devolver la sesión; se recicla si está rota o llegó a max_uses"""
+        if healthy and not self._closed and session.uses < self.settings["max_uses"]:
+            try:
+                # Sin estado entre extracciones
+                session.driver.delete_all_cookies()
+                session.driver.get("about:blank")
+            except Exception:
+                healthy = False
+        else:
+            healthy = False
+
+        if not healthy:
+            self._quit(session)
+            self.recycled += 1
+        session.returned_at = time.monotonic()
+        with self._condition:
+            if healthy:
+                self._idle.append(session)
+            else:
+                self._size -= 1
+            self._condition.notify()
+
+    async def acquire(self, timeout: Optional[float] = None) -> BrowserSession:
+        """checkout sin bloquear el event loop mientras se espera o se lanza Chrome"""
+        return await asyncio.to_thread(self.checkout, timeout)
+
+    def warm(self, count: Optional[int] = None):
+        """Lanzar navegadores por adelantado hasta tener count libres"""
+        count = min(self.settings["warm_size"] if count is None else count, self.settings["max_size"])
+        sessions = []
+        wait_seconds = self.wait_seconds
+        try:
+            while len(sessions) + len(self._idle) < count:
+                sessions.append(self.checkout(timeout=0))
+        except Exception as e:
+            print(f"[BROWSER_POOL] No se pudo precalentar el pool: {e}")
+        self.wait_seconds = wait_seconds
+        for session in sessions:
+            session.uses -= 1  # El precalentamiento no cuenta como uso
+            self.checkouts -= 1
+            self.checkin(session)
+        if sessions:
+            print(f"[BROWSER_POOL] {len(sessions)} navegador(es) listos")
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for session in idle:
+            self._quit(session)
+
+    def snapshot(self) -> Dict:
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._size - len(self._idle),
+            "max_size": self.settings["max_size"],
+            "launched": self.launched,
+            "recycled": self.recycled,
+            "health_failures": self.health_failures,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": round(self.wait_seconds / self.checkouts, 3) if self.checkouts else 0.0
+        }
+
+
+browser_pool = BrowserPool()
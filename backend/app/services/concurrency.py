@@ -0,0 +1,158 @@
+"""
+CONTROL ADAPTATIVO DE CONCURRENCIA (AIMD)
+Sube las descargas simultáneas mientras la latencia y la tasa de éxito se
+mantienen sanas; recorta fuerte ante 429/503, timeouts o p95 en aumento.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+CONCURRENCY_SETTINGS = {
+    "initial": 4,              # Requests simultáneos al arrancar
+    "min_limit": 1,
+    "max_limit": 32,
+    "increase_step": 1,        # Incremento aditivo por ronda sana
+    "decrease_factor": 0.5,    # Recorte multiplicativo ante congestión
+    "window": 20,              # Respuestas usadas para p95 y tasa de éxito
+    "latency_tolerance": 1.5,  # p95 > base * tolerancia = latencia en aumento
+    "latency_slack_ms": 50,    # Margen absoluto para no reaccionar a jitter de ms
+    "min_success_rate": 0.95
+}
+
+# Respuestas que indican que el origen nos está frenando
+THROTTLE_STATUSES = {429, 503}
+
+
+def percentile(values, pct: float) -> float:
+    """Percentil simple (nearest-rank) sobre una secuencia de números"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class AdaptiveConcurrencyController:
+    """
+    Límite de concurrencia AIMD para una extracción
+    - Aumento aditivo (+step) tras una ronda completa (limit respuestas) sana
+    - Recorte multiplicativo (x factor) ante throttling, timeouts, errores o p95 alto
+    - Guarda la curva de límites usada para reportarla en el job
+    """
+
+    def __init__(self, settings: Optional[Dict] = None):
+        self.settings = {**CONCURRENCY_SETTINGS, **(settings or {})}
+        self.limit = float(self.settings["initial"])
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+        self._latencies = deque(maxlen=self.settings["window"])
+        self._outcomes = deque(maxlen=self.settings["window"])
+        self._base_p95: Optional[float] = None
+        self._healthy_in_round = 0
+        self._last_decrease = 0.0
+        self._start = time.monotonic()
+        self.curve: List[Dict] = []
+        self._log_point("start")
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.settings["min_limit"], int(self.limit))
+
+    @property
+    def p95_latency(self) -> float:
+        return percentile(self._latencies, 95)
+
+    @property
+    def latency_samples(self) -> int:
+        return len(self._latencies)
+
+    def _log_point(self, reason: str):
+        self.curve.append({
+            "t": round(time.monotonic() - self._start, 3),
+            "limit": self.current_limit,
+            "reason": reason
+        })
+
+    async def acquire(self) -> float:
+        """Esperar hueco bajo el límite actual; devuelve el instante de inicio"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.current_limit)
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started: float, status: Optional[int] = None,
+                      timeout: bool = False, error: bool = False, cancelled: bool = False):
+        """
+        Registrar el resultado de un request y liberar su hueco
+        Un request cancelado (p. ej. el perdedor de un hedge) no cuenta para el AIMD
+        """
+        if not cancelled:
+            self.record(time.monotonic() - started, started, status, timeout, error)
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def record(self, latency: float, started: float, status: Optional[int] = None,
+               timeout: bool = False, error: bool = False):
+        """Aplicar la regla AIMD con el resultado de un request"""
+        throttled = timeout or status in THROTTLE_STATUSES
+        failed = throttled or error or (status is not None and status >= 500)
+
+        self._outcomes.append(not failed)
+        if not failed:
+            self._latencies.append(latency)
+
+        # Solo un recorte por episodio: ignorar requests lanzados antes del último recorte
+        if started < self._last_decrease:
+            return
+
+        if throttled:
+            self._decrease("timeout" if timeout else f"status_{status}")
+            return
+
+        window_full = len(self._outcomes) >= self.settings["window"]
+        if window_full:
+            success_rate = sum(self._outcomes) / len(self._outcomes)
+            if success_rate < self.settings["min_success_rate"]:
+                self._decrease("error_rate")
+                return
+
+            p95 = self.p95_latency
+            if self._base_p95 is None or p95 < self._base_p95:
+                self._base_p95 = p95
+            elif (p95 > self._base_p95 * self.settings["latency_tolerance"]
+                  and (p95 - self._base_p95) * 1000 > self.settings["latency_slack_ms"]):
+                self._decrease("latency_p95")
+                return
+
+        if not failed:
+            self._healthy_in_round += 1
+            if self._healthy_in_round >= self.current_limit and self.limit < self.settings["max_limit"]:
+                self.limit = min(self.settings["max_limit"], self.limit + self.settings["increase_step"])
+                self._healthy_in_round = 0
+                self._log_point("increase")
+
+    def _decrease(self, reason: str):
+        new_limit = max(self.settings["min_limit"], self.limit * self.settings["decrease_factor"])
+        self._healthy_in_round = 0
+        self._last_decrease = time.monotonic()
+        # Nueva base de latencia tras el recorte
+        self._latencies.clear()
+        self._outcomes.clear()
+        self._base_p95 = None
+        if new_limit != self.limit:
+            self.limit = new_limit
+            self._log_point(f"decrease:{reason}")
+
+    def summary(self) -> Dict:
+        """Resumen de la curva de concurrencia para el reporte del job"""
+        limits = [point["limit"] for point in self.curve]
+        return {
+            "final_limit": self.current_limit,
+            "max_limit": max(limits),
+            "min_limit": min(limits),
+            "adjustments": len(self.curve) - 1,
+            "p95_latency_ms": round(self.p95_latency * 1000, 1)
+        }
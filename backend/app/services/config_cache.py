@@ -0,0 +1,173 @@
+"""
+CACHE DE CONFIGURACIÓN XML (Object2VR / Pano2VR)
+ConfigInfo parseado por (year, view_type) con TTL, revalidación condicional
+(ETag / Last-Modified) y single-flight: jobs simultáneos del mismo modelo
+comparten una sola descarga. Se persiste en disco para que un reinicio en
+caliente no toque la red.
+"""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.models.honda import ConfigInfo
+from app.services.download_engine import download_engine
+from app.utils.patterns import get_honda_config_url
+
+CONFIG_CACHE_ROOT = Path("downloads") / ".cache" / "config"
+
+CONFIG_CACHE_SETTINGS = {
+    "ttl_seconds": 6 * 3600,  # Tiempo que un config se usa sin revalidar
+}
+
+
+class ConfigCache:
+    """
+    Cache de ConfigInfo en memoria + disco
+    - Fresco (dentro del TTL): se devuelve sin red
+    - Vencido: GET condicional; 304 solo renueva el TTL
+    - Si el origen falla y hay copia vencida, se sirve la copia
+    """
+
+    def __init__(self, root: Path = CONFIG_CACHE_ROOT, settings: Optional[Dict] = None):
+        self.root = root
+        self.settings = {**CONFIG_CACHE_SETTINGS, **(settings or {})}
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = 0
+        self.fetches = 0
+        self.revalidated = 0
+
+    def cache_path(self, year: str, view_type: str) -> Path:
+        return self.root / f"{year}_{view_type}.json"
+
+    def _load(self, year: str, view_type: str) -> Optional[Dict]:
+        """Entrada persistida en disco (None si no existe o está corrupta)"""
+        path = self.cache_path(year, view_type)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            data["config"] = ConfigInfo.model_validate(data["config"])
+            return data
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[CONFIG] Cache ilegible, se ignora: {path} ({e})")
+            return None
+
+    def _persist(self, year: str, view_type: str, entry: Dict):
+        """Escritura atómica (tmp + os.replace) de una entrada"""
+        path = self.cache_path(year, view_type)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({**entry, "config": entry["config"].model_dump()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.settings["ttl_seconds"]
+
+    async def get(self, year: str, view_type: str) -> ConfigInfo:
+        """ConfigInfo de un modelo; requiere el DownloadEngine iniciado si hay que ir a la red"""
+        key = (year, view_type)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = await asyncio.to_thread(self._load, year, view_type)
+            if entry is not None:
+                self._entries[key] = entry
+
+        if entry is not None and self._is_fresh(entry):
+            self.hits += 1
+            return entry["config"]
+
+        # Single-flight: el primero descarga, el resto espera el mismo resultado
+        while key in self._inflight:
+            future = self._inflight[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # El líder fue cancelado: descargar por cuenta propia
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            config = await self._refresh(year, view_type, entry)
+        except asyncio.CancelledError:
+            # Sin esto los que esperan en shield() quedarían colgados para siempre
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marcar la excepción como recuperada si nadie más esperaba
+            future.exception()
+            raise
+        else:
+            future.set_result(config)
+            return config
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _refresh(self, year: str, view_type: str, entry: Optional[Dict]) -> ConfigInfo:
+        config_url = get_honda_config_url(year, view_type)
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = await download_engine.fetch(config_url, headers=headers)
+        except Exception as e:
+            if entry is None:
+                raise
+            print(f"[CONFIG] Origen no disponible, usando copia vencida de {year} {view_type}: {e}")
+            return entry["config"]
+
+        if response["status"] == 304 and entry is not None:
+            self.revalidated += 1
+            entry["fetched_at"] = time.time()
+        elif response["status"] == 200:
+            from app.services.honda_service import parse_config  # import local: honda_service usa este cache
+            self.fetches += 1
+            entry = {
+                "config": parse_config(response["content"].decode('utf-8', errors='replace'), config_url),
+                "etag": response["headers"].get('ETag'),
+                "last_modified": response["headers"].get('Last-Modified'),
+                "fetched_at": time.time()
+            }
+            print(f"[CONFIG] Config descargado: {config_url}")
+        elif entry is not None:
+            print(f"[CONFIG] Status {response['status']} revalidando {config_url}, usando copia vencida")
+            return entry["config"]
+        else:
+            raise Exception(f"Error descargando config {config_url}: {response['status']}")
+
+        self._entries[(year, view_type)] = entry
+        await asyncio.to_thread(self._persist, year, view_type, entry)
+        return entry["config"]
+
+    def invalidate(self, year: str, view_type: str):
+        """Forzar revalidación en el próximo get"""
+        entry = self._entries.get((year, view_type))
+        if entry is not None:
+            entry["fetched_at"] = 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "root": str(self.root),
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "revalidated": self.revalidated
+        }
+
+
+# Cache único compartido por todas las extracciones
+config_cache = ConfigCache()
@@ -0,0 +1,430 @@
+"""
+MOTOR DE DESCARGA ASÍNCRONO
+Una sola sesión aiohttp para toda la app: pool de conexiones con keep-alive,
+límite de conexiones por host y caché DNS.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from functools import partial
+import aiohttp
+import aiofiles
+import aiofiles.os
+from multidict import CIMultiDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.services.hedging import HedgeBudget, hedge_budget
+from app.services.rate_limit import OriginRateLimiter, TokenBucket, rate_limiter
+from app.services.retry import CircuitBreakerRegistry, RetryPolicy, parse_retry_after
+from app.services.scheduler import DownloadScheduler, download_scheduler, url_host
+
+# Parámetros del pool de conexiones
+ENGINE_SETTINGS = {
+    "limit": 100,              # Conexiones totales abiertas
+    "limit_per_host": 16,      # Conexiones simultáneas por host (honda.mx)
+    "ttl_dns_cache": 300,      # Segundos que se cachea la resolución DNS
+    "keepalive_timeout": 30,   # Segundos que una conexión ociosa sigue viva
+    "total_timeout": 30,       # Timeout total por request
+    "connect_timeout": 10,     # Timeout de conexión
+    "chunk_size": 64 * 1024    # Bytes por chunk al escribir en streaming
+}
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Accept-Language': 'es-MX,es;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate'
+}
+
+# Headers que hacen que dos GETs a la misma URL no sean intercambiables
+CONDITIONAL_HEADERS = {'if-none-match', 'if-modified-since', 'range'}
+
+
+def is_conditional(headers: Optional[Dict]) -> bool:
+    return bool(headers) and any(name.lower() in CONDITIONAL_HEADERS for name in headers)
+
+
+def empty_result(url: str, dest: Path) -> Dict:
+    """Resultado de download_to_file antes de tener respuesta"""
+    return {
+        "url": url,
+        "path": dest,
+        "status": None,
+        "stored": False,
+        "size": 0,
+        "sha256": None,
+        "etag": None,
+        "last_modified": None,
+        "retry_after": None,
+        "deduplicated": False,
+        "coalesced": False,
+        "hedged": False,
+        "hedge_won": False,
+        "blob": None,
+        "attempts": 1,
+        "error": None
+    }
+
+
+class DownloadEngine:
+    """
+    Motor de descarga compartido por el router y HondaCityExtractor
+    Se inicia en el arranque de FastAPI (lifespan) y se cierra al apagar
+    """
+
+    def __init__(self, settings: Optional[Dict] = None, scheduler: Optional[DownloadScheduler] = None,
+                 retry_policy: Optional[RetryPolicy] = None, hedges: Optional[HedgeBudget] = None,
+                 limiter: Optional[OriginRateLimiter] = None):
+        self.settings = {**ENGINE_SETTINGS, **(settings or {})}
+        self.scheduler = scheduler or download_scheduler
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = CircuitBreakerRegistry()
+        self.retries = 0  # Reintentos hechos desde el arranque
+        self.hedges = hedges or hedge_budget
+        self.limiter = limiter or rate_limiter
+        self._job_bandwidth: Dict[str, TokenBucket] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.coalesced = 0  # Requests ahorrados por single-flight
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def running(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if not self.running:
+            raise RuntimeError("DownloadEngine no iniciado: llamar a start() primero")
+        return self._session
+
+    async def start(self):
+        """Crear la sesión compartida (idempotente)"""
+        if self.running:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.settings["limit"],
+            limit_per_host=self.settings["limit_per_host"],
+            use_dns_cache=True,
+            ttl_dns_cache=self.settings["ttl_dns_cache"],
+            keepalive_timeout=self.settings["keepalive_timeout"],
+            enable_cleanup_closed=True
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=DEFAULT_HEADERS,
+            timeout=aiohttp.ClientTimeout(
+                total=self.settings["total_timeout"],
+                connect=self.settings["connect_timeout"]
+            )
+        )
+        print(f"[ENGINE] Sesión iniciada (limit={self.settings['limit']}, por host={self.settings['limit_per_host']})")
+
+    async def close(self):
+        """Cerrar la sesión y liberar el pool de conexiones"""
+        if self.running:
+            await self._session.close()
+            print("[ENGINE] Sesión cerrada")
+        self._session = None
+
+    def limit_job_bandwidth(self, job_id: str, max_mbps: Optional[float]):
+        """Tope de ancho de banda (megabits/s) para las descargas de un job; None lo quita"""
+        if max_mbps:
+            self._job_bandwidth[job_id] = TokenBucket(max_mbps * 1_000_000 / 8)
+        else:
+            self._job_bandwidth.pop(job_id, None)
+
+    def release_job(self, job_id: str):
+        self._job_bandwidth.pop(job_id, None)
+
+    async def _single_flight(self, key: Tuple[str, str], call: Callable[[], Awaitable[Dict]]) -> Tuple[Dict, bool]:
+        """
+        El primer llamador hace el request; los idénticos concurrentes esperan su
+        resultado. Devuelve (resultado, True si se reutilizó el de otro llamador)
+        """
+        while key in self._inflight:
+            future = self._inflight[key]
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # El líder fue cancelado: hacer el request propio
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Evitar el aviso si ningún otro llamador esperaba
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def fetch(self, url: str, headers: Optional[Dict] = None) -> Dict:
+        """
+        GET completo en memoria (para assets/config pequeños)
+        Devuelve dict con status, content y headers de respuesta (case-insensitive)
+        GETs idénticos simultáneos comparten un solo request al origen
+        """
+        if is_conditional(headers):
+            return await self._fetch(url, headers)
+        result, coalesced = await self._single_flight(("fetch", url), partial(self._fetch, url, headers))
+        if coalesced:
+            self.coalesced += 1
+        return result
+
+    async def _fetch(self, url: str, headers: Optional[Dict] = None) -> Dict:
+        await self.limiter.acquire_request(url)
+        async with self.session.get(url, headers=headers) as response:
+            content = await response.read() if response.status == 200 else b""
+            await self.limiter.consume_bytes(url, len(content))
+            return {
+                "url": url,
+                "status": response.status,
+                "content": content,
+                "headers": CIMultiDict(response.headers)
+            }
+
+    async def download_to_file(self, url: str, dest: Path, headers: Optional[Dict] = None,
+                               min_size: int = 0, controller=None, store=None,
+                               extra_destinations: Tuple[Path, ...] = (), job_id: Optional[str] = None,
+                               hedge: bool = False) -> Dict:
+        """
+        GET en streaming directo a disco:
+        - chunks de chunk_size escritos con aiofiles (no bloquea el event loop)
+        - sha256 calculado mientras llegan los bytes
+        - archivo temporal + rename atómico (nunca queda un archivo a medias en dest)
+        La memoria por descarga queda acotada a un chunk
+        controller (opcional) es el AdaptiveConcurrencyController del job
+        store (opcional) es el BlobStore: el contenido se guarda una vez por sha256
+        y dest / extra_destinations quedan como hardlinks al blob
+        job_id identifica la extracción ante el DownloadScheduler (turnos justos)
+        Si otra descarga de la misma URL ya está en curso, no se hace un segundo
+        request: se espera la primera y su contenido se enlaza en dest (coalesced=True)
+        Errores de red y status transitorios se reintentan (RetryPolicy + circuit breaker
+        por host); result["attempts"] indica los intentos y, si se agotaron tras una
+        excepción, result["error"] trae el motivo con status None
+        hedge=True: si el request supera el p95 del job (controller) se lanza uno
+        idéntico y gana el primero (ver HedgeBudget)
+        """
+        download = partial(self._download_with_retry, url, dest, headers, min_size, controller, store,
+                           extra_destinations, job_id, hedge)
+        if is_conditional(headers):
+            return await download()
+
+        result, coalesced = await self._single_flight(("file", url), download)
+        if not coalesced:
+            return result
+
+        self.coalesced += 1
+        shared = {**result, "path": dest, "coalesced": True}
+        if result["stored"]:
+            if result["blob"] is not None and store is not None:
+                await store.materialize(result["blob"], dest, *extra_destinations)
+            else:
+                source = result["blob"] or result["path"]
+                for target in (dest, *extra_destinations):
+                    await link_file(source, target)
+            shared["deduplicated"] = True
+        return shared
+
+    async def _download_with_retry(self, url: str, dest: Path, headers: Optional[Dict], min_size: int,
+                                   controller, store, extra_destinations: Tuple[Path, ...],
+                                   job_id: Optional[str], hedge: bool) -> Dict:
+        """Intentos de _download_to_file según RetryPolicy, respetando el breaker del host"""
+        breaker = self.breakers.for_host(url_host(url))
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = await breaker.wait_ready()
+            download = partial(self._download_to_file, url, dest, headers, min_size, controller, store,
+                               extra_destinations, job_id)
+            try:
+                result = await (self._hedged(download, controller) if hedge else download())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record(False, probe)
+                if not self.retry_policy.should_retry(attempt):
+                    result = empty_result(url, dest)
+                    result["error"] = str(e) or type(e).__name__
+                    result["attempts"] = attempt
+                    return result
+                delay = self.retry_policy.delay(attempt)
+                print(f"[RETRY] {url}: {type(e).__name__}, intento {attempt + 1} en {delay:.2f}s")
+            else:
+                retryable = self.retry_policy.is_retryable_status(result["status"])
+                breaker.record(not retryable and result["status"] is not None and result["status"] < 500, probe)
+                if not retryable or not self.retry_policy.should_retry(attempt):
+                    result["attempts"] = attempt
+                    return result
+                delay = self.retry_policy.delay(attempt, result["retry_after"])
+                print(f"[RETRY] {url}: status {result['status']}, intento {attempt + 1} en {delay:.2f}s")
+            finally:
+                # Prueba sin resultado registrado (OSError local, cancelación del pipeline o
+                # del líder coalesced): liberar el turno para que el host no quede colgado
+                if probe:
+                    breaker.release_probe()
+            
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def _hedged(self, download: Callable[[], Awaitable[Dict]], controller) -> Dict:
+        """
+        Un intento con cobertura: si no responde dentro del p95 del job y hay
+        presupuesto, se lanza un segundo request idéntico. Gana la primera
+        respuesta útil (no reintentable); la otra se cancela
+        """
+        self.hedges.note_request()
+        sent = asyncio.Event()
+        tasks = [asyncio.ensure_future(download(sent=sent))]
+        try:
+            # El reloj corre desde que el request sale (no cuenta la cola AIMD/scheduler)
+            sent_wait = asyncio.ensure_future(sent.wait())
+            await asyncio.wait([tasks[0], sent_wait], return_when=asyncio.FIRST_COMPLETED)
+            sent_wait.cancel()
+            
+            hedge_after = self.hedges.delay_for(controller)
+            if tasks[0].done() or hedge_after is None:
+                return await tasks[0]
+            
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if done or not self.hedges.try_acquire():
+                return await tasks[0]
+
+            tasks.append(asyncio.ensure_future(download()))
+            winner = None
+            try:
+                pending = set(tasks)
+                while winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    usable = [task for task in done if task.exception() is None
+                              and not self.retry_policy.is_retryable_status(task.result()["status"])]
+                    if usable:
+                        winner = usable[0]
+                    elif not pending:
+                        winner = done.pop()
+            finally:
+                self.hedges.release(won=winner is not None and winner is tasks[1])
+
+            result = winner.result()
+            result["hedged"] = True
+            result["hedge_won"] = winner is tasks[1]
+            return result
+        finally:
+            # Cancelar el perdedor y esperar su limpieza (temporal, huecos del scheduler/AIMD)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _download_to_file(self, url: str, dest: Path, headers: Optional[Dict], min_size: int,
+                                controller, store, extra_destinations: Tuple[Path, ...],
+                                job_id: Optional[str], sent: Optional[asyncio.Event] = None) -> Dict:
+        result = empty_result(url, dest)
+        if store is not None:
+            tmp_path = store.tmp_path()
+        else:
+            tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.part")
+        started = await controller.acquire() if controller else None
+        timed_out = False
+        cancelled = False
+        try:
+            # Turno en el planificador global (límite global/por host, round-robin entre jobs)
+            async with self.scheduler.slot(job_id, url):
+                # Presupuesto del origen (token bucket requests/s)
+                await self.limiter.acquire_request(url)
+                if controller:
+                    # La latencia del AIMD no incluye la espera en la cola global ni en la cubeta
+                    started = time.monotonic()
+                if sent is not None:
+                    sent.set()
+                async with self.session.get(url, headers=headers) as response:
+                    result["status"] = response.status
+                    result["etag"] = response.headers.get('ETag')
+                    result["last_modified"] = response.headers.get('Last-Modified')
+                    result["retry_after"] = parse_retry_after(response.headers.get('Retry-After'))
+                    if response.status != 200:
+                        return result
+                    
+                    await aiofiles.os.makedirs(tmp_path.parent, exist_ok=True)
+                    digest = hashlib.sha256()
+                    size = 0
+                    job_bandwidth = self._job_bandwidth.get(job_id) if job_id else None
+                    async with aiofiles.open(tmp_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(self.settings["chunk_size"]):
+                            await self.limiter.consume_bytes(url, len(chunk))
+                            if job_bandwidth is not None:
+                                await job_bandwidth.acquire(len(chunk))
+                            digest.update(chunk)
+                            size += len(chunk)
+                            await f.write(chunk)
+            
+            result["size"] = size
+            result["sha256"] = digest.hexdigest()
+            if size > min_size:
+                if store is not None:
+                    blob, is_new = await store.ingest(tmp_path, result["sha256"])
+                    result["stored"] = True
+                    result["blob"] = blob
+                    result["deduplicated"] = not is_new
+                    await store.materialize(blob, dest, *extra_destinations)
+                else:
+                    await aiofiles.os.replace(tmp_path, dest)
+                    result["stored"] = True
+                    for extra in extra_destinations:
+                        await link_file(dest, extra)
+            return result
+        
+        except asyncio.TimeoutError:
+            timed_out = True
+            raise
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if controller:
+                await controller.release(started, status=result["status"], timeout=timed_out,
+                                         error=result["status"] is None and not timed_out,
+                                         cancelled=cancelled)
+            if not result["stored"]:
+                try:
+                    await aiofiles.os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+
+
+async def link_file(source: Path, dest: Path):
+    """
+    Publicar source también en dest sin reescribir los bytes:
+    hardlink atómico (tmp + rename); copia como fallback si el FS no soporta links
+    """
+    def _link():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, dest)
+
+    await asyncio.to_thread(_link)
+
+
+# Instancia única para toda la app
+download_engine = DownloadEngine()
+
+
+def get_download_engine() -> DownloadEngine:
+    return download_engine
@@ -0,0 +1,66 @@
+"""
+REQUESTS DE COBERTURA (HEDGING)
+Si un tile tarda más que el p95 observado en su job, se lanza un segundo
+request idéntico; gana la primera respuesta y la otra se cancela. Un
+presupuesto global limita la carga extra sobre el origen.
+"""
+
+from typing import Dict, Optional
+
+HEDGE_SETTINGS = {
+    "max_ratio": 0.05,      # Hedges permitidos como fracción de los requests totales
+    "burst": 4,             # Hedges extra permitidos al arrancar (antes de acumular requests)
+    "max_in_flight": 8,     # Hedges simultáneos en todo el proceso
+    "min_samples": 10,      # Latencias observadas en el job antes de confiar en su p95
+    "min_delay": 0.05       # Nunca cubrir antes de este tiempo (segundos)
+}
+
+
+class HedgeBudget:
+    """
+    Presupuesto global de hedges
+    hedges emitidos <= burst + max_ratio * requests, y a lo sumo max_in_flight a la vez
+    """
+
+    def __init__(self, settings: Optional[Dict] = None):
+        self.settings = {**HEDGE_SETTINGS, **(settings or {})}
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+        self.in_flight = 0
+
+    def note_request(self):
+        """Contar un request normal (hace crecer el presupuesto)"""
+        self.requests += 1
+
+    def delay_for(self, controller) -> Optional[float]:
+        """Segundos tras los que cubrir un request del job (None = aún sin p95 fiable)"""
+        if controller is None or controller.latency_samples < self.settings["min_samples"]:
+            return None
+        return max(self.settings["min_delay"], controller.p95_latency)
+
+    def try_acquire(self) -> bool:
+        allowed = self.settings["burst"] + self.settings["max_ratio"] * self.requests
+        if self.in_flight >= self.settings["max_in_flight"] or self.hedges >= allowed:
+            return False
+        self.hedges += 1
+        self.in_flight += 1
+        return True
+
+    def release(self, won: bool):
+        self.in_flight -= 1
+        if won:
+            self.wins += 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.wins,
+            "in_flight": self.in_flight,
+            "max_ratio": self.settings["max_ratio"]
+        }
+
+
+# Presupuesto único del proceso
+hedge_budget = HedgeBudget()
@@ -3,6 +3,7 @@ EXTRACTOR HONDA CON SELENIUM
 Extrae assets que requieren JavaScript (config.xml, viewer.html, assets JS)
 """
 
+import asyncio
 import os
 import time
 import json
@@ -10,110 +11,91 @@ from pathlib import Path
 from typing import Dict, List, Optional
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, JavascriptException
+from app.models.honda import ConfigInfo
+from app.services.browser_pool import browser_pool, browser_session_headers
+from app.services.network_capture import (
+    NetworkCapture, append_network_entries, save_capture, viewer_page_url, write_network_manifest
+)
+from app.services.blob_store import blob_store, write_file
+from app.services.download_engine import get_download_engine
+from app.services.pipeline import BoundedPipeline
+from app.services.tile_downloader import extraction_headers
+from app.utils.patterns import get_honda_images_base_url
+from app.services.honda_service import HondaCityExtractor
+from app.services.tile_plan import build_tile_plan, plan_levels
+
+ASSET_KEYS = ("config_xml", "viewer_html", "skin_js", "player_js")
+
+# Esperas por condición (reemplazan los time.sleep fijos); los topes son duros
+WAIT_SETTINGS = {
+    "ready_timeout": 10,      # Segundos máximos hasta document.readyState == "complete"
+    "network_idle": 0.5,      # Segundos sin recursos nuevos para dar la red por calmada
+    "network_timeout": 10,    # Segundos máximos esperando la red en calma
+    "poll_frequency": 0.1
+}
+
+# time.sleep fijo que hacía el código anterior tras cada navegación, por tipo de asset
+# Solo sirve para ESTIMAR la latencia anterior (navegación medida + sleep); la
+# comparación medida es benchmark_selenium_waits.py, que ejecuta ese camino
+LEGACY_SLEEPS = {
+    "viewer_capture": 8,  # Sin equivalente: reemplaza las 4 navegaciones de abajo (2 s cada una)
+    "honda_page": 1, "viewer_click": 2, "tile": 1, "script": 1,
+    "config_xml": 2, "viewer_html": 2, "skin_js": 2, "player_js": 2
+}
+
+
+def timing_report(timings: List[Dict]) -> Dict:
+    """
+    Latencia medida por asset con esperas por condición, junto a una ESTIMACIÓN de la
+    que daban los sleeps fijos (estimated_*: navegación medida + LEGACY_SLEEPS, no medido)
+    """
+    assets: Dict[str, Dict] = {}
+    for timing in timings:
+        entry = assets.setdefault(timing["asset"], {"count": 0, "seconds": 0.0, "estimated_legacy_seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += timing["seconds"]
+        entry["estimated_legacy_seconds"] += timing["estimated_legacy_seconds"]
+    for entry in assets.values():
+        entry["avg_seconds"] = round(entry["seconds"] / entry["count"], 3)
+        entry["estimated_legacy_avg_seconds"] = round(entry["estimated_legacy_seconds"] / entry["count"], 3)
+        entry["seconds"] = round(entry["seconds"], 3)
+        entry["estimated_legacy_seconds"] = round(entry["estimated_legacy_seconds"], 3)
+    total = sum(entry["seconds"] for entry in assets.values())
+    legacy_total = sum(entry["estimated_legacy_seconds"] for entry in assets.values())
+    return {
+        "assets": assets,
+        "total_seconds": round(total, 3),
+        "estimated_legacy_total_seconds": round(legacy_total, 3),
+        "estimated_saved_seconds": round(legacy_total - total, 3)
+    }
+
 
 class HondaSeleniumExtractor:
     """
     Extractor de Honda usando Selenium para obtener assets que requieren JavaScript
     """
     
-    def __init__(self):
+    def __init__(self, config: Optional[ConfigInfo] = None):
+        self.session = None  # BrowserSession prestada por browser_pool
         self.driver = None
         self.wait = None
+        self.timings: List[Dict] = []  # Una entrada por navegación (ver timing_report)
+        # ConfigInfo ya resuelto (cache): evita pedir el XML otra vez por el navegador
+        self.config = config
         
     def setup_driver(self) -> bool:
-        """Configurar y inicializar el driver de Chrome"""
+        """Tomar un navegador caliente del pool (se lanza uno si hay cupo)"""
+        if self.session:
+            return True
         try:
-            print("[SELENIUM] Configurando Chrome WebDriver...")
-            
-            # Opciones de Chrome para evitar detección
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")  # Ejecutar sin ventana
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--window-size=1920,1080")
-            chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-            chrome_options.add_argument("--disable-web-security")
-            chrome_options.add_argument("--allow-running-insecure-content")
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            
-            # COMPATIBILIDAD WINDOWS vs MACBOOK
-            import platform
-            system = platform.system()
-            
-            if system == "Windows":
-                # Headers específicos para Windows (CSP bypass)
-                chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36")
-                chrome_options.add_argument("--disable-features=VizDisplayCompositor")
-                chrome_options.add_argument("--ignore-certificate-errors")
-                chrome_options.add_argument("--ignore-ssl-errors")
-                chrome_options.add_argument("--disable-extensions")
-                chrome_options.add_argument("--disable-plugins")
-                chrome_options.add_argument("--disable-images")  # Para acelerar descarga
-                print("[SELENIUM] Configuración Windows aplicada (CSP bypass)")
-            else:
-                # Headers específicos para MacBook
-                chrome_options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36")
-                print("[SELENIUM] Configuración MacBook aplicada")
-            
-            # USAR DIRECTAMENTE CHROME DESDE PATH (MÉTODO QUE FUNCIONA)
-            try:
-                # Método que SÍ funciona: Chrome desde PATH
-                self.driver = webdriver.Chrome(options=chrome_options)
-                print("[SELENIUM] ChromeDriver desde PATH exitoso")
-            except Exception as e:
-                print(f"[SELENIUM] Chrome desde PATH falló: {e}")
-                try:
-                    # Método 2: ChromeDriverManager como fallback
-                    service = Service(ChromeDriverManager().install())
-                    self.driver = webdriver.Chrome(service=service, options=chrome_options)
-                    print("[SELENIUM] ChromeDriverManager exitoso")
-                except Exception as e2:
-                    print(f"[SELENIUM] ChromeDriverManager falló: {e2}")
-                    # Método 3: Usar Edge como fallback
-                    from selenium.webdriver.edge.options import Options as EdgeOptions
-                    from selenium.webdriver.edge.service import Service as EdgeService
-                    from webdriver_manager.microsoft import EdgeChromiumDriverManager
-                    
-                    edge_options = EdgeOptions()
-                    edge_options.add_argument("--headless")
-                    edge_options.add_argument("--no-sandbox")
-                    edge_options.add_argument("--disable-dev-shm-usage")
-                    edge_options.add_argument("--disable-gpu")
-                    
-                    # Configuración Edge para Windows (CSP bypass)
-                    if system == "Windows":
-                        edge_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0")
-                        edge_options.add_argument("--disable-features=VizDisplayCompositor")
-                        edge_options.add_argument("--ignore-certificate-errors")
-                        edge_options.add_argument("--ignore-ssl-errors")
-                        edge_options.add_argument("--disable-extensions")
-                        edge_options.add_argument("--disable-plugins")
-                        edge_options.add_argument("--disable-images")
-                        print("[SELENIUM] Edge configurado para Windows (CSP bypass)")
-                    else:
-                        edge_options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0")
-                        print("[SELENIUM] Edge configurado para MacBook")
-                    
-                    edge_service = Service(EdgeChromiumDriverManager().install())
-                    self.driver = webdriver.Edge(service=edge_service, options=edge_options)
-                    print("[SELENIUM] Usando Edge como fallback")
-            
-            # Script para evitar detección
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            
-            # Configurar timeout MUY CORTO para evitar congelamiento
-            self.driver.implicitly_wait(3)  # Reducido de 10 a 3
+            print("[SELENIUM] Tomando WebDriver del pool...")
+            self.session = browser_pool.checkout()
+            self.driver = self.session.driver
             self.wait = WebDriverWait(self.driver, 5)  # Reducido de 20 a 5
-            
-            print("[SELENIUM] WebDriver configurado correctamente")
+            print(f"[SELENIUM] WebDriver listo (uso {self.session.uses} de este navegador)")
             return True
             
         except Exception as e:
@@ -121,6 +103,112 @@ class HondaSeleniumExtractor:
             print("[SELENIUM] Intentando modo de fallback sin navegador...")
             return False
     
+    def _wait_until_ready(self, network_idle: bool = False) -> bool:
+        """
+        Esperar a que el documento esté completo y, con network_idle, a que no se
+        pidan recursos nuevos durante WAIT_SETTINGS["network_idle"] segundos
+        Devuelve False si se agotó el tope (se continúa, como antes tras el sleep)
+        """
+        poll = WAIT_SETTINGS["poll_frequency"]
+        try:
+            WebDriverWait(self.driver, WAIT_SETTINGS["ready_timeout"], poll,
+                          ignored_exceptions=[JavascriptException]).until(
+                lambda driver: driver.execute_script("return document.readyState") == "complete")
+            if network_idle:
+                # Resource Timing del documento: si el conteo no cambia, la red está en calma
+                state = {"count": -1, "since": time.monotonic()}
+
+                def network_is_idle(driver) -> bool:
+                    count = driver.execute_script("return performance.getEntriesByType('resource').length")
+                    now = time.monotonic()
+                    if count != state["count"]:
+                        state["count"], state["since"] = count, now
+                    return now - state["since"] >= WAIT_SETTINGS["network_idle"]
+
+                WebDriverWait(self.driver, WAIT_SETTINGS["network_timeout"], poll,
+                              ignored_exceptions=[JavascriptException]).until(network_is_idle)
+            return True
+        except TimeoutException:
+            print(f"[SELENIUM] Tope de espera agotado en {self.driver.current_url}, continuando")
+            return False
+    
+    def _record_timing(self, asset: str, url: str, started: float, navigated: Optional[float] = None):
+        """Latencia real y estimación de la que habría tenido con el sleep fijo (navegación + sleep)"""
+        navigation = (navigated or started) - started
+        self.timings.append({
+            "asset": asset,
+            "url": url,
+            "seconds": round(time.monotonic() - started, 3),
+            "estimated_legacy_seconds": round(navigation + LEGACY_SLEEPS[asset], 3)
+        })
+    
+    def _load_and_wait(self, asset: str, url: str):
+        """Navegar y esperar solo lo necesario para que el recurso esté listo"""
+        started = time.monotonic()
+        self.driver.get(url)
+        navigated = time.monotonic()
+        self._wait_until_ready()
+        self._record_timing(asset, url, started, navigated)
+    
+    def _capture_viewer_assets(self, year: str, view_type: str, output_dir: Path) -> Dict:
+        """
+        Cargar el viewer UNA vez con captura de red: cada respuesta (XML, JS, CSS y
+        tiles que pidió el player) se guarda tal cual llegó y queda network_manifest.json
+        """
+        results = {asset: False for asset in ASSET_KEYS}
+        results["error"] = None
+        page_url = viewer_page_url(year, view_type)
+        try:
+            print(f"[SELENIUM] Capturando red del viewer: {page_url}")
+            capture = NetworkCapture(self.driver)
+            capture.reset()
+            started = time.monotonic()
+            self.driver.get(page_url)
+            navigated = time.monotonic()
+            # El player pide config y tiles después del load: esperar a que la red se calme
+            self._wait_until_ready(network_idle=True)
+            self._record_timing("viewer_capture", page_url, started, navigated)
+            entries = save_capture(capture.collect(), year, view_type, output_dir)
+            manifest_path = write_network_manifest(output_dir, page_url, entries)
+        except Exception as e:
+            # Edge o Chrome sin log de performance: se sigue con el modo directo
+            print(f"[SELENIUM] Captura de red no disponible: {e}")
+            results["error"] = str(e)
+            return results
+        
+        # Los assets pueden venir de subcarpetas: dejarlos donde los espera el sistema
+        player_name = "pano2vr_player.js" if view_type == "interior" else "object2vr_player.js"
+        expected = {"viewer.html": "viewer_html", "skin.js": "skin_js", player_name: "player_js",
+                    "config.xml": "config_xml"}
+        for entry in entries:
+            if not entry.get("path"):
+                continue
+            saved = Path(entry["path"])
+            name = saved.name
+            if name not in expected and name.endswith(".xml") and entry["kind"] == "asset" \
+                    and self.config is None and not results["config_xml"]:
+                name = "config.xml"  # XML de configuración servido con otro nombre
+            if name in expected and entry["kind"] == "asset":
+                target = output_dir / name
+                if saved != target:
+                    write_file(target, saved.read_bytes())
+                results[expected[name]] = True
+        if not results["config_xml"] and self.config is not None:
+            results["config_xml"] = self._extract_config_xml(year, view_type, output_dir)
+        
+        tiles = [entry for entry in entries if entry["kind"] == "tile" and entry.get("size")]
+        results["network"] = {
+            "page_url": page_url,
+            "responses": len(entries),
+            "saved": sum(1 for entry in entries if entry.get("path")),
+            "tiles": len(tiles),
+            "bytes": sum(entry.get("size", 0) for entry in entries),
+            "manifest": str(manifest_path)
+        }
+        print(f"[SELENIUM] Captura: {results['network']['responses']} respuestas, "
+              f"{len(tiles)} tiles, {results['network']['bytes']} bytes -> {manifest_path}")
+        return results
+    
     def extract_assets_from_honda_page(self, year: str, view_type: str, output_dir: Path) -> Dict[str, bool]:
         """
         Extraer assets desde la página de Honda usando Selenium
@@ -136,12 +224,20 @@ class HondaSeleniumExtractor:
         try:
             print(f"[SELENIUM] Extrayendo assets para Honda City {year} {view_type}...")
             
-            # MODO RÁPIDO: Saltarse navegación y ir directo a extracción
-            print("[SELENIUM] Usando modo rápido - saltando navegación...")
-            results = self._extract_assets_direct(year, view_type, output_dir)
+            # UNA SOLA CARGA: página del viewer con captura de red (assets y tiles byte a byte)
+            if self.setup_driver():
+                results = self._capture_viewer_assets(year, view_type, output_dir)
+            
+            # MODO DIRECTO: una navegación por asset, solo para lo que no apareció en la captura
+            missing = [asset for asset in ASSET_KEYS if not results[asset]]
+            if missing:
+                print(f"[SELENIUM] Faltan {missing} tras la captura, usando modo directo...")
+                direct = self._extract_assets_direct(year, view_type, output_dir, missing)
+                results.update({asset: direct[asset] for asset in missing})
+                results["error"] = results["error"] or direct["error"]
             
             # Si no funcionó, intentar con navegador
-            if not any(results.values()):
+            if not any(results[asset] for asset in ASSET_KEYS):
                 print("[SELENIUM] Modo directo falló, intentando con navegador...")
                 if not self.setup_driver():
                     print("[SELENIUM] WebDriver falló, usando modo de fallback...")
@@ -151,10 +247,7 @@ class HondaSeleniumExtractor:
                 honda_url = f"https://www.honda.mx/autos/city/{year}/"
                 
                 print(f"[SELENIUM] Navegando a: {honda_url}")
-                self.driver.get(honda_url)
-                
-                # Esperar MUY POCO tiempo para evitar congelamiento
-                time.sleep(1)
+                self._load_and_wait("honda_page", honda_url)
                 
                 # Buscar el botón de 360° o enlace
                 try:
@@ -186,8 +279,11 @@ class HondaSeleniumExtractor:
                     if link_360:
                         # Hacer clic en el enlace 360°
                         print("[SELENIUM] Haciendo clic en enlace 360°...")
+                        started = time.monotonic()
                         self.driver.execute_script("arguments[0].click();", link_360)
-                        time.sleep(2)
+                        # El clic no siempre navega: esperar a que la red se calme
+                        self._wait_until_ready(network_idle=True)
+                        self._record_timing("viewer_click", honda_url, started)
                         
                         # Extraer assets de la página del viewer
                         results = self._extract_viewer_assets(year, view_type, output_dir)
@@ -206,14 +302,15 @@ class HondaSeleniumExtractor:
         return results
     
     def cleanup_driver(self):
-        """Cerrar WebDriver de forma segura"""
-        if self.driver:
+        """Devolver el WebDriver al pool (se recicla si quedó roto)"""
+        if self.session:
             try:
-                self.driver.quit()
-                print("[SELENIUM] WebDriver cerrado correctamente")
+                browser_pool.checkin(self.session)
+                print("[SELENIUM] WebDriver devuelto al pool")
             except Exception as e:
-                print(f"[SELENIUM] Error cerrando WebDriver: {e}")
+                print(f"[SELENIUM] Error devolviendo WebDriver: {e}")
             finally:
+                self.session = None
                 self.driver = None
     
     def _extract_viewer_assets(self, year: str, view_type: str, output_dir: Path) -> Dict[str, bool]:
@@ -234,8 +331,7 @@ class HondaSeleniumExtractor:
             
             # Guardar HTML como viewer.html
             viewer_file = output_dir / "viewer.html"
-            with open(viewer_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            write_file(viewer_file, html_content)
             results["viewer_html"] = True
             print(f"[SELENIUM] viewer.html guardado: {viewer_file}")
             
@@ -262,8 +358,29 @@ class HondaSeleniumExtractor:
         
         return results
     
-    async def download_tiles(self, year: str, view_type: str, output_dir: Path, quality_level: int) -> int:
-        """Descargar imágenes tiles usando Selenium"""
+    def session_headers(self, year: str, view_type: str) -> Dict[str, str]:
+        """
+        Credenciales de la sesión del navegador para el motor HTTP (cookies, tokens
+        anti-bot, User-Agent y Referer reales); headers estáticos si no hay navegador
+        """
+        headers = extraction_headers(year)
+        if not self.driver:
+            return headers
+        try:
+            return browser_session_headers(self.driver, headers, get_honda_images_base_url(year, view_type))
+        except Exception as e:
+            print(f"[SELENIUM] No se pudo leer la sesión del navegador: {e}")
+            return headers
+    
+    async def download_tiles(self, year: str, view_type: str, output_dir: Path, quality_level: int,
+                             headers: Optional[Dict[str, str]] = None, job_id: Optional[str] = None) -> List[str]:
+        """
+        Descargar tiles con el motor async (pool de conexiones) usando la sesión del navegador
+        - Bytes crudos en streaming a disco (sin fetch en la página ni base64)
+        - Cada tile queda en tiles/<nombre Selenium> y en su path Honda (honda_original/),
+          y se anota en network_manifest.json para que la extracción no lo vuelva a pedir
+        Devuelve los nombres Selenium (en tiles/) de los tiles descargados
+        """
         try:
             print(f"[SELENIUM] Iniciando descarga de tiles para {view_type}...")
             
@@ -271,114 +388,68 @@ class HondaSeleniumExtractor:
             tiles_dir = output_dir / "tiles"
             tiles_dir.mkdir(parents=True, exist_ok=True)
             
-            # URLs base para Honda
-            base_url = f"https://www.honda.mx/web/img/cars/models/city/{year}/city_{year}_{view_type[:3]}_360"
-            
-            tiles_downloaded = 0
-            
-            if view_type == "interior":
-                # Interior: 6 caras x 2 niveles x 2 columnas x 2 tiles = 48 archivos
-                print("[SELENIUM] Descargando tiles INTERIOR (48 archivos)...")
-                for cf in range(6):  # cf_0 a cf_5
-                    for l in [1, 2]:  # l_1 y l_2
-                        for c in range(2):  # c_0 y c_1
-                            for tile in range(2):  # tile_0.jpg y tile_1.jpg
-                                tile_url = f"{base_url}/tiles/node1/cf_{cf}/l_{l}/c_{c}/tile_{tile}.jpg"
-                                tile_path = tiles_dir / f"tile_{cf}_{l}_{c}_{tile}.jpg"
-                                
-                                if await self._download_tile_with_selenium(tile_url, tile_path):
-                                    tiles_downloaded += 1
-                                    print(f"[SELENIUM] Tile descargado: tile_{cf}_{l}_{c}_{tile}.jpg")
-            
-            else:  # exterior
-                # PATRONES REALES IDENTIFICADOS DESDE DOM:
-                # Level 0 (panorámica): c{col}_l0_{row}_{tile}.jpg (0-4+ tiles)
-                # Level 2 (zoom detallado): c{col}_l2_{row}_{tile}.jpg (0-1 tiles)
-                
-                print("[SELENIUM] Descargando tiles EXTERIOR - PATRONES REALES...")
-                
-                # PATRÓN A - Level 0 (Vista panorámica general)
-                print("[SELENIUM] Descargando Level 0 (panorámica)...")
-                for col in range(32):  # c0 a c31
-                    for row in range(2):  # 2 filas
-                        for tile in range(8):  # 0-7 tiles por posición
-                            tile_url = f"{base_url}/tiles/c{col}_l0_{row}_{tile}.jpg"
-                            tile_path = tiles_dir / f"level0_{col:02d}_{row}_{tile}.jpg"
-                            
-                            if await self._download_tile_with_selenium(tile_url, tile_path):
-                                tiles_downloaded += 1
-                                print(f"[SELENIUM] Level0 tile descargado: c{col}_l0_{row}_{tile}.jpg")
-                
-                # PATRÓN B - Level 2 (Zoom detallado)
-                print("[SELENIUM] Descargando Level 2 (zoom detallado)...")
-                for col in range(32):  # c0 a c31
-                    for row in range(2):  # 2 filas
-                        for tile in range(2):  # 0-1 tiles por posición
-                            tile_url = f"{base_url}/tiles/c{col}_l2_{row}_{tile}.jpg"
-                            tile_path = tiles_dir / f"level2_{col:02d}_{row}_{tile}.jpg"
-                            
-                            if await self._download_tile_with_selenium(tile_url, tile_path):
-                                tiles_downloaded += 1
-                                print(f"[SELENIUM] Level2 tile descargado: c{col}_l2_{row}_{tile}.jpg")
-            
-            print(f"[SELENIUM] Total tiles descargados: {tiles_downloaded}")
-            return tiles_downloaded
+            # Plan exacto desde la configuración real (sin tiles especulativos que dan 404)
+            config = self.config
+            if config is None:
+                async with HondaCityExtractor() as extractor:
+                    config = await extractor.get_config(year, view_type)
+            plan = build_tile_plan(year, view_type, config, plan_levels(config, quality_level))
+            print(f"[SELENIUM] Plan de tiles {view_type}: {len(plan)} archivos")
+            
+            headers = headers or extraction_headers(year)
+            engine = get_download_engine()
+            await engine.start()
+            entries = []
+            tile_names = []
+            
+            async def fetch_tile(i: int) -> Dict:
+                group, level, x, y, row = plan.groups[i], plan.levels[i], plan.xs[i], plan.ys[i], plan.rows[i]
+                if view_type == "interior":
+                    tile_name = f"tile_{group}_{level}_{x}_{y}.jpg"
+                elif row:
+                    tile_name = f"level{level}_{group:02d}_r{row}_{y}_{x}.jpg"
+                else:
+                    tile_name = f"level{level}_{group:02d}_{y}_{x}.jpg"
+                relative_path = plan.relative_path(i)
+                result = await engine.download_to_file(plan.url(i), output_dir / relative_path, headers=headers,
+                                                       min_size=500, store=blob_store,
+                                                       extra_destinations=(tiles_dir / tile_name,), job_id=job_id)
+                return {**result, "tile_name": tile_name, "tile_path": relative_path}
+            
+            def write_tile(result: Dict):
+                if not result["stored"]:
+                    print(f"[SELENIUM] Imagen no encontrada: {result['url']} ({result['status'] or result['error']})")
+                    return
+                tile_names.append(result["tile_name"])
+                entries.append({
+                    "url": result["url"],
+                    "status": result["status"],
+                    "kind": "tile",
+                    "source": "session_handoff",
+                    "tile_path": result["tile_path"],
+                    "path": str(result["path"]),
+                    "size": result["size"],
+                    "sha256": result["sha256"],
+                    "etag": result["etag"],
+                    "last_modified": result["last_modified"]
+                })
+                if len(entries) % 50 == 0:
+                    print(f"[SELENIUM] Tiles descargados: {len(entries)}")
+            
+            await BoundedPipeline().run(plan.indices(), fetch_tile, write_tile)
+            if entries:
+                await asyncio.to_thread(append_network_entries, output_dir, entries)
+            
+            print(f"[SELENIUM] Total tiles descargados: {len(entries)}")
+            return tile_names
             
         except Exception as e:
             print(f"[SELENIUM] Error descargando tiles: {e}")
-            return 0
-    
-    async def _download_tile_with_selenium(self, url: str, output_path: Path) -> bool:
-        """Descargar un tile individual usando Selenium"""
-        try:
-            # Navegar a la URL de la imagen
-            self.driver.get(url)
-            time.sleep(1)
-            
-            # Verificar si la imagen se cargó correctamente
-            if "404" not in self.driver.title and self.driver.page_source.strip():
-                # Obtener el contenido de la imagen
-                try:
-                    # Intentar obtener la imagen directamente
-                    response = self.driver.execute_script("""
-                        return fetch(arguments[0])
-                            .then(response => response.blob())
-                            .then(blob => {
-                                return new Promise((resolve) => {
-                                    const reader = new FileReader();
-                                    reader.onload = () => resolve(reader.result);
-                                    reader.readAsDataURL(blob);
-                                });
-                            });
-                    """, url)
-                    
-                    if response and response.startswith('data:image'):
-                        # Decodificar base64 y guardar
-                        import base64
-                        image_data = base64.b64decode(response.split(',')[1])
-                        
-                        # Crear directorio si no existe
-                        output_path.parent.mkdir(parents=True, exist_ok=True)
-                        
-                        # Guardar archivo
-                        with open(output_path, 'wb') as f:
-                            f.write(image_data)
-                        
-                        return True
-                        
-                except Exception as e:
-                    print(f"[SELENIUM] Error procesando imagen {url}: {e}")
-                    return False
-            else:
-                print(f"[SELENIUM] Imagen no encontrada: {url}")
-                return False
-                
-        except Exception as e:
-            print(f"[SELENIUM] Error descargando tile {url}: {e}")
-            return False
+            return []
     
-    def _extract_assets_direct(self, year: str, view_type: str, output_dir: Path) -> Dict[str, bool]:
-        """Extracción directa RÁPIDA - sin navegador"""
+    def _extract_assets_direct(self, year: str, view_type: str, output_dir: Path,
+                               assets: Optional[List[str]] = None) -> Dict[str, bool]:
+        """Extracción directa: una navegación por asset (assets: solo esos; por defecto los 4)"""
         results = {
             "config_xml": False,
             "viewer_html": False,
@@ -391,10 +462,15 @@ class HondaSeleniumExtractor:
             print("[SELENIUM] Extracción directa RÁPIDA (sin navegador)...")
             
             # GENERAR TODOS LOS ASSETS BÁSICOS INMEDIATAMENTE
-            results["viewer_html"] = self._extract_real_viewer(year, view_type, output_dir)
-            results["config_xml"] = self._extract_config_xml(year, view_type, output_dir)
-            results["skin_js"] = self._extract_real_skin(year, view_type, output_dir)
-            results["player_js"] = self._extract_real_player(year, view_type, output_dir)
+            extractors = {
+                "viewer_html": self._extract_real_viewer,
+                "config_xml": self._extract_config_xml,
+                "skin_js": self._extract_real_skin,
+                "player_js": self._extract_real_player
+            }
+            for asset, extract in extractors.items():
+                if assets is None or asset in assets:
+                    results[asset] = extract(year, view_type, output_dir)
             
             success_count = sum([v for v in results.values() if isinstance(v, bool)])
             print(f"[SELENIUM] Assets básicos generados: {success_count}/4")
@@ -410,15 +486,13 @@ class HondaSeleniumExtractor:
         try:
             print(f"[SELENIUM] Descargando script: {script_url}")
             
-            self.driver.get(script_url)
-            time.sleep(1)  # Reducido de 2 a 1
+            self._load_and_wait("script", script_url)
             
             # Obtener contenido del script
             script_content = self.driver.page_source
             
             # Guardar script
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(script_content)
+            write_file(output_file, script_content)
             
             print(f"[SELENIUM] Script guardado: {output_file}")
             return True
@@ -430,6 +504,13 @@ class HondaSeleniumExtractor:
     def _extract_config_xml(self, year: str, view_type: str, output_dir: Path) -> bool:
         """Extraer config.xml REAL desde Honda - NO GENERAR ARCHIVOS BÁSICOS"""
         try:
+            if self.config is not None:
+                # XML real ya descargado (cache de configuración): sin navegador ni esperas
+                config_file = output_dir / "config.xml"
+                write_file(config_file, self.config.content)
+                print(f"[SELENIUM] Config REAL desde cache guardado: {config_file}")
+                return True
+            
             # URLs reales de Honda para config.xml
             config_urls = [
                 f"https://automobiles.honda.com/images/{year}/city/360/ViewType.{view_type.upper()}/config.xml"
@@ -439,8 +520,7 @@ class HondaSeleniumExtractor:
                 print(f"[SELENIUM] Intentando descargar config REAL: {config_url}")
                 
                 try:
-                    self.driver.get(config_url)
-                    time.sleep(2)
+                    self._load_and_wait("config_xml", config_url)
                     
                     # Verificar si la página cargó correctamente
                     if "404" not in self.driver.title and self.driver.page_source.strip():
@@ -451,8 +531,7 @@ class HondaSeleniumExtractor:
                         
                         # Guardar config.xml REAL
                         config_file = output_dir / "config.xml"
-                        with open(config_file, 'w', encoding='utf-8') as f:
-                            f.write(xml_content)
+                        write_file(config_file, xml_content)
                         
                         print(f"[SELENIUM] Config REAL guardado: {config_file}")
                         return True
@@ -480,8 +559,7 @@ class HondaSeleniumExtractor:
                 print(f"[SELENIUM] Intentando descargar viewer REAL: {viewer_url}")
                 
                 try:
-                    self.driver.get(viewer_url)
-                    time.sleep(2)
+                    self._load_and_wait("viewer_html", viewer_url)
                     
                     # Verificar si la página cargó correctamente
                     if "404" not in self.driver.title and self.driver.page_source.strip():
@@ -492,8 +570,7 @@ class HondaSeleniumExtractor:
                         
                         # Guardar index.html REAL como viewer.html (para nuestro sistema)
                         viewer_file = output_dir / "viewer.html"
-                        with open(viewer_file, 'w', encoding='utf-8') as f:
-                            f.write(html_content)
+                        write_file(viewer_file, html_content)
                         
                         print(f"[SELENIUM] Viewer REAL guardado: {viewer_file}")
                         return True
@@ -683,13 +760,11 @@ class HondaSeleniumExtractor:
             
             # GUARDAR EN AMBAS UBICACIONES
             viewer_file = output_dir / "viewer.html"
-            with open(viewer_file, 'w', encoding='utf-8') as f:
-                f.write(viewer_content)
+            write_file(viewer_file, viewer_content)
             
             # TAMBIÉN GUARDAR EN CARPETA PRINCIPAL
             main_viewer = output_dir.parent / "viewer.html"
-            with open(main_viewer, 'w', encoding='utf-8') as f:
-                f.write(viewer_content)
+            write_file(main_viewer, viewer_content)
             
             print(f"[SELENIUM] Viewer básico generado: {viewer_file}")
             print(f"[SELENIUM] Viewer básico copiado a: {main_viewer}")
@@ -729,13 +804,11 @@ class HondaSeleniumExtractor:
             
             # GUARDAR EN AMBAS UBICACIONES
             config_file = output_dir / "config.xml"
-            with open(config_file, 'w', encoding='utf-8') as f:
-                f.write(config_content)
+            write_file(config_file, config_content)
             
             # TAMBIÉN GUARDAR EN CARPETA PRINCIPAL
             main_config = output_dir.parent / "config.xml"
-            with open(main_config, 'w', encoding='utf-8') as f:
-                f.write(config_content)
+            write_file(main_config, config_content)
             
             print(f"[SELENIUM] Config básico generado: {config_file}")
             print(f"[SELENIUM] Config básico copiado a: {main_config}")
@@ -791,8 +864,7 @@ class HondaSeleniumExtractor:
                 print(f"[SELENIUM] Intentando descargar skin REAL: {skin_url}")
                 
                 try:
-                    self.driver.get(skin_url)
-                    time.sleep(2)
+                    self._load_and_wait("skin_js", skin_url)
                     
                     # Verificar si la página cargó correctamente
                     if "404" not in self.driver.title and self.driver.page_source.strip():
@@ -803,15 +875,13 @@ class HondaSeleniumExtractor:
                         
                         # Guardar skin.js REAL
                         skin_file = output_dir / "skin.js"
-                        with open(skin_file, 'w', encoding='utf-8') as f:
-                            f.write(js_content)
+                        write_file(skin_file, js_content)
                         
                         # TAMBIÉN GUARDAR EN CARPETA ASSETS
                         assets_dir = output_dir.parent / "assets"
                         assets_dir.mkdir(exist_ok=True)
                         assets_file = assets_dir / "skin.js"
-                        with open(assets_file, 'w', encoding='utf-8') as f:
-                            f.write(js_content)
+                        write_file(assets_file, js_content)
                         
                         print(f"[SELENIUM] Skin REAL guardado: {skin_file}")
                         print(f"[SELENIUM] Skin REAL copiado a: {assets_file}")
@@ -858,15 +928,13 @@ if (typeof module !== 'undefined' && module.exports) {{
             
             # GUARDAR EN AMBAS UBICACIONES
             skin_file = output_dir / "skin.js"
-            with open(skin_file, 'w', encoding='utf-8') as f:
-                f.write(skin_content)
+            write_file(skin_file, skin_content)
             
             # TAMBIÉN GUARDAR EN CARPETA ASSETS
             assets_dir = output_dir.parent / "assets"
             assets_dir.mkdir(exist_ok=True)
             assets_file = assets_dir / "skin.js"
-            with open(assets_file, 'w', encoding='utf-8') as f:
-                f.write(skin_content)
+            write_file(assets_file, skin_content)
             
             print(f"[FALLBACK] Skin básico generado: {skin_file}")
             print(f"[FALLBACK] Skin básico copiado a: {assets_file}")
@@ -891,8 +959,7 @@ if (typeof module !== 'undefined' && module.exports) {{
                 print(f"[SELENIUM] Intentando descargar player REAL: {player_url}")
                 
                 try:
-                    self.driver.get(player_url)
-                    time.sleep(2)
+                    self._load_and_wait("player_js", player_url)
                     
                     # Verificar si la página cargó correctamente
                     if "404" not in self.driver.title and self.driver.page_source.strip():
@@ -903,15 +970,13 @@ if (typeof module !== 'undefined' && module.exports) {{
                         
                         # Guardar player.js REAL
                         player_file = output_dir / player_name
-                        with open(player_file, 'w', encoding='utf-8') as f:
-                            f.write(js_content)
+                        write_file(player_file, js_content)
                         
                         # TAMBIÉN GUARDAR EN CARPETA ASSETS
                         assets_dir = output_dir.parent / "assets"
                         assets_dir.mkdir(exist_ok=True)
                         assets_file = assets_dir / player_name
-                        with open(assets_file, 'w', encoding='utf-8') as f:
-                            f.write(js_content)
+                        write_file(assets_file, js_content)
                         
                         print(f"[SELENIUM] Player REAL guardado: {player_file}")
                         print(f"[SELENIUM] Player REAL copiado a: {assets_file}")
@@ -997,15 +1062,13 @@ if (typeof module !== 'undefined' && module.exports) {{
             
             # GUARDAR EN AMBAS UBICACIONES
             player_file = output_dir / player_name
-            with open(player_file, 'w', encoding='utf-8') as f:
-                f.write(player_content)
+            write_file(player_file, player_content)
             
             # TAMBIÉN GUARDAR EN CARPETA ASSETS
             assets_dir = output_dir.parent / "assets"
             assets_dir.mkdir(exist_ok=True)
             assets_file = assets_dir / player_name
-            with open(assets_file, 'w', encoding='utf-8') as f:
-                f.write(player_content)
+            write_file(assets_file, player_content)
             
             print(f"[FALLBACK] Player básico generado: {player_file}")
             print(f"[FALLBACK] Player básico copiado a: {assets_file}")
@@ -1015,85 +1078,110 @@ if (typeof module !== 'undefined' && module.exports) {{
             print(f"[FALLBACK] Error generando player básico: {e}")
             return False
 
+async def publish_viewer_assets(results: Dict, view_type: str, output_dir: Path, quality_level: int) -> Path:
+    """
+    Enlazar los assets obtenidos (por HTTP o por el navegador) en las carpetas
+    del sistema; devuelve la carpeta sistema de esa calidad
+    """
+    system_base = output_dir.parent.parent / f"ViewType.{view_type.upper()}" / str(quality_level)
+    assets_dir = system_base / "assets"
+    images_dir = system_base / "images"
+    assets_dir.mkdir(parents=True, exist_ok=True)
+    images_dir.mkdir(parents=True, exist_ok=True)
+    
+    print(f"[ASSETS] Copiando assets a sistema: {system_base}")
+    
+    # Copiar archivos generados
+    files_to_copy = []
+    if results.get("config_xml"):
+        files_to_copy.append(("config.xml", "config.xml"))
+    if results.get("skin_js"):
+        files_to_copy.append(("skin.js", "skin.js"))
+    if results.get("player_js"):
+        player_name = "pano2vr_player.js" if view_type == "interior" else "object2vr_player.js"
+        files_to_copy.append((player_name, player_name))
+    if results.get("viewer_html"):
+        files_to_copy.append(("viewer.html", "viewer.html"))
+    
+    # Publicar vía blob store: hardlinks al contenido, sin copiar bytes
+    for source_name, dest_name in files_to_copy:
+        source_file = output_dir / source_name
+        if source_file.exists():
+            # Enlazar en carpeta principal del sistema
+            dest_file = system_base / dest_name
+            await blob_store.publish_file(source_file, dest_file)
+            print(f"[ASSETS] Enlazado {source_name} a {dest_file}")
+            
+            # Enlazar en carpeta assets (para JS)
+            if source_name.endswith('.js'):
+                assets_file = assets_dir / dest_name
+                await blob_store.publish_file(source_file, assets_file)
+                print(f"[ASSETS] Enlazado {source_name} a assets: {assets_file}")
+        else:
+            print(f"[ASSETS] Archivo no encontrado: {source_file}")
+    
+    # VERIFICAR QUE viewer.html EXISTE Y ENLAZARLO
+    viewer_source = output_dir / "viewer.html"
+    if viewer_source.exists():
+        viewer_dest = system_base / "viewer.html"
+        await blob_store.publish_file(viewer_source, viewer_dest)
+        print(f"[ASSETS] viewer.html enlazado a sistema: {viewer_dest}")
+    else:
+        print(f"[ASSETS] viewer.html NO encontrado en: {viewer_source}")
+    
+    return system_base
+
 # Función principal para usar desde el backend
-async def extract_honda_assets_with_selenium(year: str, view_type: str, output_dir: Path, quality_level: int = 0) -> Dict[str, bool]:
+async def extract_honda_assets_with_selenium(year: str, view_type: str, output_dir: Path, quality_level: int = 0,
+                                             config: Optional[ConfigInfo] = None,
+                                             job_id: Optional[str] = None) -> Dict[str, bool]:
     """
     Función principal para extraer assets de Honda usando Selenium
-    AHORA TAMBIÉN DESCARGA IMÁGENES TILES
+    AHORA TAMBIÉN DESCARGA IMÁGENES TILES (motor async con la sesión del navegador)
+    config (opcional): ConfigInfo del cache; si viene, no se vuelve a pedir el XML
+    job_id (opcional): turno y tope de ancho de banda de la extracción en el planificador
+    results["session_headers"]: headers con las credenciales del navegador para el resto del job
     """
-    extractor = HondaSeleniumExtractor()
+    extractor = HondaSeleniumExtractor(config)
     
     try:
-        # PASO 1: Extraer assets (mantener WebDriver vivo)
-        results = extractor.extract_assets_from_honda_page(year, view_type, output_dir)
+        # PASO 1: Extraer assets (una carga del viewer con captura de red)
+        # En un hilo: esperar un navegador libre del pool no debe frenar el event loop
+        results = await asyncio.to_thread(extractor.extract_assets_from_honda_page, year, view_type, output_dir)
         
-        # PASO 2: Descargar tiles MIENTRAS WebDriver está vivo
-        print(f"[SELENIUM] Iniciando descarga de imágenes tiles para {view_type}...")
-        tiles_downloaded = await extractor.download_tiles(year, view_type, output_dir, quality_level)
-        results["tiles_downloaded"] = tiles_downloaded
+        # PASO 2: Sesión del navegador (cookies, tokens, UA, referer) para el motor HTTP
+        results["session_headers"] = await asyncio.to_thread(extractor.session_headers, year, view_type)
         
     finally:
-        # PASO 3: Cerrar WebDriver al final
+        # PASO 3: Devolver el WebDriver al pool: las transferencias ya no lo necesitan
         extractor.cleanup_driver()
     
-    # COPIAR ASSETS A CARPETAS DEL SISTEMA
-    if any(results.values()):
-        system_base = output_dir.parent.parent / f"ViewType.{view_type.upper()}" / str(quality_level)
-        assets_dir = system_base / "assets"
+    # PASO 4: Tiles con el motor async y las credenciales del navegador
+    print(f"[SELENIUM] Iniciando descarga de imágenes tiles para {view_type}...")
+    tile_names = await extractor.download_tiles(year, view_type, output_dir, quality_level,
+                                                results["session_headers"], job_id=job_id)
+    results["tiles_downloaded"] = len(tile_names)
+    
+    # COPIAR ASSETS A CARPETAS DEL SISTEMA (session_headers/tiles_downloaded no cuentan como asset)
+    if any(results.get(asset) for asset in ASSET_KEYS) or tile_names:
+        system_base = await publish_viewer_assets(results, view_type, output_dir, quality_level)
         images_dir = system_base / "images"
-        assets_dir.mkdir(parents=True, exist_ok=True)
-        images_dir.mkdir(parents=True, exist_ok=True)
-        
-        print(f"[SELENIUM] Copiando assets a sistema: {system_base}")
-        
-        # Copiar archivos generados
-        files_to_copy = []
-        if results.get("config_xml"):
-            files_to_copy.append(("config.xml", "config.xml"))
-        if results.get("skin_js"):
-            files_to_copy.append(("skin.js", "skin.js"))
-        if results.get("player_js"):
-            player_name = "pano2vr_player.js" if view_type == "interior" else "object2vr_player.js"
-            files_to_copy.append((player_name, player_name))
-        if results.get("viewer_html"):
-            files_to_copy.append(("viewer.html", "viewer.html"))
-        
-        import shutil
-        for source_name, dest_name in files_to_copy:
-            source_file = output_dir / source_name
-            if source_file.exists():
-                # Copiar a carpeta principal del sistema
-                dest_file = system_base / dest_name
-                shutil.copy2(source_file, dest_file)
-                print(f"[SELENIUM] Copiado {source_name} a {dest_file}")
-                
-                # Copiar a carpeta assets (para JS)
-                if source_name.endswith('.js'):
-                    assets_file = assets_dir / dest_name
-                    shutil.copy2(source_file, assets_file)
-                    print(f"[SELENIUM] Copiado {source_name} a assets: {assets_file}")
-            else:
-                print(f"[SELENIUM] Archivo no encontrado: {source_file}")
-        
-        # VERIFICAR QUE viewer.html EXISTE Y COPIARLO
-        viewer_source = output_dir / "viewer.html"
-        if viewer_source.exists():
-            viewer_dest = system_base / "viewer.html"
-            shutil.copy2(viewer_source, viewer_dest)
-            print(f"[SELENIUM] viewer.html copiado a sistema: {viewer_dest}")
-        else:
-            print(f"[SELENIUM] viewer.html NO encontrado en: {viewer_source}")
         
         # COPIAR IMÁGENES TILES DESCARGADAS
-        if tiles_downloaded > 0:
-            print(f"[SELENIUM] Copiando {tiles_downloaded} imágenes tiles a sistema...")
+        if tile_names:
+            print(f"[SELENIUM] Copiando {len(tile_names)} imágenes tiles a sistema...")
+            # Solo las copias con nombre Selenium: en tiles/ también están los paths Honda
+            # (c{column}_l{level}_...) y en subcarpetas los tile_{y}.jpg que chocan entre sí
             tiles_source_dir = output_dir / "tiles"
-            if tiles_source_dir.exists():
-                # Copiar todas las imágenes tiles
-                for tile_file in tiles_source_dir.rglob("*.jpg"):
-                    relative_path = tile_file.relative_to(tiles_source_dir)
-                    dest_tile = images_dir / relative_path.name
-                    shutil.copy2(tile_file, dest_tile)
-                    print(f"[SELENIUM] Tile copiado: {relative_path.name}")
+            for tile_name in tile_names:
+                await blob_store.publish_file(tiles_source_dir / tile_name, images_dir / tile_name)
+                print(f"[SELENIUM] Tile enlazado: {tile_name}")
+    
+    # Reporte de tiempos: esperas medidas vs. estimación con los sleeps fijos anteriores
+    results["timings"] = timing_report(extractor.timings)
+    if extractor.timings:
+        print(f"[TIMING] Selenium: {results['timings']['total_seconds']}s "
+              f"(estimado con los sleeps fijos anteriores: {results['timings']['estimated_legacy_total_seconds']}s, "
+              f"ahorro estimado {results['timings']['estimated_saved_seconds']}s)")
     
     return results
@@ -1,20 +1,102 @@
 import aiohttp
 import asyncio
 import xml.etree.ElementTree as ET
-import re
-import os
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Optional, Union
 from datetime import datetime
 
-from app.utils.patterns import (
-    get_honda_config_url, 
-    get_honda_images_base_url,
-    TILE_PATTERNS,
-    RESOLUTIONS, 
-    calculate_tiles_per_level
-)
 from app.models.honda import TileInfo, ConfigInfo, TileExtractionStats
+from app.services.download_engine import download_engine
+from app.services.tile_plan import build_tile_plan, tile_relative_path
+from app.services.blob_store import blob_store, write_file
+from app.services.config_cache import config_cache
+from app.services.concurrency import AdaptiveConcurrencyController, CONCURRENCY_SETTINGS
+from app.services.pipeline import BoundedPipeline
+from app.services.manifest import (
+    TileManifest, MANIFEST_FILENAME, STATUS_DONE, STATUS_MISSING, STATUS_FAILED,
+    SYNC_RESUME, SYNC_INCREMENTAL
+)
+
+def parse_config(content: str, config_url: str) -> ConfigInfo:
+    """
+    Parsear XML Object2VR (exterior) / Pano2VR (interior) de Honda a ConfigInfo
+    Sin I/O: lo usan get_config, los scripts y el cache de configuración
+    """
+    # Determinar tecnología basada en el XML
+    if '<vrobject' in content:
+        technology = "object2vr"
+    elif '<panorama' in content:
+        technology = "pano2vr"
+    else:
+        raise Exception(f"Tecnología XML desconocida en {config_url}")
+    
+    # Parsear XML para extraer información
+    root = ET.fromstring(content)
+    
+    # Resolución de cada nivel (0 = máxima) y tamaño de tile declarados en el XML
+    input_elem = root.find('input')
+    level_sizes = [
+        {"width": int(level.get('width')), "height": int(level.get('height'))}
+        for level in root.findall('.//level')
+        if level.get('width') and level.get('height')
+    ]
+    tile_size = int(input_elem.get('tilesize')) if input_elem is not None and input_elem.get('tilesize') else None
+    
+    if technology == "object2vr":
+        # Para exterior (Object2VR)
+        columns = int(input_elem.get('columns', 32))
+        rows = int(input_elem.get('rows', 1))
+        levels = len(root.findall('.//level'))
+        
+        # Obtener resolución máxima
+        first_level = root.find('.//level')
+        max_resolution = {
+            "width": int(first_level.get('width')),
+            "height": int(first_level.get('height'))
+        }
+        
+        tile_pattern = input_elem.get('leveltileurl')
+        
+        return ConfigInfo(
+            url=config_url,
+            content=content,
+            technology=technology,
+            columns=columns,
+            rows=rows,
+            levels=levels,
+            max_resolution=max_resolution,
+            tile_pattern=tile_pattern,
+            level_sizes=level_sizes,
+            tile_size=tile_size
+        )
+    
+    elif technology == "pano2vr":
+        # Para interior (Pano2VR)
+        levels = len(root.findall('.//level'))
+        
+        # Pano2VR siempre tiene 6 caras (cubo)
+        faces = 6
+        
+        # Resolución máxima
+        max_resolution = {
+            "width": int(input_elem.get('width')),
+            "height": int(input_elem.get('height'))
+        }
+        
+        tile_pattern = input_elem.get('leveltileurl')
+        
+        return ConfigInfo(
+            url=config_url,
+            content=content,
+            technology=technology,
+            faces=faces,
+            levels=levels,
+            max_resolution=max_resolution,
+            tile_pattern=tile_pattern,
+            level_sizes=level_sizes,
+            tile_size=tile_size
+        )
+
 
 class HondaCityExtractor:
     """
@@ -24,217 +106,155 @@ class HondaCityExtractor:
     
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+        self._owns_engine = False
+        self.retries = 0  # Reintentos de la última descarga paralela
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(
-            headers=self.headers,
-            timeout=aiohttp.ClientTimeout(total=30)
-        )
+        # Usar el pool compartido; si la app no lo inició (scripts), iniciarlo aquí
+        self._owns_engine = not download_engine.running
+        await download_engine.start()
+        self.session = download_engine.session
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        if self._owns_engine:
+            await download_engine.close()
+        self.session = None
     
     async def get_config(self, year: str, view_type: str) -> ConfigInfo:
         """
-        Descargar y parsear configuración XML Honda
-        Usa los patterns CORREGIDOS del reconnaissance
+        Configuración XML Honda parseada
+        Pasa por el cache compartido (TTL + ETag + single-flight + disco)
         """
-        config_url = get_honda_config_url(year, view_type)
-        
-        async with self.session.get(config_url) as response:
-            if response.status != 200:
-                raise Exception(f"Error descargando config {config_url}: {response.status}")
-            
-            content = await response.text()
-            
-        # Determinar tecnología basada en el XML
-        if '<vrobject' in content:
-            technology = "object2vr"
-        elif '<panorama' in content:
-            technology = "pano2vr"
-        else:
-            raise Exception(f"Tecnología XML desconocida en {config_url}")
-        
-        # Parsear XML para extraer información
-        root = ET.fromstring(content)
-        
-        if technology == "object2vr":
-            # Para exterior (Object2VR)
-            input_elem = root.find('input')
-            columns = int(input_elem.get('columns', 32))
-            rows = int(input_elem.get('rows', 1))
-            levels = len(root.findall('.//level'))
-            
-            # Obtener resolución máxima
-            first_level = root.find('.//level')
-            max_resolution = {
-                "width": int(first_level.get('width')),
-                "height": int(first_level.get('height'))
-            }
-            
-            tile_pattern = input_elem.get('leveltileurl')
-            
-            return ConfigInfo(
-                url=config_url,
-                content=content,
-                technology=technology,
-                columns=columns,
-                rows=rows,
-                levels=levels,
-                max_resolution=max_resolution,
-                tile_pattern=tile_pattern
-            )
-        
-        elif technology == "pano2vr":
-            # Para interior (Pano2VR)
-            input_elem = root.find('input')
-            levels = len(root.findall('.//level'))
-            
-            # Pano2VR siempre tiene 6 caras (cubo)
-            faces = 6
-            
-            # Resolución máxima
-            max_resolution = {
-                "width": int(input_elem.get('width')),
-                "height": int(input_elem.get('height'))
-            }
-            
-            tile_pattern = input_elem.get('leveltileurl')
-            
-            return ConfigInfo(
-                url=config_url,
-                content=content,
-                technology=technology,
-                faces=faces,
-                levels=levels,
-                max_resolution=max_resolution,
-                tile_pattern=tile_pattern
-            )
+        return await config_cache.get(year, view_type)
     
     def generate_tile_urls(self, year: str, view_type: str, config: ConfigInfo, quality_level: int = 0) -> List[TileInfo]:
         """
-        Generar todas las URLs de tiles basado en configuración
-        USAR PATHS CORREGIDOS
+        Generar todas las URLs de tiles de un nivel basado en configuración
+        La grilla sale del XML parseado (ver tile_plan.build_tile_plan)
         """
-        base_url = get_honda_images_base_url(year, view_type)
-        tiles = []
-        
-        if config.technology == "object2vr":
-            # Exterior - Object2VR con PATHS CORREGIDOS
-            pattern = TILE_PATTERNS["object2vr"]
-            resolutions = RESOLUTIONS[year]["exterior"]
-            resolution = resolutions[quality_level]
-            
-            tiles_x, tiles_y = calculate_tiles_per_level(resolution, pattern["tile_size"])
+        return build_tile_plan(year, view_type, config, levels=[quality_level]).to_tile_infos()
+    
+    def tile_file_path(self, tile: TileInfo, download_dir: Path) -> Path:
+        """
+        Path local de un tile: el mismo path relativo del plan (patrón del XML, con filas)
+        TileInfo armados a mano (sin tile_path) usan el patrón Honda por defecto
+        """
+        if tile.tile_path:
+            return download_dir / tile.tile_path
+        if tile.column is not None:  # Object2VR
+            return download_dir / tile_relative_path("object2vr", tile.column, tile.level, tile.x, tile.y,
+                                                     tile.row or 0)
+        return download_dir / tile_relative_path("pano2vr", tile.face, tile.level, tile.x, tile.y)
+    
+    async def download_tile(self, tile: TileInfo, download_dir: Path,
+                            controller: Optional[AdaptiveConcurrencyController] = None,
+                            manifest: Optional[TileManifest] = None, revalidate: bool = False,
+                            job_id: Optional[str] = None) -> Union[bool, str]:
+        """
+        Descargar un tile individual (reporta latencia/status al controlador AIMD)
+        revalidate=True envía request condicional; un 304 deja el archivo local intacto
+        y devuelve "unchanged"
+        """
+        file_path = self.tile_file_path(tile, download_dir)
+        key = str(file_path.relative_to(download_dir))
+        request_headers = manifest.conditional_headers(key) if (manifest and revalidate) else None
+        try:
+            # Streaming a disco con rename atómico (ver DownloadEngine.download_to_file)
+            result = await download_engine.download_to_file(tile.url, file_path, headers=request_headers,
+                                                            controller=controller, store=blob_store, job_id=job_id)
+            if not result["coalesced"]:
+                self.retries += result["attempts"] - 1
             
-            for column in range(config.columns):
-                for y in range(tiles_y):
-                    for x in range(tiles_x):
-                        # USAR PATTERN CORREGIDO: sin 'images/'
-                        tile_path = pattern["pattern"].format(
-                            column=column, 
-                            level=quality_level, 
-                            y=y, 
-                            x=x
-                        )
-                        
-                        tile_url = base_url + tile_path
-                        
-                        tiles.append(TileInfo(
-                            url=tile_url,
-                            level=quality_level,
-                            column=column,
-                            x=x,
-                            y=y
-                        ))
-        
-        elif config.technology == "pano2vr":
-            # Interior - Pano2VR
-            pattern = TILE_PATTERNS["pano2vr"] 
-            resolutions = RESOLUTIONS[year]["interior"]
-            resolution = resolutions[quality_level]
+            if result["status"] == 304 and revalidate:
+                tile.downloaded = True
+                tile.file_size = manifest.get(key)["size"]
+                manifest.mark_unchanged(key)
+                return "unchanged"
             
-            tiles_x, tiles_y = calculate_tiles_per_level(resolution, pattern["tile_size"])
+            if result["stored"]:
+                tile.downloaded = True
+                tile.file_size = result["size"]
+                if manifest:
+                    manifest.record(key, tile.url, file_path, STATUS_DONE, size=result["size"],
+                                    sha256=result["sha256"], etag=result["etag"],
+                                    last_modified=result["last_modified"])
+                return True
             
-            for face in range(6):  # 6 caras del cubo
-                for y in range(tiles_y):
-                    for x in range(tiles_x):
-                        tile_path = pattern["pattern"].format(
-                            face=face,
-                            level=quality_level,
-                            x=x,
-                            y=y
-                        )
-                        
-                        tile_url = base_url + tile_path
-                        
-                        tiles.append(TileInfo(
-                            url=tile_url,
-                            level=quality_level,
-                            face=face,
-                            x=x,
-                            y=y
-                        ))
-        
-        return tiles
-    
-    async def download_tile(self, tile: TileInfo, download_dir: Path) -> bool:
-        """Descargar un tile individual"""
-        try:
-            async with self.session.get(tile.url) as response:
-                if response.status == 200:
-                    content = await response.read()
-                    
-                    # Crear subdirectorios según estructura Honda config
-                    if tile.column is not None:  # Object2VR - patrón Honda exacto
-                        file_path = download_dir / "tiles" / f"c{tile.column}_l{tile.level}_{tile.y}_{tile.x}.jpg"
-                    else:  # Pano2VR - mantener estructura actual
-                        file_path = download_dir / "tiles" / "node1" / f"cf_{tile.face}" / f"l_{tile.level}" / f"c_{tile.x}" / f"tile_{tile.y}.jpg"
-                    
-                    file_path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    with open(file_path, 'wb') as f:
-                        f.write(content)
-                    
-                    tile.downloaded = True
-                    tile.file_size = len(content)
-                    return True
-                    
-                else:
-                    print(f"Error descargando {tile.url}: {response.status}")
-                    return False
+            print(f"Error descargando {tile.url}: {result['status'] or result['error']} ({result['attempts']} intentos)")
+            if manifest:
+                manifest.record(key, tile.url, file_path,
+                                STATUS_MISSING if result["status"] == 404 else STATUS_FAILED)
+            return False
                     
+        except asyncio.TimeoutError:
+            print(f"Timeout descargando {tile.url}")
+            if manifest:
+                manifest.record(key, tile.url, file_path, STATUS_FAILED)
+            return False
         except Exception as e:
             print(f"Exception descargando {tile.url}: {e}")
+            if manifest:
+                manifest.record(key, tile.url, file_path, STATUS_FAILED)
             return False
     
     async def download_tiles_parallel(self, tiles: List[TileInfo], download_dir: Path, 
-                                    max_concurrent: int = 10) -> TileExtractionStats:
+                                    max_concurrent: int = CONCURRENCY_SETTINGS["max_limit"],
+                                    manifest: Optional[TileManifest] = None,
+                                    sync_mode: str = SYNC_RESUME,
+                                    job_id: Optional[str] = None) -> TileExtractionStats:
         """
-        Descargar tiles en paralelo con control de concurrencia
+        Descargar tiles en paralelo con control de concurrencia adaptativo (AIMD)
+        job_id: turno propio en el DownloadScheduler (por defecto, el directorio destino)
+        max_concurrent es el techo; el límite real se ajusta según responde el CDN
+        Con manifest, los tiles ya verificados en disco no se vuelven a descargar
+        (o se revalidan con ETag/If-Modified-Since en modo incremental)
         """
         start_time = datetime.now()
-        semaphore = asyncio.Semaphore(max_concurrent)
+        self.retries = 0
+        job_id = job_id or str(download_dir)
+        controller = AdaptiveConcurrencyController({
+            "max_limit": max_concurrent,
+            "initial": min(CONCURRENCY_SETTINGS["initial"], max_concurrent)
+        })
         
-        async def download_with_semaphore(tile: TileInfo):
-            async with semaphore:
-                return await self.download_tile(tile, download_dir)
+        resumed = 0
+        unchanged = 0
+        successful = 0
+        failed = 0
         
-        # Ejecutar descargas en paralelo
-        results = await asyncio.gather(
-            *[download_with_semaphore(tile) for tile in tiles],
-            return_exceptions=True
-        )
+        async def fetch_tile(tile: TileInfo):
+            # Reanudar: los tiles ya verificados en disco no se descargan
+            file_path = self.tile_file_path(tile, download_dir)
+            key = str(file_path.relative_to(download_dir))
+            if manifest and manifest.is_verified(key, file_path):
+                if sync_mode == SYNC_INCREMENTAL and manifest.conditional_headers(key):
+                    return await self.download_tile(tile, download_dir, controller, manifest,
+                                                    revalidate=True, job_id=job_id)
+                tile.downloaded = True
+                tile.file_size = manifest.get(key)["size"]
+                return "resumed"
+            return await self.download_tile(tile, download_dir, controller, manifest, job_id=job_id)
         
-        # Calcular estadísticas
-        successful = sum(1 for result in results if result is True)
-        failed = len(results) - successful
+        async def write_result(result: Union[bool, str]):
+            nonlocal resumed, unchanged, successful, failed
+            if result == "resumed":
+                resumed += 1
+            elif result == "unchanged":
+                unchanged += 1
+            if result:
+                successful += 1
+            else:
+                failed += 1
+            if manifest and manifest.needs_flush():
+                await manifest.flush()
+        
+        # Pipeline acotado: tiles -> cola -> workers -> escritor (memoria constante)
+        await BoundedPipeline({"workers": max_concurrent}).run(tiles, fetch_tile, write_result)
+        if manifest:
+            await manifest.flush()
         
+        # Calcular estadísticas
         total_size_bytes = sum(tile.file_size or 0 for tile in tiles if tile.downloaded)
         total_size_mb = total_size_bytes / (1024 * 1024)
         
@@ -249,11 +269,16 @@ class HondaCityExtractor:
             failed_downloads=failed,
             total_size_mb=round(total_size_mb, 2),
             download_time_seconds=round(download_time, 2),
-            average_speed_mbps=round(speed_mbps, 2)
+            average_speed_mbps=round(speed_mbps, 2),
+            concurrency_curve=controller.curve,
+            resumed_tiles=resumed,
+            unchanged_tiles=unchanged,
+            retries=self.retries
         )
     
     async def extract_honda_city(self, year: str, view_type: str, quality_level: int = 0, 
-                               download_path: Optional[str] = None) -> TileExtractionStats:
+                               download_path: Optional[str] = None,
+                               sync_mode: str = SYNC_RESUME) -> TileExtractionStats:
         """
         Método principal de extracción Honda City
         TODO EL PROCESO COMPLETO con PATHS CORREGIDOS
@@ -276,14 +301,14 @@ class HondaCityExtractor:
         
         print(f"📊 Total de tiles a descargar: {len(tiles)}")
         
-        # 4. Descargar tiles en paralelo
+        # 4. Descargar tiles en paralelo (reanudando desde el manifest si existe)
         print(f"⬇️ Iniciando descarga paralela...")
-        stats = await self.download_tiles_parallel(tiles, download_dir)
+        manifest = await asyncio.to_thread(TileManifest.load, download_dir / MANIFEST_FILENAME)
+        stats = await self.download_tiles_parallel(tiles, download_dir, manifest=manifest, sync_mode=sync_mode)
         
         # 5. Guardar configuración XML
         config_file = download_dir / "config.xml"
-        with open(config_file, 'w', encoding='utf-8') as f:
-            f.write(config.content)
+        write_file(config_file, config.content)
         
         print(f"✅ Extracción completada!")
         print(f"   📊 Exitosas: {stats.successful_downloads}/{stats.total_tiles}")
@@ -0,0 +1,350 @@
+"""
+COLA DURABLE DE SHARDS (SQLITE EN EL VOLUMEN COMPARTIDO)
+Varias máquinas con el mismo filesystem cooperan en una extracción: cada
+worker (python -m app.worker) reclama un shard con un lease, lo renueva con
+heartbeats y lo marca terminado. Si un worker muere, su lease vence y otro
+worker reclama el shard (continúa desde su manifest parcial).
+"""
+
+import json
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.services.sharding import shard_ranges
+from app.services.tile_downloader import TileProgress
+
+JOB_QUEUE_PATH = Path("downloads") / ".cache" / "jobs.sqlite3"
+
+QUEUE_SETTINGS = {
+    "lease_seconds": 30.0,      # Un shard sin heartbeat durante este tiempo se puede reclamar
+    "heartbeat_interval": 5.0,  # Cada cuánto renueva el lease un worker
+    "max_attempts": 3,          # Reclamos por shard antes de darlo por fallido
+    "poll_interval": 2.0,       # Espera de un worker sin shards disponibles
+    "busy_timeout": 30.0        # Espera por el lock de SQLite (varios nodos escribiendo)
+}
+
+# Estados de jobs y shards
+QUEUE_PENDING = "pending"
+QUEUE_LEASED = "leased"
+QUEUE_DONE = "done"
+QUEUE_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL,
+    shards INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    merged_at REAL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    job_id TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    first_group INTEGER NOT NULL,
+    last_group INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, shard)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    last_heartbeat REAL NOT NULL,
+    job_id TEXT,
+    shard INTEGER,
+    shards_done INTEGER NOT NULL DEFAULT 0,
+    tiles_done INTEGER NOT NULL DEFAULT 0,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    current_tiles INTEGER NOT NULL DEFAULT 0,
+    current_bytes INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+
+class ShardQueue:
+    """
+    Cola de shards sobre SQLite
+    - Journal por defecto (no WAL): el lock de archivo funciona también en volúmenes de red
+    - Cada operación abre su conexión: seguro entre procesos y entre hilos (asyncio.to_thread)
+    """
+
+    def __init__(self, path: Path = JOB_QUEUE_PATH, settings: Optional[Dict] = None):
+        self.path = path
+        self.settings = {**QUEUE_SETTINGS, **(settings or {})}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            # Bases creadas antes de merged_at
+            if "merged_at" not in {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}:
+                db.execute("ALTER TABLE jobs ADD COLUMN merged_at REAL")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=self.settings["busy_timeout"], isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Transacción con lock de escritura desde el inicio (evita dos reclamos del mismo shard)"""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def enqueue(self, spec: Dict, groups: int, shards: int, job_id: Optional[str] = None) -> str:
+        """Publicar un job repartido en shards por rango de columnas/caras"""
+        job_id = job_id or str(uuid.uuid4())
+        ranges = shard_ranges(groups, shards)
+        with self._transaction() as db:
+            db.execute("INSERT INTO jobs (job_id, spec, status, shards, created_at) VALUES (?, ?, ?, ?, ?)",
+                       (job_id, json.dumps(spec), QUEUE_PENDING, len(ranges), time.time()))
+            db.executemany(
+                "INSERT INTO shards (job_id, shard, first_group, last_group, status) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, shard, first, last, QUEUE_PENDING) for shard, (first, last) in enumerate(ranges)]
+            )
+        print(f"[QUEUE] Job {job_id}: {len(ranges)} shards en cola")
+        return job_id
+
+    def register_worker(self, worker_id: str):
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO workers (worker_id, host, started_at, last_heartbeat) VALUES (?, ?, ?, ?)",
+                       (worker_id, socket.gethostname(), now, now))
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Reclamar el siguiente shard pendiente (o con lease vencido)
+        Devuelve {"job_id", "shard", "groups", "spec", "attempt"} o None si no hay trabajo
+        """
+        now = time.time()
+        with self._transaction() as db:
+            while True:
+                row = db.execute(
+                    "SELECT s.*, j.spec FROM shards s JOIN jobs j USING (job_id) "
+                    "WHERE s.status = ? OR (s.status = ? AND s.lease_until < ?) "
+                    "ORDER BY j.created_at, s.shard LIMIT 1",
+                    (QUEUE_PENDING, QUEUE_LEASED, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= self.settings["max_attempts"]:
+                    # Demasiados workers murieron con este shard: no seguir reintentando
+                    db.execute("UPDATE shards SET status = ?, error = ? WHERE job_id = ? AND shard = ?",
+                               (QUEUE_FAILED, f"Lease vencido {row['attempts']} veces", row["job_id"], row["shard"]))
+                    self._finish_job_if_complete(db, row["job_id"])
+                    continue
+                if row["status"] == QUEUE_LEASED:
+                    print(f"[QUEUE] Shard {row['job_id']}/{row['shard']} reclamado: "
+                          f"lease de {row['worker_id']} vencido")
+                db.execute(
+                    "UPDATE shards SET status = ?, worker_id = ?, lease_until = ?, attempts = attempts + 1 "
+                    "WHERE job_id = ? AND shard = ?",
+                    (QUEUE_LEASED, worker_id, now + self.settings["lease_seconds"], row["job_id"], row["shard"])
+                )
+                db.execute("UPDATE jobs SET status = ? WHERE job_id = ? AND status = ?",
+                           (QUEUE_LEASED, row["job_id"], QUEUE_PENDING))
+                db.execute("UPDATE workers SET job_id = ?, shard = ?, current_tiles = 0, current_bytes = 0, "
+                           "last_heartbeat = ? WHERE worker_id = ?",
+                           (row["job_id"], row["shard"], now, worker_id))
+                return {
+                    "job_id": row["job_id"],
+                    "shard": row["shard"],
+                    "groups": (row["first_group"], row["last_group"]),
+                    "spec": json.loads(row["spec"]),
+                    "attempt": row["attempts"] + 1
+                }
+
+    def open_shards(self) -> int:
+        """Shards pendientes o con lease (vigente o vencido): trabajo que aún puede tocarle a alguien"""
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM shards WHERE status IN (?, ?)",
+                              (QUEUE_PENDING, QUEUE_LEASED)).fetchone()[0]
+
+    def heartbeat(self, worker_id: str, job_id: Optional[str] = None, shard: Optional[int] = None,
+                  progress: Optional[Dict] = None) -> bool:
+        """
+        Renovar el lease del shard en curso y publicar su progreso
+        False = el lease ya no es de este worker (otro lo reclamó): hay que abandonar el shard
+        """
+        now = time.time()
+        with self._transaction() as db:
+            tiles = progress["downloaded"] + progress["unchanged"] if progress else 0
+            transferred = progress["transferred_bytes"] if progress else 0
+            db.execute("UPDATE workers SET last_heartbeat = ?, current_tiles = ?, current_bytes = ? "
+                       "WHERE worker_id = ?", (now, tiles, transferred, worker_id))
+            if job_id is None:
+                return True
+            updated = db.execute(
+                "UPDATE shards SET lease_until = ?, progress = ? "
+                "WHERE job_id = ? AND shard = ? AND worker_id = ? AND status = ?",
+                (now + self.settings["lease_seconds"], json.dumps(progress) if progress else None,
+                 job_id, shard, worker_id, QUEUE_LEASED)
+            ).rowcount
+            return updated == 1
+
+    def complete(self, worker_id: str, job_id: str, shard: int, result: Dict) -> bool:
+        """
+        Marcar el shard como terminado (solo si el lease sigue siendo de este worker)
+        Devuelve True si era el último shard del job
+        """
+        progress = result["progress"]
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE shards SET status = ?, progress = ?, result = ?, lease_until = NULL "
+                "WHERE job_id = ? AND shard = ? AND worker_id = ? AND status = ?",
+                (QUEUE_DONE, json.dumps(progress), json.dumps(result), job_id, shard, worker_id, QUEUE_LEASED)
+            ).rowcount
+            db.execute(
+                "UPDATE workers SET job_id = NULL, shard = NULL, current_tiles = 0, current_bytes = 0, "
+                "shards_done = shards_done + ?, tiles_done = tiles_done + ?, bytes_done = bytes_done + ?, "
+                "last_heartbeat = ? WHERE worker_id = ?",
+                (updated, progress["downloaded"] + progress["unchanged"], progress["transferred_bytes"],
+                 time.time(), worker_id)
+            )
+            return bool(updated) and self._finish_job_if_complete(db, job_id)
+
+    def fail(self, worker_id: str, job_id: str, shard: int, error: str) -> bool:
+        """
+        Devolver el shard a la cola (o marcarlo fallido si agotó los intentos)
+        Devuelve True si con esto terminó el job (en estado failed)
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT attempts FROM shards WHERE job_id = ? AND shard = ? AND worker_id = ?",
+                             (job_id, shard, worker_id)).fetchone()
+            if row is None:
+                return False
+            status = QUEUE_FAILED if row["attempts"] >= self.settings["max_attempts"] else QUEUE_PENDING
+            db.execute("UPDATE shards SET status = ?, error = ?, worker_id = NULL, lease_until = NULL "
+                       "WHERE job_id = ? AND shard = ?", (status, error, job_id, shard))
+            db.execute("UPDATE workers SET job_id = NULL, shard = NULL WHERE worker_id = ?", (worker_id,))
+            return self._finish_job_if_complete(db, job_id)
+
+    def claim_merge(self) -> Optional[Dict]:
+        """
+        Reservar un job terminado (done o failed) cuyos manifests parciales no se fusionaron
+        Cubre todos los finales: último shard completado, fallido o con lease agotado en claim()
+        Devuelve {"job_id", "status", "shards", "spec"} o None
+        """
+        with self._connect() as db:
+            # Lectura sin lock primero: los workers lo consultan en cada vuelta
+            if db.execute("SELECT 1 FROM jobs WHERE finished_at IS NOT NULL AND merged_at IS NULL "
+                          "LIMIT 1").fetchone() is None:
+                return None
+        with self._transaction() as db:
+            row = db.execute("SELECT job_id, status, shards, spec FROM jobs "
+                             "WHERE finished_at IS NOT NULL AND merged_at IS NULL "
+                             "ORDER BY finished_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET merged_at = ? WHERE job_id = ?", (time.time(), row["job_id"]))
+            return {"job_id": row["job_id"], "status": row["status"], "shards": row["shards"],
+                    "spec": json.loads(row["spec"])}
+
+    def _finish_job_if_complete(self, db: sqlite3.Connection, job_id: str) -> bool:
+        statuses = [row["status"] for row in db.execute("SELECT status FROM shards WHERE job_id = ?", (job_id,))]
+        if any(status in (QUEUE_PENDING, QUEUE_LEASED) for status in statuses):
+            return False
+        status = QUEUE_DONE if all(status == QUEUE_DONE for status in statuses) else QUEUE_FAILED
+        db.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE job_id = ? AND finished_at IS NULL",
+                   (status, time.time(), job_id))
+        return True
+
+    def job_status(self, job_id: str) -> Optional[Dict]:
+        """Estado de un job: shards, progreso sumado y workers asignados"""
+        with self._connect() as db:
+            job = db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            shards = db.execute("SELECT * FROM shards WHERE job_id = ? ORDER BY shard", (job_id,)).fetchall()
+
+        progress = TileProgress.merge(json.loads(row["progress"]) if row["progress"] else None for row in shards)
+        counts: Dict[str, int] = {}
+        for row in shards:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "spec": {key: value for key, value in json.loads(job["spec"]).items() if key != "config_content"},
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "merged_at": job["merged_at"],
+            "shard_counts": counts,
+            "progress": {key: value for key, value in progress.as_dict().items() if key != "successful_files"},
+            "shards": [
+                {
+                    "shard": row["shard"],
+                    "groups": [row["first_group"], row["last_group"]],
+                    "status": row["status"],
+                    "worker_id": row["worker_id"],
+                    "attempts": row["attempts"],
+                    "error": row["error"]
+                }
+                for row in shards
+            ]
+        }
+
+    def list_jobs(self) -> List[Dict]:
+        with self._connect() as db:
+            rows = db.execute("SELECT job_id, status, shards, created_at, finished_at FROM jobs "
+                              "ORDER BY created_at").fetchall()
+        return [dict(row) for row in rows]
+
+    def workers(self) -> List[Dict]:
+        """Workers registrados con su throughput (tiles/s y Mbps desde que arrancaron)"""
+        now = time.time()
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM workers ORDER BY started_at").fetchall()
+        workers = []
+        for row in rows:
+            elapsed = max(row["last_heartbeat"] - row["started_at"], 1e-6)
+            tiles = row["tiles_done"] + row["current_tiles"]
+            transferred = row["bytes_done"] + row["current_bytes"]
+            workers.append({
+                "worker_id": row["worker_id"],
+                "host": row["host"],
+                "alive": now - row["last_heartbeat"] < self.settings["lease_seconds"],
+                "job_id": row["job_id"],
+                "shard": row["shard"],
+                "shards_done": row["shards_done"],
+                "tiles": tiles,
+                "tiles_per_second": round(tiles / elapsed, 2),
+                "throughput_mbps": round(transferred * 8 / 1_000_000 / elapsed, 2),
+                "last_heartbeat_seconds_ago": round(now - row["last_heartbeat"], 1)
+            })
+        return workers
+
+
+_shard_queue: Optional[ShardQueue] = None
+
+
+def get_shard_queue() -> ShardQueue:
+    """Cola compartida de la API (se crea al primer uso, no al importar)"""
+    global _shard_queue
+    if _shard_queue is None:
+        _shard_queue = ShardQueue()
+    return _shard_queue
@@ -0,0 +1,160 @@
+"""
+MANIFEST DE TILES POR EXTRACCIÓN
+Registro durable (JSON) de cada archivo: URL, path destino, tamaño, hash,
+estado y ETag del origen. Permite reanudar extracciones saltando lo ya
+verificado en disco con un simple stat.
+"""
+
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+MANIFEST_FILENAME = "manifest.json"
+
+# Estados de cada entrada
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_MISSING = "missing"   # 404 en el origen
+STATUS_FAILED = "failed"
+
+# Modos de sincronización de una extracción
+SYNC_RESUME = "resume"            # Saltar lo verificado en disco
+SYNC_INCREMENTAL = "incremental"  # Revalidar lo verificado con requests condicionales
+
+
+class TileManifest:
+    """
+    Manifest de una extracción (una entrada por archivo, clave = path relativo)
+    Se guarda con escritura atómica (tmp + os.replace) para sobrevivir a caídas
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self.extraction_id: Optional[str] = None
+        self._unsaved_changes = 0
+        self._flush_lock = asyncio.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> "TileManifest":
+        """Cargar manifest existente (o vacío si no existe / está corrupto)"""
+        manifest = cls(path)
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                manifest.entries = data.get("entries", {})
+                manifest.extraction_id = data.get("extraction_id")
+            except (OSError, ValueError) as e:
+                print(f"[MANIFEST] Manifest ilegible, se reconstruye: {path} ({e})")
+        return manifest
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key)
+
+    def is_verified(self, key: str, *targets: Path) -> bool:
+        """
+        True si el archivo ya se descargó y sigue en disco con el tamaño esperado
+        Solo hace stat (no relee ni rehashea el contenido)
+        """
+        entry = self.entries.get(key)
+        if not entry or entry.get("status") != STATUS_DONE:
+            return False
+
+        for target in targets:
+            try:
+                if os.stat(target).st_size != entry.get("size"):
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def conditional_headers(self, key: str) -> Dict[str, str]:
+        """Headers If-None-Match / If-Modified-Since según lo guardado del origen"""
+        entry = self.entries.get(key) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def mark_unchanged(self, key: str):
+        """El origen respondió 304: el archivo local sigue vigente"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry["checked_at"] = datetime.now().isoformat()
+            self._unsaved_changes += 1
+
+    def record(self, key: str, url: str, path: Path, status: str, size: Optional[int] = None,
+               sha256: Optional[str] = None, etag: Optional[str] = None, **extra):
+        """Crear o actualizar la entrada de un archivo"""
+        entry = self.entries.setdefault(key, {})
+        entry.update({
+            "url": url,
+            "path": str(path),
+            "status": status,
+            "updated_at": datetime.now().isoformat()
+        })
+        if size is not None:
+            entry["size"] = size
+        if sha256 is not None:
+            entry["sha256"] = sha256
+        if etag is not None:
+            entry["etag"] = etag
+        entry.update({k: v for k, v in extra.items() if v is not None})
+        self._unsaved_changes += 1
+
+    def merge(self, other: "TileManifest"):
+        """Incorporar las entradas de otro manifest (p. ej. el parcial de un shard)"""
+        self.entries.update(other.entries)
+        self._unsaved_changes += len(other.entries)
+
+    def counts(self) -> Dict[str, int]:
+        """Número de entradas por estado"""
+        counts: Dict[str, int] = {}
+        for entry in self.entries.values():
+            counts[entry.get("status", STATUS_PENDING)] = counts.get(entry.get("status", STATUS_PENDING), 0) + 1
+        return counts
+
+    def needs_flush(self, every: int = 50) -> bool:
+        return self._unsaved_changes >= every
+
+    def _snapshot(self) -> Dict:
+        """Copia consistente del estado (tomarla en el hilo del event loop)"""
+        return {
+            "extraction_id": self.extraction_id,
+            "saved_at": datetime.now().isoformat(),
+            "counts": self.counts(),
+            "entries": {key: dict(entry) for key, entry in self.entries.items()}
+        }
+
+    def _write(self, data: Dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # tmp único por escritor: varios procesos (shards, workers) pueden escribir el mismo path
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def save(self):
+        """Escritura atómica del manifest (bloqueante)"""
+        self._write(self._snapshot())
+        self._unsaved_changes = 0
+
+    async def flush(self):
+        """Escritura atómica sin bloquear el event loop"""
+        async with self._flush_lock:
+            data = self._snapshot()
+            self._unsaved_changes = 0
+            await asyncio.to_thread(self._write, data)
@@ -0,0 +1,178 @@
+"""
+CAPTURA DE RED DEL VIEWER (CDP)
+Una sola carga de la página del viewer: Chrome registra los eventos Network
+en el log "performance" y los cuerpos se piden con Network.getResponseBody.
+Cada respuesta (XML, JS, CSS, tiles que pidió el player) se guarda byte a
+byte, sin pasar por page_source, y queda un manifest de URLs observadas
+que el plan de tiles puede aprovechar.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from app.utils.patterns import get_honda_config_url, get_honda_images_base_url
+
+NETWORK_MANIFEST_FILENAME = "network_manifest.json"
+
+# Tipos de recurso del log de Chrome que se guardan (el resto solo se anota)
+CAPTURE_RESOURCE_TYPES = {"Document", "Script", "Stylesheet", "Image", "XHR", "Fetch", "Other"}
+
+# Nombres con los que el resto del sistema espera los assets del viewer
+VIEWER_ASSET_NAMES = {"index.html": "viewer.html"}
+
+
+def enable_network_capture(options):
+    """Activar el log de performance (eventos CDP Network) en las opciones de Chrome"""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def viewer_base_url(year: str, view_type: str) -> str:
+    return f"https://www.honda.mx/web/img/cars/models/city/{year}/city_{year}_{view_type[:3]}_360/"
+
+
+def viewer_page_url(year: str, view_type: str) -> str:
+    return viewer_base_url(year, view_type) + "index.html"
+
+
+def capture_destination(url: str, year: str, view_type: str, output_dir: Path) -> Dict:
+    """
+    Dónde se guarda una respuesta capturada (mismo layout que honda_original/)
+    - tiles bajo la URL base de imágenes: output_dir/<path Honda> (como TileDownloader)
+    - assets del viewer: output_dir/<nombre> (index.html -> viewer.html)
+    - config XML: output_dir/config.xml
+    - cualquier otra cosa: output_dir/network/<host>/<path>
+    """
+    if url == get_honda_config_url(year, view_type):
+        return {"kind": "asset", "path": output_dir / "config.xml"}
+    images_base = get_honda_images_base_url(year, view_type)
+    if url.startswith(images_base):
+        relative = url[len(images_base):]
+        if relative.startswith("tiles/"):
+            return {"kind": "tile", "path": output_dir / relative, "tile_path": relative}
+    for base in (images_base, viewer_base_url(year, view_type)):
+        if url.startswith(base):
+            relative = url[len(base):] or "index.html"
+            return {"kind": "asset", "path": output_dir / VIEWER_ASSET_NAMES.get(relative, relative)}
+    parts = urlsplit(url)
+    return {"kind": "other", "path": output_dir / "network" / parts.netloc / (parts.path.strip("/") or "index")}
+
+
+class NetworkCapture:
+    """
+    Respuestas vistas por un driver de Chrome entre reset() y collect()
+    Requiere el driver lanzado con enable_network_capture (ver browser_pool)
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def reset(self):
+        """Descartar eventos previos (el navegador viene del pool)"""
+        self.driver.get_log("performance")
+
+    def collect(self) -> List[Dict]:
+        """Respuestas terminadas desde el último reset(), con su cuerpo en bytes"""
+        responses: Dict[str, Dict] = {}
+        finished = set()
+        for log_entry in self.driver.get_log("performance"):
+            message = json.loads(log_entry["message"])["message"]
+            params = message.get("params", {})
+            if message["method"] == "Network.responseReceived":
+                response = params["response"]
+                headers = {name.lower(): value for name, value in response.get("headers", {}).items()}
+                responses[params["requestId"]] = {
+                    "url": response["url"],
+                    "status": response["status"],
+                    "mime_type": response.get("mimeType"),
+                    "resource_type": params.get("type"),
+                    "etag": headers.get("etag"),
+                    "last_modified": headers.get("last-modified")
+                }
+            elif message["method"] == "Network.loadingFinished":
+                finished.add(params["requestId"])
+
+        captured = []
+        for request_id, response in responses.items():
+            if request_id not in finished or response["url"].startswith("data:"):
+                continue
+            if response["resource_type"] in CAPTURE_RESOURCE_TYPES and response["status"] == 200:
+                try:
+                    body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+                    # Binarios llegan en base64; el texto ya decodificado se reencoda en UTF-8
+                    response["body"] = (base64.b64decode(body["body"]) if body.get("base64Encoded")
+                                        else body["body"].encode("utf-8"))
+                except Exception as e:
+                    # El navegador pudo descartar el cuerpo (recursos grandes / redirecciones)
+                    response["error"] = str(e) or type(e).__name__
+            captured.append(response)
+        return captured
+
+
+def save_capture(responses: List[Dict], year: str, view_type: str, output_dir: Path) -> List[Dict]:
+    """Escribir los cuerpos capturados y devolver las entradas del manifest de red"""
+    entries = []
+    for response in responses:
+        destination = capture_destination(response["url"], year, view_type, output_dir)
+        entry = {
+            "url": response["url"],
+            "status": response["status"],
+            "mime_type": response["mime_type"],
+            "resource_type": response["resource_type"],
+            "kind": destination["kind"],
+            "etag": response["etag"],
+            "last_modified": response["last_modified"]
+        }
+        if destination.get("tile_path"):
+            entry["tile_path"] = destination["tile_path"]
+        body = response.get("body")
+        if body is not None:
+            path = destination["path"]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.part")
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, path)
+            entry.update({"path": str(path), "size": len(body), "sha256": hashlib.sha256(body).hexdigest()})
+        elif response.get("error"):
+            entry["error"] = response["error"]
+        entries.append(entry)
+    return entries
+
+
+def write_network_manifest(output_dir: Path, page_url: str, entries: List[Dict]) -> Path:
+    path = output_dir / NETWORK_MANIFEST_FILENAME
+    tmp_path = path.with_name(f".{path.name}.part")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "page_url": page_url,
+            "captured_at": datetime.now().isoformat(),
+            "entries": entries
+        }, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def append_network_entries(output_dir: Path, entries: List[Dict]) -> Path:
+    """Agregar entradas (p. ej. tiles bajados con la sesión del navegador) al manifest de red"""
+    network_manifest = load_network_manifest(output_dir) or {"page_url": None, "entries": []}
+    known = {entry["url"]: entry for entry in network_manifest["entries"]}
+    known.update({entry["url"]: entry for entry in entries})
+    return write_network_manifest(output_dir, network_manifest["page_url"], list(known.values()))
+
+
+def load_network_manifest(output_dir: Path) -> Optional[Dict]:
+    path = output_dir / NETWORK_MANIFEST_FILENAME
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[NETWORK] Manifest de red ilegible: {path} ({e})")
+        return None
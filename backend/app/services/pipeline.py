@@ -0,0 +1,96 @@
+"""
+PIPELINE ACOTADO PRODUCTOR / CONSUMIDOR
+El plan se recorre de forma perezosa hacia una cola acotada, un grupo fijo
+de workers hace los requests y una etapa escritora aparte registra los
+resultados (manifest, progreso, flush a disco). Nunca hay más de
+queue_size + workers + results_size tiles en memoria, sea cual sea el plan.
+"""
+
+import asyncio
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from app.services.concurrency import CONCURRENCY_SETTINGS
+
+PIPELINE_SETTINGS = {
+    "workers": CONCURRENCY_SETTINGS["max_limit"],  # >= techo AIMD para que el controlador pueda crecer
+    "queue_size": 256,      # Tiles esperando worker
+    "results_size": 256     # Resultados esperando a la etapa escritora
+}
+
+# Marca de fin de trabajo dentro de las colas
+_DONE = object()
+
+
+class BoundedPipeline:
+    """
+    productor (iterable perezoso) -> cola -> N workers -> cola -> escritor
+    - fetch(item) corre en los workers (red); el límite real de requests lo
+      siguen poniendo el controlador AIMD y el DownloadScheduler
+    - write(result) corre en una sola tarea, en el orden de llegada
+    Si cualquier etapa falla se cancelan las demás y se propaga el error
+    """
+
+    def __init__(self, settings: Optional[Dict] = None):
+        self.settings = {**PIPELINE_SETTINGS, **(settings or {})}
+        self.processed = 0
+        self.max_queued = 0
+        self.max_results_queued = 0
+
+    async def run(self, items: Iterable[Any], fetch: Callable[[Any], Awaitable[Any]],
+                  write: Callable[[Any], Any]) -> Dict:
+        work: asyncio.Queue = asyncio.Queue(maxsize=self.settings["queue_size"])
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.settings["results_size"])
+        workers_left = self.settings["workers"]
+
+        async def produce():
+            for item in items:
+                await work.put(item)
+                self.max_queued = max(self.max_queued, work.qsize())
+            for _ in range(self.settings["workers"]):
+                await work.put(_DONE)
+
+        async def consume():
+            nonlocal workers_left
+            while True:
+                item = await work.get()
+                if item is _DONE:
+                    break
+                await results.put(await fetch(item))
+                self.max_results_queued = max(self.max_results_queued, results.qsize())
+            workers_left -= 1
+            if not workers_left:
+                await results.put(_DONE)
+
+        async def write_results():
+            while True:
+                result = await results.get()
+                if result is _DONE:
+                    return
+                written = write(result)
+                if inspect.isawaitable(written):
+                    await written
+                self.processed += 1
+
+        tasks = [asyncio.create_task(produce()),
+                 *[asyncio.create_task(consume()) for _ in range(self.settings["workers"])],
+                 asyncio.create_task(write_results())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return self.snapshot()
+
+    def snapshot(self) -> Dict:
+        return {
+            "processed": self.processed,
+            "workers": self.settings["workers"],
+            "max_queued": self.max_queued,
+            "max_results_queued": self.max_results_queued
+        }
@@ -0,0 +1,186 @@
+"""
+LIMITADOR DE TASA POR ORIGEN (TOKEN BUCKET)
+Dos cubetas por host: requests/segundo y bytes/segundo. Se aplica a todo
+request saliente (extractor, assets y discovery). Los presupuestos se
+ajustan en caliente desde el endpoint de administración y se guardan en
+disco para que los scripts usen los mismos valores.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+RATE_LIMITS_PATH = Path("downloads") / ".cache" / "rate_limits.json"
+
+# Presupuesto por defecto (None = sin límite); "hosts" sobrescribe por host
+RATE_LIMIT_SETTINGS = {
+    "default": {
+        "requests_per_second": 25.0,
+        "bytes_per_second": None,
+        "burst_seconds": 1.0       # Capacidad de la cubeta = tasa * burst_seconds
+    },
+    "hosts": {}
+}
+
+BUDGET_KEYS = ("requests_per_second", "bytes_per_second", "burst_seconds")
+
+
+class TokenBucket:
+    """
+    Cubeta con deuda: se descuenta primero y se espera lo que falte.
+    Así un chunk más grande que la capacidad también pasa (esperando más)
+    """
+
+    def __init__(self, rate: Optional[float], burst_seconds: float = 1.0):
+        self._lock = threading.Lock()
+        self.configure(rate, burst_seconds)
+
+    def configure(self, rate: Optional[float], burst_seconds: float = 1.0):
+        with self._lock:
+            self.rate = rate if rate and rate > 0 else None
+            self.capacity = (self.rate or 0) * burst_seconds
+            self.tokens = self.capacity
+            self.updated = time.monotonic()
+
+    def _reserve(self, amount: float) -> float:
+        """Descontar amount y devolver los segundos a esperar"""
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self, amount: float = 1):
+        wait = self._reserve(amount)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, amount: float = 1):
+        """Versión bloqueante para scripts con requests"""
+        wait = self._reserve(amount)
+        if wait:
+            time.sleep(wait)
+
+
+class OriginRateLimiter:
+    """Cubetas requests/s y bytes/s por host de origen"""
+
+    def __init__(self, settings: Optional[Dict] = None, path: Optional[Path] = RATE_LIMITS_PATH):
+        settings = settings or RATE_LIMIT_SETTINGS
+        self.path = path
+        self.default = dict(settings["default"])
+        self.host_budgets: Dict[str, Dict] = {host: dict(budget) for host, budget in settings["hosts"].items()}
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {}
+
+    @classmethod
+    def load(cls, path: Path = RATE_LIMITS_PATH) -> "OriginRateLimiter":
+        """Limitador con los presupuestos guardados (o los por defecto)"""
+        settings = RATE_LIMIT_SETTINGS
+        if path is not None and path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                settings = {
+                    "default": {**RATE_LIMIT_SETTINGS["default"], **data.get("default", {})},
+                    "hosts": data.get("hosts", {})
+                }
+            except (OSError, ValueError) as e:
+                print(f"[RATE] Presupuestos ilegibles, usando los por defecto: {path} ({e})")
+        return cls(settings, path)
+
+    def budget(self, host: str) -> Dict:
+        """Presupuesto efectivo de un host"""
+        return {**self.default, **self.host_budgets.get(host, {})}
+
+    def _host_buckets(self, host: str) -> Dict[str, TokenBucket]:
+        if host not in self._buckets:
+            budget = self.budget(host)
+            self._buckets[host] = {
+                "requests": TokenBucket(budget["requests_per_second"], budget["burst_seconds"]),
+                "bytes": TokenBucket(budget["bytes_per_second"], budget["burst_seconds"])
+            }
+        return self._buckets[host]
+
+    async def acquire_request(self, url: str):
+        """Esperar turno para un request hacia el host de url"""
+        await self._host_buckets(urlsplit(url).netloc)["requests"].acquire(1)
+
+    async def consume_bytes(self, url: str, size: int):
+        """Descontar bytes recibidos del host (espera si se superó bytes/s)"""
+        await self._host_buckets(urlsplit(url).netloc)["bytes"].acquire(size)
+
+    def acquire_request_sync(self, url: str):
+        self._host_buckets(urlsplit(url).netloc)["requests"].acquire_sync(1)
+
+    def consume_bytes_sync(self, url: str, size: int):
+        self._host_buckets(urlsplit(url).netloc)["bytes"].acquire_sync(size)
+
+    def set_budget(self, host: Optional[str], **budget) -> Dict:
+        """
+        Ajustar en caliente el presupuesto de un host (o el por defecto si host es None)
+        Solo se cambian las claves indicadas; las cubetas afectadas se reconfiguran ya
+        None = sin límite; una tasa <= 0 se rechaza (TokenBucket la trataría como sin límite)
+        """
+        updates = {key: budget[key] for key in BUDGET_KEYS if key in budget}
+        for key, value in updates.items():
+            if value is not None and value <= 0:
+                raise ValueError(f"{key} debe ser > 0 o None (sin límite), recibido: {value}")
+        if host is None:
+            self.default.update(updates)
+            affected = list(self._buckets)
+        else:
+            self.host_budgets.setdefault(host, {}).update(updates)
+            affected = [host] if host in self._buckets else []
+
+        for name in affected:
+            effective = self.budget(name)
+            self._buckets[name]["requests"].configure(effective["requests_per_second"], effective["burst_seconds"])
+            self._buckets[name]["bytes"].configure(effective["bytes_per_second"], effective["burst_seconds"])
+
+        print(f"[RATE] Presupuesto {'por defecto' if host is None else host}: {updates}")
+        return self.budget(host) if host else dict(self.default)
+
+    def share(self, parts: int):
+        """
+        Quedarse con 1/parts de cada presupuesto (workers de una extracción por shards:
+        entre todos los procesos respetan el presupuesto original)
+        """
+        for budget in (self.default, *self.host_budgets.values()):
+            for key in ("requests_per_second", "bytes_per_second"):
+                if budget.get(key):
+                    budget[key] = budget[key] / parts
+        for host, buckets in self._buckets.items():
+            effective = self.budget(host)
+            buckets["requests"].configure(effective["requests_per_second"], effective["burst_seconds"])
+            buckets["bytes"].configure(effective["bytes_per_second"], effective["burst_seconds"])
+
+    def save(self):
+        """Guardar presupuestos (escritura atómica) para otros procesos y reinicios"""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"default": self.default, "hosts": self.host_budgets}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def snapshot(self) -> Dict:
+        return {
+            "default": dict(self.default),
+            "hosts": {
+                host: self.budget(host)
+                for host in sorted(set(self.host_budgets) | set(self._buckets))
+            }
+        }
+
+
+# Limitador único del proceso
+rate_limiter = OriginRateLimiter.load()
@@ -0,0 +1,156 @@
+"""
+REINTENTOS Y CIRCUIT BREAKER POR HOST
+Reintentos solo para GETs (idempotentes) ante errores de red y status
+transitorios, con backoff exponencial + jitter. El circuit breaker pausa el
+tráfico a un host cuando su tasa de errores se dispara y lo reabre con un
+request de prueba.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, Optional
+
+RETRY_SETTINGS = {
+    "max_attempts": 4,      # Intentos totales por request (1 = sin reintentos)
+    "base_delay": 0.5,      # Segundos antes del primer reintento
+    "max_delay": 10.0,      # Tope del backoff (y de Retry-After)
+}
+
+# Status que vale la pena reintentar (el 404 es definitivo)
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+CIRCUIT_SETTINGS = {
+    "window": 20,           # Últimos resultados evaluados por host
+    "min_requests": 10,     # No abrir con muy pocas muestras
+    "failure_rate": 0.5,    # Abrir si fallan >= 50% de la ventana
+    "open_seconds": 15.0,   # Pausa antes del request de prueba
+    "probe_poll": 0.25      # Espera de los demás requests mientras hay prueba en curso
+}
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class RetryPolicy:
+    """Backoff exponencial con full jitter: delay = random(0, min(max, base * 2^n))"""
+
+    def __init__(self, settings: Optional[Dict] = None):
+        self.settings = {**RETRY_SETTINGS, **(settings or {})}
+
+    def is_retryable_status(self, status: Optional[int]) -> bool:
+        return status in RETRYABLE_STATUSES
+
+    def should_retry(self, attempt: int) -> bool:
+        return attempt < self.settings["max_attempts"]
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Segundos a esperar tras el intento número attempt (1 = primero)"""
+        if retry_after is not None:
+            return min(self.settings["max_delay"], retry_after)
+        ceiling = min(self.settings["max_delay"], self.settings["base_delay"] * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After en segundos (se ignora el formato de fecha HTTP)"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """
+    Breaker de un host
+    - closed: tráfico normal, se mide la tasa de errores
+    - open: todos los requests esperan open_seconds
+    - half_open: pasa un solo request de prueba; si sale bien se cierra
+    Solo el resultado de la prueba (record(..., probe=True)) decide el estado fuera
+    de closed; los requests que ya estaban en vuelo al abrirse no cuentan
+    """
+
+    def __init__(self, host: str, settings: Optional[Dict] = None):
+        self.host = host
+        self.settings = {**CIRCUIT_SETTINGS, **(settings or {})}
+        self.state = CIRCUIT_CLOSED
+        self.trips = 0
+        self._outcomes = deque(maxlen=self.settings["window"])
+        self._open_until = 0.0
+        self._probing = False
+
+    async def wait_ready(self) -> bool:
+        """
+        Bloquear mientras el circuito esté abierto (o haya una prueba en curso)
+        True si el llamador quedó como request de prueba: debe reportar con
+        record(..., probe=True) o liberar el turno con release_probe()
+        """
+        while self.state != CIRCUIT_CLOSED:
+            now = time.monotonic()
+            if self.state == CIRCUIT_OPEN:
+                if now < self._open_until:
+                    await asyncio.sleep(self._open_until - now)
+                    continue
+                self.state = CIRCUIT_HALF_OPEN
+            if not self._probing:
+                self._probing = True
+                return True
+            await asyncio.sleep(self.settings["probe_poll"])
+        return False
+
+    def record(self, success: bool, probe: bool = False):
+        """Resultado de un request hacia el host (probe: era el request de prueba)"""
+        if self.state != CIRCUIT_CLOSED:
+            if probe and self._probing:
+                self._probing = False
+                if success:
+                    self.state = CIRCUIT_CLOSED
+                    self._outcomes.clear()
+                    print(f"[CIRCUIT] {self.host}: cerrado (prueba exitosa)")
+                else:
+                    self._open()
+            return
+
+        self._outcomes.append(success)
+        if self.state == CIRCUIT_CLOSED and len(self._outcomes) >= self.settings["min_requests"]:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.settings["failure_rate"]:
+                self._open()
+
+    def release_probe(self):
+        """La prueba terminó sin respuesta del host (cancelada o error local): otro request la repite"""
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._probing = False
+
+    def _open(self):
+        self.state = CIRCUIT_OPEN
+        self.trips += 1
+        self._open_until = time.monotonic() + self.settings["open_seconds"]
+        self._outcomes.clear()
+        print(f"[CIRCUIT] {self.host}: abierto por {self.settings['open_seconds']}s (errores altos)")
+
+    def snapshot(self) -> Dict:
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "recent_failures": self._outcomes.count(False),
+            "recent_requests": len(self._outcomes)
+        }
+
+
+class CircuitBreakerRegistry:
+    """Un CircuitBreaker por host de origen"""
+
+    def __init__(self, settings: Optional[Dict] = None):
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def for_host(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(host, self.settings)
+        return self._breakers[host]
+
+    def snapshot(self) -> Dict:
+        return {host: breaker.snapshot() for host, breaker in self._breakers.items()}
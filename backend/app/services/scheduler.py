@@ -0,0 +1,172 @@
+"""
+PLANIFICADOR GLOBAL DE DESCARGAS
+Un solo dueño para todos los requests salientes de tiles/assets del proceso:
+límite global de requests en vuelo, límite por host y reparto round-robin
+entre extracciones activas (un batch de 1,000 tiles no deja sin turno a una
+extracción interactiva de 48).
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+SCHEDULER_SETTINGS = {
+    "global_limit": 48,     # Requests en vuelo sumando todas las extracciones
+    "per_host_limit": 16,   # Requests en vuelo por host de origen (honda.mx)
+}
+
+# Job usado cuando el llamador no indica extracción (scripts, assets sueltos)
+SHARED_JOB = "_shared"
+
+
+def url_host(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+class DownloadScheduler:
+    """
+    Cola por extracción + turnos round-robin
+    - Cada job encola sus requests; al liberarse un hueco se atiende al
+      siguiente job del anillo cuyo primer request tenga hueco en su host
+    - El límite AIMD de cada job se aplica antes (AdaptiveConcurrencyController)
+    """
+
+    def __init__(self, settings: Optional[Dict] = None):
+        self.settings = {**SCHEDULER_SETTINGS, **(settings or {})}
+        self.in_flight = 0
+        self.host_in_flight: Dict[str, int] = {}
+        self._waiters: Dict[str, Deque[Tuple[str, asyncio.Future]]] = {}
+        self._ring: Deque[str] = deque()
+        self._jobs: Dict[str, Dict] = {}
+
+    def _job(self, job_id: str) -> Dict:
+        return self._jobs.setdefault(job_id, {
+            "requests": 0,
+            "in_flight": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        })
+
+    def _host_has_room(self, host: str) -> bool:
+        return self.host_in_flight.get(host, 0) < self.settings["per_host_limit"]
+
+    def _grant_next(self, job_id: str) -> bool:
+        """Dar hueco al primer request del job que tenga hueco en su host"""
+        queue = self._waiters[job_id]
+        for position, (host, future) in enumerate(queue):
+            if future.done():
+                continue
+            if self._host_has_room(host):
+                del queue[position]
+                self.in_flight += 1
+                self.host_in_flight[host] = self.host_in_flight.get(host, 0) + 1
+                self._job(job_id)["in_flight"] += 1
+                future.set_result(None)
+                return True
+        return False
+
+    def _dispatch(self):
+        """Repartir huecos libres entre jobs en orden round-robin"""
+        while self.in_flight < self.settings["global_limit"] and self._ring:
+            granted = False
+            for _ in range(len(self._ring)):
+                job_id = self._ring[0]
+                self._ring.rotate(-1)
+                queue = self._waiters[job_id]
+                # Limpiar requests cancelados mientras esperaban
+                while queue and queue[0][1].done():
+                    queue.popleft()
+                if not queue:
+                    self._ring.remove(job_id)
+                    del self._waiters[job_id]
+                    granted = True  # El anillo cambió: volver a recorrer
+                    break
+                if self._grant_next(job_id):
+                    granted = True
+                    break
+            if not granted:
+                break
+
+    async def acquire(self, job_id: str, host: str):
+        """Esperar turno para un request de job_id hacia host"""
+        future = asyncio.get_running_loop().create_future()
+        if job_id not in self._waiters:
+            self._waiters[job_id] = deque()
+            self._ring.append(job_id)
+        self._waiters[job_id].append((host, future))
+        queued_at = time.monotonic()
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelado justo después de recibir el hueco: devolverlo
+            if future.done() and not future.cancelled():
+                self.release(job_id, host)
+            raise
+
+        waited = time.monotonic() - queued_at
+        job = self._job(job_id)
+        job["requests"] += 1
+        job["wait_seconds"] += waited
+        job["max_wait_seconds"] = max(job["max_wait_seconds"], waited)
+
+    def release(self, job_id: str, host: str):
+        self.in_flight -= 1
+        self.host_in_flight[host] -= 1
+        if not self.host_in_flight[host]:
+            del self.host_in_flight[host]
+        self._job(job_id)["in_flight"] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, job_id: Optional[str], url: str):
+        """Hueco para un request: async with scheduler.slot(job_id, url): ..."""
+        job_id = job_id or SHARED_JOB
+        host = url_host(url)
+        await self.acquire(job_id, host)
+        try:
+            yield
+        finally:
+            self.release(job_id, host)
+
+    def job_summary(self, job_id: str) -> Dict:
+        """Turnos recibidos y espera en cola de una extracción"""
+        job = self._jobs.get(job_id)
+        if not job:
+            return {"requests": 0, "avg_wait_ms": 0.0, "max_wait_ms": 0.0}
+        return {
+            "requests": job["requests"],
+            "avg_wait_ms": round(job["wait_seconds"] / job["requests"] * 1000, 1) if job["requests"] else 0.0,
+            "max_wait_ms": round(job["max_wait_seconds"] * 1000, 1)
+        }
+
+    def forget(self, job_id: str):
+        """Descartar las estadísticas de un job terminado"""
+        job = self._jobs.get(job_id)
+        if job and not job["in_flight"] and job_id not in self._waiters:
+            del self._jobs[job_id]
+
+    def snapshot(self) -> Dict:
+        """Estado actual del planificador (para el endpoint de monitoreo)"""
+        return {
+            "global_limit": self.settings["global_limit"],
+            "per_host_limit": self.settings["per_host_limit"],
+            "in_flight": self.in_flight,
+            "hosts": dict(self.host_in_flight),
+            "jobs": {
+                job_id: {
+                    "in_flight": job["in_flight"],
+                    "queued": sum(1 for _, future in self._waiters.get(job_id, ()) if not future.done()),
+                    **self.job_summary(job_id)
+                }
+                for job_id, job in self._jobs.items()
+            }
+        }
+
+
+# Planificador único del proceso
+download_scheduler = DownloadScheduler()
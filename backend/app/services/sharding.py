@@ -0,0 +1,243 @@
+"""
+EXTRACCIÓN POR SHARDS EN VARIOS PROCESOS
+Para planes de catálogo el hash, la validación y la escritura de miles de
+tiles por segundo saturan un solo proceso (GIL). El plan se reparte por
+rangos de columnas (Object2VR) o caras (Pano2VR) entre N procesos worker,
+cada uno con su event loop, su pool de conexiones y su manifest parcial;
+el proceso principal fusiona progreso y manifests en uno solo.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from queue import Empty
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.concurrency import AdaptiveConcurrencyController
+from app.services.download_engine import get_download_engine
+from app.services.honda_service import parse_config
+from app.services.manifest import TileManifest
+from app.services.pipeline import BoundedPipeline
+from app.services.rate_limit import rate_limiter
+from app.services.scheduler import download_scheduler
+from app.services.tile_downloader import TileDownloader, TileProgress
+from app.services.tile_plan import TILE_STATUS_NAMES, build_tile_plan, status_counts
+
+SHARD_SETTINGS = {
+    "max_shards": os.cpu_count() or 4,  # Procesos worker por extracción
+    "report_interval": 0.5              # Segundos entre reportes de progreso de cada worker
+}
+
+
+def shard_ranges(groups: int, shards: int) -> List[Tuple[int, int]]:
+    """Rangos contiguos [inicio, fin) de columnas/caras, lo más parejos posible"""
+    shards = max(1, min(shards, groups))
+    size, extra = divmod(groups, shards)
+    ranges = []
+    start = 0
+    for shard in range(shards):
+        stop = start + size + (1 if shard < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def shard_manifest_path(manifest_path: Path, shard: int) -> Path:
+    return manifest_path.with_name(f"{manifest_path.stem}.shard{shard}{manifest_path.suffix}")
+
+
+def share_origin_limits(parts: int):
+    """Los límites hacia el origen son del conjunto: cada proceso usa 1/parts"""
+    download_scheduler.settings["global_limit"] = max(1, download_scheduler.settings["global_limit"] // parts)
+    download_scheduler.settings["per_host_limit"] = max(1, download_scheduler.settings["per_host_limit"] // parts)
+    rate_limiter.share(parts)
+
+
+def run_shard(spec: Dict, updates) -> Dict:
+    """Entrada del proceso worker: event loop y pool de conexiones propios"""
+    share_origin_limits(spec["shards"])
+    return asyncio.run(download_shard(spec, updates.put))
+
+
+async def download_shard(spec: Dict, report: Callable[[Dict], None],
+                         still_owner: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Descargar las columnas/caras spec["groups"] del plan con el engine del proceso
+    report recibe {"shard", "progress", ["levels_done", "level_status"]} periódicamente y al cerrar cada fase
+    Se usa desde los procesos de run_shard y desde los workers distribuidos (app.worker)
+    still_owner (workers distribuidos): False si el lease pasó a otro worker; desde ahí
+    el manifest parcial ya no se escribe (lo continúa el nuevo dueño del shard)
+    """
+    shard = spec["shard"]
+    first_group, last_group = spec["groups"]
+    config = parse_config(spec["config_content"], spec["config_url"])
+    tile_plan = build_tile_plan(spec["year"], spec["view_type"], config, spec["levels"])
+
+    def own(indices):
+        return (i for i in indices if first_group <= tile_plan.groups[i] < last_group)
+
+    # Manifest parcial: solo las entradas de este shard (el principal las fusiona al final)
+    # Si un intento anterior del shard dejó su parcial, se continúa desde ahí
+    manifest_path = Path(spec["manifest_path"])
+    base_manifest = TileManifest.load(manifest_path)
+    own_keys = {tile_plan.relative_path(i) for i in own(tile_plan.indices())}
+    manifest = TileManifest.load(shard_manifest_path(manifest_path, shard))
+    manifest.extraction_id = spec["extraction_id"]
+    manifest.entries = {**{key: entry for key, entry in base_manifest.entries.items() if key in own_keys},
+                        **manifest.entries}
+    del base_manifest, own_keys
+
+    job_id = f"{spec['extraction_id']}:shard{shard}"
+    engine = get_download_engine()
+    await engine.start()
+    engine.limit_job_bandwidth(job_id, spec["max_bandwidth_mbps"])
+    controller = AdaptiveConcurrencyController()
+    downloader = TileDownloader(engine, tile_plan, manifest, spec["base_url"], spec["headers"],
+                                Path(spec["honda_original_base"]), Path(spec["system_base"]),
+                                controller, job_id, hedge=spec["hedge"], incremental=spec["incremental"])
+    progress = TileProgress()
+    last_report = time.monotonic()
+
+    def owns_manifest() -> bool:
+        return still_owner is None or still_owner()
+
+    async def write_result(result: Dict):
+        nonlocal last_report
+        progress.add(result)
+        if time.monotonic() - last_report >= SHARD_SETTINGS["report_interval"]:
+            last_report = time.monotonic()
+            report({"shard": shard, "progress": progress.as_dict()})
+        if manifest.needs_flush() and owns_manifest():
+            await manifest.flush()
+
+    try:
+        for phase_levels, phase_indices in tile_plan.phases(spec["ordering"]):
+            await BoundedPipeline().run(own(phase_indices), downloader.fetch, write_result)
+            report({"shard": shard, "progress": progress.as_dict(), "levels_done": phase_levels,
+                    "level_status": {level: status_counts(tile_plan.status[i] for i in own(tile_plan.indices(level)))
+                                     for level in phase_levels}})
+    finally:
+        if owns_manifest():
+            await manifest.flush()
+        await engine.close()
+
+    shard_status = Counter(tile_plan.status[i] for i in own(tile_plan.indices()))
+    return {
+        "shard": shard,
+        "groups": [first_group, last_group],
+        "progress": progress.as_dict(),
+        "tile_status": {TILE_STATUS_NAMES[code]: count for code, count in shard_status.items()},
+        "total_bytes": tile_plan.total_bytes(),
+        "concurrency": controller.summary(),
+        "concurrency_curve": controller.curve
+    }
+
+
+def collect_updates(updates) -> List[Dict]:
+    """Vaciar la cola de reportes de los workers (cada get es IPC con el Manager: en un hilo)"""
+    collected = []
+    while True:
+        try:
+            collected.append(updates.get_nowait())
+        except Empty:
+            return collected
+
+
+def submit_shards(executor: ProcessPoolExecutor, specs: List[Dict], updates) -> List:
+    """Enviar los shards al pool (con spawn, submit lanza procesos: en un hilo)"""
+    return [executor.submit(run_shard, spec, updates) for spec in specs]
+
+
+def close_pool(executor: ProcessPoolExecutor, process_manager, wait: bool):
+    """
+    Cerrar pool y Manager (en un hilo: nunca en el event loop)
+    wait=False (error o cancelación): no se espera a los shards en curso; al cerrar el
+    Manager su próximo reporte falla y terminan tras guardar su manifest parcial
+    """
+    executor.shutdown(wait=wait, cancel_futures=not wait)
+    process_manager.shutdown()
+
+
+def merge_shard_manifests(manifest: TileManifest, shards: int):
+    """Fusionar los manifests parciales en el principal y borrarlos"""
+    for shard in range(shards):
+        path = shard_manifest_path(manifest.path, shard)
+        if not path.exists():
+            continue
+        manifest.merge(TileManifest.load(path))
+        path.unlink()
+
+
+async def run_sharded_extraction(spec: Dict, groups: int, shards: int, manifest: TileManifest,
+                                 on_progress: Callable[[TileProgress], None],
+                                 on_level_complete: Callable[[int, Dict[str, int]], None]) -> Dict:
+    """
+    Repartir el plan entre procesos worker y esperar a que terminen
+    - on_progress recibe el progreso sumado de todos los shards
+    - on_level_complete(level, tile_status) se llama cuando todos los shards terminaron ese
+      nivel, con los tiles del nivel por estado sumados entre shards
+    Los manifests parciales se fusionan siempre (también si un worker falla) para reanudar
+    """
+    ranges = shard_ranges(groups, shards)
+    cap = spec.get("max_bandwidth_mbps")
+    context = multiprocessing.get_context("spawn")
+    loop = asyncio.get_running_loop()
+    latest: Dict[int, Dict] = {}
+    levels_done: Dict[int, set] = {shard: set() for shard in range(len(ranges))}
+    level_status: Dict[int, Counter] = {}
+    completed_levels: set = set()
+
+    def apply_updates(collected: List[Dict]):
+        for update in collected:
+            latest[update["shard"]] = update["progress"]
+            levels_done[update["shard"]].update(update.get("levels_done", ()))
+            for level, counts in update.get("level_status", {}).items():
+                level_status.setdefault(level, Counter()).update(counts)
+        on_progress(TileProgress.merge(latest.values()))
+        for level in sorted(set.intersection(*levels_done.values()) - completed_levels, reverse=True):
+            completed_levels.add(level)
+            on_level_complete(level, dict(level_status.get(level, {})))
+
+    print(f"[SHARDS] {len(ranges)} procesos worker | rangos de columnas/caras: {ranges}")
+    # Manager y procesos (spawn) se crean y se cierran en hilos: el event loop de la API sigue libre
+    process_manager = await asyncio.to_thread(context.Manager)
+    executor = ProcessPoolExecutor(max_workers=len(ranges), mp_context=context)
+    finished = False
+    try:
+        updates = await asyncio.to_thread(process_manager.Queue)
+        specs = [{
+            **spec,
+            "shard": shard,
+            "shards": len(ranges),
+            "groups": shard_range,
+            "max_bandwidth_mbps": cap / len(ranges) if cap else None
+        } for shard, shard_range in enumerate(ranges)]
+        futures = [asyncio.wrap_future(future, loop=loop)
+                   for future in await asyncio.to_thread(submit_shards, executor, specs, updates)]
+        pending = set(futures)
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=SHARD_SETTINGS["report_interval"])
+            apply_updates(await asyncio.to_thread(collect_updates, updates))
+        results = [future.result() for future in futures]
+        finished = True
+    finally:
+        await asyncio.to_thread(close_pool, executor, process_manager, finished)
+        await asyncio.to_thread(merge_shard_manifests, manifest, len(ranges))
+        await manifest.flush()
+
+    progress = TileProgress.merge(result["progress"] for result in results)
+    on_progress(progress)
+    tile_status: Counter = Counter()
+    for result in results:
+        tile_status.update(result["tile_status"])
+    return {
+        "progress": progress,
+        "tile_status": dict(tile_status),
+        "total_bytes": sum(result["total_bytes"] for result in results),
+        "concurrency": {"shards": [{"groups": result["groups"], **result["concurrency"]} for result in results]},
+        "concurrency_curve": [result["concurrency_curve"] for result in results]
+    }
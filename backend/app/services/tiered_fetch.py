@@ -0,0 +1,224 @@
+"""
+FETCH ESCALONADO: HTTP PRIMERO, NAVEGADOR SOLO SI HACE FALTA
+Cada recurso se pide primero con el motor HTTP (rápido, sin Chrome). Solo
+ante una firma de bloqueo (403/429/503, página de challenge, cuerpo vacío)
+se escala al navegador, y se recuerda por host/directorio qué nivel
+funcionó para que la próxima corrida vaya directo. Lo aprendido "navegador"
+caduca (browser_ttl_seconds) para volver a probar HTTP.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from app.models.honda import ConfigInfo
+from app.services.blob_store import write_file
+from app.services.download_engine import DownloadEngine, get_download_engine
+from app.services.network_capture import viewer_base_url, viewer_page_url
+from app.utils.patterns import get_honda_config_url
+
+TIER_HTTP = "http"
+TIER_BROWSER = "browser"
+
+TIER_MEMORY_PATH = Path("downloads") / ".cache" / "fetch_tiers.json"
+
+TIERED_FETCH_SETTINGS = {
+    "block_statuses": (401, 403, 429, 503),  # Status que un navegador real sí puede pasar
+    "browser_ttl_seconds": 24 * 3600,         # Después de esto se vuelve a intentar HTTP
+    "sniff_bytes": 4096                       # Bytes revisados buscando páginas de challenge
+}
+
+# Marcas de páginas anti-bot / challenge (Akamai, Cloudflare, Incapsula, captchas)
+CHALLENGE_SIGNATURES = (
+    b"captcha", b"cf-chl", b"cf-browser-verification", b"challenge-platform",
+    b"_incapsula_resource", b"access denied", b"request unsuccessful",
+    b"bm-verify", b"please enable javascript", b"enable cookies"
+)
+
+
+def block_signature(status: Optional[int], content: bytes, block_statuses=TIERED_FETCH_SETTINGS["block_statuses"],
+                    sniff_bytes: int = TIERED_FETCH_SETTINGS["sniff_bytes"]) -> Optional[str]:
+    """Motivo por el que la respuesta HTTP parece bloqueada (None si no lo parece)"""
+    if status in block_statuses:
+        return f"status {status}"
+    if status != 200:
+        return None  # 404 y similares: el navegador no lo va a encontrar tampoco
+    if not content.strip():
+        return "cuerpo vacío"
+    head = content[:sniff_bytes].lower()
+    for signature in CHALLENGE_SIGNATURES:
+        if signature in head:
+            return f"challenge ({signature.decode()})"
+    return None
+
+
+def tier_key(url: str) -> str:
+    """host + directorio del recurso (los assets de un mismo viewer comparten nivel)"""
+    parts = urlsplit(url)
+    return parts.netloc + parts.path.rsplit("/", 1)[0] + "/"
+
+
+class TieredFetcher:
+    """
+    fetch(url) -> {"url", "tier", "status", "content", "blocked"}
+    - tier "http": content trae el cuerpo (o status de error no bloqueante, p. ej. 404)
+    - tier "browser": HTTP bloqueado (o recordado como bloqueado); el llamador escala
+      al navegador y confirma con remember(url, TIER_BROWSER)
+    La memoria por host/directorio se guarda en disco (escritura atómica)
+    """
+
+    def __init__(self, path: Path = TIER_MEMORY_PATH, settings: Optional[Dict] = None,
+                 engine: Optional[DownloadEngine] = None):
+        self.path = path
+        self.settings = {**TIERED_FETCH_SETTINGS, **(settings or {})}
+        self.engine = engine
+        self._memory: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()  # remember() corre en hilos: una escritura a la vez
+        self.http_hits = 0
+        self.escalations = 0
+        self.remembered_skips = 0
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._memory is None:
+            self._memory = {}
+            if self.path.exists():
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._memory = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"[TIERS] Memoria de niveles ilegible, se reinicia: {self.path} ({e})")
+        return self._memory
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.part")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._memory, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def tier_for(self, url: str) -> str:
+        """Nivel con el que conviene empezar: el recordado (si no caducó) o HTTP"""
+        entry = self._load().get(tier_key(url))
+        if not entry:
+            return TIER_HTTP
+        if entry["tier"] == TIER_BROWSER and \
+                time.time() - entry["updated_at"] > self.settings["browser_ttl_seconds"]:
+            return TIER_HTTP
+        return entry["tier"]
+
+    def remember(self, url: str, tier: str, reason: Optional[str] = None):
+        """Anotar el nivel que funcionó (solo se escribe a disco si cambió o caducó)"""
+        with self._lock:
+            memory = self._load()
+            key = tier_key(url)
+            entry = memory.get(key)
+            # Un "browser" vigente no se renueva: al caducar se vuelve a probar HTTP
+            if entry and entry["tier"] == tier and (tier == TIER_HTTP or self.tier_for(url) == TIER_BROWSER):
+                return
+            memory[key] = {"tier": tier, "reason": reason, "updated_at": time.time()}
+            self._save()
+        if not entry or entry["tier"] != tier:
+            print(f"[TIERS] {key} -> {tier}" + (f" ({reason})" if reason else ""))
+
+    def expects_browser(self) -> bool:
+        """Hay algún host/directorio recordado (y vigente) como nivel browser"""
+        return any(entry["tier"] == TIER_BROWSER and
+                   time.time() - entry["updated_at"] <= self.settings["browser_ttl_seconds"]
+                   for entry in self._load().values())
+
+    async def fetch(self, url: str, headers: Optional[Dict] = None) -> Dict:
+        if self.tier_for(url) == TIER_BROWSER:
+            self.remembered_skips += 1
+            return {"url": url, "tier": TIER_BROWSER, "status": None, "content": b"",
+                    "blocked": self._load()[tier_key(url)].get("reason")}
+
+        engine = self.engine or get_download_engine()
+        try:
+            response = await engine.fetch(url, headers=headers)
+            status, content = response["status"], response["content"]
+        except Exception as e:
+            # Error de red: no es una firma de bloqueo, el navegador no ayudaría
+            return {"url": url, "tier": TIER_HTTP, "status": None, "content": b"",
+                    "blocked": None, "error": str(e) or type(e).__name__}
+
+        blocked = block_signature(status, content, self.settings["block_statuses"], self.settings["sniff_bytes"])
+        if blocked:
+            self.escalations += 1
+            print(f"[TIERS] HTTP bloqueado en {url}: {blocked}, escalando al navegador")
+            return {"url": url, "tier": TIER_BROWSER, "status": status, "content": b"", "blocked": blocked}
+
+        if status == 200:
+            self.http_hits += 1
+            await asyncio.to_thread(self.remember, url, TIER_HTTP)
+        return {"url": url, "tier": TIER_HTTP, "status": status, "content": content, "blocked": None}
+
+    def snapshot(self) -> Dict:
+        return {
+            "http_hits": self.http_hits,
+            "escalations": self.escalations,
+            "remembered_browser_skips": self.remembered_skips,
+            "memory": self._load()
+        }
+
+
+tiered_fetcher = TieredFetcher()
+
+
+def viewer_asset_urls(year: str, view_type: str) -> Dict[str, Dict[str, str]]:
+    """Assets principales del viewer: URL en Honda y nombre local esperado por el sistema"""
+    player_name = "pano2vr_player.js" if view_type == "interior" else "object2vr_player.js"
+    viewer_base = viewer_base_url(year, view_type)
+    return {
+        "config_xml": {"url": get_honda_config_url(year, view_type), "filename": "config.xml"},
+        "viewer_html": {"url": viewer_page_url(year, view_type), "filename": "viewer.html"},
+        "skin_js": {"url": viewer_base + "skin.js", "filename": "skin.js"},
+        "player_js": {"url": viewer_base + player_name, "filename": player_name}
+    }
+
+
+async def fetch_viewer_assets(year: str, view_type: str, output_dir: Path,
+                              config: Optional[ConfigInfo] = None,
+                              headers: Optional[Dict] = None) -> Dict:
+    """
+    Assets del viewer por HTTP (nivel rápido)
+    results["escalate"]: assets que necesitan el navegador (bloqueo detectado o recordado)
+    results["tiers"]: nivel usado por cada asset; results["blocked"]: motivo de cada escalado
+    """
+    results = {"config_xml": False, "viewer_html": False, "skin_js": False, "player_js": False,
+               "error": None, "tiers": {}, "escalate": [], "blocked": {}}
+    assets = viewer_asset_urls(year, view_type)
+
+    if config is not None:
+        # XML real ya resuelto (cache de configuración): sin red
+        await asyncio.to_thread(write_file, output_dir / "config.xml", config.content)
+        results["config_xml"] = True
+        results["tiers"]["config_xml"] = "cache"
+        del assets["config_xml"]
+
+    responses = await asyncio.gather(*(tiered_fetcher.fetch(asset["url"], headers) for asset in assets.values()))
+    for (name, asset), response in zip(assets.items(), responses):
+        results["tiers"][name] = response["tier"]
+        if response["tier"] == TIER_BROWSER:
+            results["escalate"].append(name)
+            results["blocked"][name] = response["blocked"]
+        elif response["status"] == 200:
+            # Bytes tal cual llegaron (sin pasar por page_source); temporal + rename porque
+            # una corrida anterior pudo dejar el archivo como hardlink a un blob
+            await asyncio.to_thread(write_file, output_dir / asset["filename"], response["content"])
+            results[name] = True
+        else:
+            print(f"[TIERS] {asset['url']}: {response['status'] or response.get('error')}")
+    return results
+
+
+def remember_browser_results(year: str, view_type: str, results: Dict, blocked: Dict[str, str]):
+    """Los assets escalados que el navegador sí consiguió quedan recordados como nivel "browser" """
+    assets = viewer_asset_urls(year, view_type)
+    for name, reason in blocked.items():
+        if results.get(name):
+            tiered_fetcher.remember(assets[name]["url"], TIER_BROWSER, reason)
@@ -0,0 +1,214 @@
+"""
+DESCARGA DE TILES DE UN PLAN AL LAYOUT DUAL
+Unidad de trabajo compartida por la extracción en proceso y por los workers
+de la extracción por shards: descarga (o revalida) un tile hacia
+honda_original/ + images/ y lleva los contadores de progreso.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.services.blob_store import blob_store
+from app.services.concurrency import AdaptiveConcurrencyController
+from app.services.download_engine import DownloadEngine
+from app.services.manifest import TileManifest, STATUS_DONE, STATUS_MISSING, STATUS_FAILED
+from app.services.tile_plan import (
+    TilePlan, TILE_DONE, TILE_FAILED, TILE_MISSING, TILE_RESUMED, TILE_UNCHANGED
+)
+
+
+def extraction_headers(year: str) -> Dict[str, str]:
+    """Headers de navegador usados para pedir tiles a Honda"""
+    return {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+        'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+        'Accept-Language': 'es-MX,es;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+        'Referer': f'https://www.honda.mx/web/img/cars/models/city/{year}/',
+        'Connection': 'keep-alive',
+        'Sec-Fetch-Dest': 'image',
+        'Sec-Fetch-Mode': 'no-cors',
+        'Sec-Fetch-Site': 'same-origin'
+    }
+
+
+class TileDownloader:
+    """
+    Descarga de los tiles de un plan
+    - honda_original/<path Honda> y images/tile_XXXX.jpg son hardlinks al mismo blob
+    - Marca el plan y registra el manifest; devuelve un dict por tile para TileProgress
+    """
+
+    def __init__(self, engine: DownloadEngine, tile_plan: TilePlan, manifest: TileManifest,
+                 base_url: str, headers: Dict[str, str], honda_original_base: Path, system_base: Path,
+                 controller: AdaptiveConcurrencyController, job_id: str,
+                 hedge: bool = False, incremental: bool = False):
+        self.engine = engine
+        self.tile_plan = tile_plan
+        self.manifest = manifest
+        self.base_url = base_url
+        self.headers = headers
+        self.honda_original_base = honda_original_base
+        self.system_base = system_base
+        self.controller = controller
+        self.job_id = job_id
+        self.hedge = hedge
+        self.incremental = incremental
+
+    def system_file(self, index: int) -> Path:
+        """Archivo sistema (optimizado): numeración por posición en el plan"""
+        return self.system_base / "images" / f"tile_{index:04d}.jpg"
+
+    async def adopt_captured(self, entries: Iterable[Dict]) -> int:
+        """
+        Registrar en el manifest los tiles que el navegador ya descargó (manifest de red)
+        para que fetch() los trate como verificados en vez de volver a pedirlos
+        """
+        adopted = 0
+        for entry in entries:
+            index = self.tile_plan.index_of(entry["tile_path"]) if entry.get("tile_path") else None
+            if index is None or not entry.get("size"):
+                continue
+            file_path = self.tile_plan.relative_path(index)
+            honda_file = self.honda_original_base / file_path
+            if self.manifest.is_verified(file_path, honda_file, self.system_file(index)):
+                continue
+            try:
+                if os.stat(honda_file).st_size != entry["size"]:
+                    continue
+            except OSError:
+                continue
+            system_file = self.system_file(index)
+            await blob_store.publish_file(honda_file, system_file)
+            self.manifest.record(file_path, entry["url"], honda_file, STATUS_DONE, size=entry["size"],
+                                 sha256=entry["sha256"], etag=entry.get("etag"),
+                                 last_modified=entry.get("last_modified"), system_path=str(system_file),
+                                 source="browser")
+            adopted += 1
+        return adopted
+
+    async def fetch(self, index: int) -> Dict:
+        """Saltar lo verificado en disco (o revalidarlo en modo incremental) o descargar"""
+        file_path = self.tile_plan.relative_path(index)
+        if self.manifest.is_verified(file_path, self.honda_original_base / file_path, self.system_file(index)):
+            if self.incremental and self.manifest.conditional_headers(file_path):
+                return await self.download(index, revalidate=True)
+            self.tile_plan.mark(index, TILE_RESUMED, self.manifest.get(file_path).get("size", 0))
+            return {'status': 'resumed', 'file': file_path, 'index': index}
+        return await self.download(index)
+
+    async def download(self, index: int, revalidate: bool = False) -> Dict:
+        file_path = self.tile_plan.relative_path(index)
+        url = f"{self.base_url}/{file_path}"
+        honda_file = self.honda_original_base / file_path
+        try:
+            request_headers = ({**self.headers, **self.manifest.conditional_headers(file_path)}
+                               if revalidate else self.headers)
+            system_file = self.system_file(index)
+
+            # Streaming a disco con sha256 al vuelo; el contenido se guarda una vez
+            # en el blob store y honda_original/ + images/ quedan como hardlinks
+            result = await self.engine.download_to_file(url, honda_file, headers=request_headers,
+                                                        min_size=500, controller=self.controller,
+                                                        store=blob_store, extra_destinations=(system_file,),
+                                                        job_id=self.job_id, hedge=self.hedge)
+            status = result["status"]
+            # Reintentos propios (una descarga compartida no reintenta por su cuenta)
+            retries_used = 0 if result["coalesced"] else result["attempts"] - 1
+
+            if result["stored"]:  # Archivos válidos (> 500 bytes)
+                self.tile_plan.mark(index, TILE_DONE, result["size"])
+                self.manifest.record(file_path, url, honda_file, STATUS_DONE, size=result["size"],
+                                     sha256=result["sha256"], etag=result["etag"],
+                                     last_modified=result["last_modified"], system_path=str(system_file),
+                                     attempts=result["attempts"])
+                return {
+                    'status': 'success',
+                    'file': file_path,
+                    'size': result["size"],
+                    'deduplicated': result["deduplicated"],
+                    'retries': retries_used,
+                    'hedged': result["hedged"],
+                    'hedge_won': result["hedge_won"],
+                    'transferred': 0 if result["coalesced"] else result["size"],
+                    'index': index
+                }
+
+            elif status == 304 and revalidate:
+                # Sin cambios en el origen: no se reescribe nada
+                self.tile_plan.mark(index, TILE_UNCHANGED)
+                self.manifest.mark_unchanged(file_path)
+                return {'status': 'unchanged', 'file': file_path, 'retries': retries_used, 'index': index}
+
+            elif status == 404:
+                self.tile_plan.mark(index, TILE_MISSING)
+                self.manifest.record(file_path, url, honda_file, STATUS_MISSING)
+                return {'status': 'skip', 'file': file_path, 'retries': retries_used, 'index': index}
+            else:
+                self.tile_plan.mark(index, TILE_FAILED)
+                self.manifest.record(file_path, url, honda_file, STATUS_FAILED,
+                                     attempts=result["attempts"], error=result["error"])
+                return {'status': 'error', 'file': file_path, 'code': status, 'error': result["error"],
+                        'retries': retries_used, 'index': index}
+
+        except Exception as e:
+            self.tile_plan.mark(index, TILE_FAILED)
+            self.manifest.record(file_path, url, honda_file, STATUS_FAILED)
+            return {'status': 'error', 'file': file_path, 'error': str(e) or type(e).__name__, 'index': index}
+
+
+class TileProgress:
+    """Contadores de una extracción (o de un shard) alimentados con los dicts de TileDownloader"""
+
+    FIELDS = ("downloaded", "failed", "skipped", "resumed", "unchanged", "deduplicated",
+              "retries", "retried_tiles", "hedged", "hedge_wins", "transferred_bytes")
+    MAX_SUCCESSFUL_FILES = 50  # Muestra guardada en config_extraction.json
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        self.successful_files: List[str] = []
+
+    @property
+    def completed(self) -> int:
+        return self.downloaded + self.failed + self.skipped + self.resumed + self.unchanged
+
+    def add(self, result: Dict):
+        if result.get('retries'):
+            self.retries += result['retries']
+            self.retried_tiles += 1
+        if result['status'] == 'success':
+            self.downloaded += 1
+            self.deduplicated += result['deduplicated']
+            self.hedged += result['hedged']
+            self.hedge_wins += result['hedge_won']
+            self.transferred_bytes += result['transferred']
+        elif result['status'] == 'resumed':
+            self.resumed += 1
+        elif result['status'] == 'unchanged':
+            self.unchanged += 1
+        elif result['status'] == 'skip':
+            self.skipped += 1
+        else:
+            self.failed += 1
+        if result['status'] in ('success', 'resumed', 'unchanged') and \
+                len(self.successful_files) < self.MAX_SUCCESSFUL_FILES:
+            self.successful_files.append(result['file'])
+
+    def as_dict(self) -> Dict:
+        return {**{field: getattr(self, field) for field in self.FIELDS},
+                "successful_files": list(self.successful_files)}
+
+    @classmethod
+    def merge(cls, parts: Iterable[Optional[Dict]]) -> "TileProgress":
+        """Sumar los contadores de varios shards (dicts de as_dict)"""
+        total = cls()
+        for part in parts:
+            if not part:
+                continue
+            for field in cls.FIELDS:
+                setattr(total, field, getattr(total, field) + part[field])
+            room = cls.MAX_SUCCESSFUL_FILES - len(total.successful_files)
+            total.successful_files.extend(part["successful_files"][:room])
+        return total
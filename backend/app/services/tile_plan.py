@@ -0,0 +1,296 @@
+"""
+PLAN DE TILES DERIVADO DE LA CONFIGURACIÓN
+Un solo constructor para el router, el extractor HTTP, Selenium y los
+scripts: la grilla de cada nivel sale del pano.xml / XML Object2VR
+parseado (ConfigInfo), incluyendo tiles de borde, así que nunca se piden
+tiles que no pueden existir.
+"""
+
+import re
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.models.honda import ConfigInfo, TileInfo
+from app.utils.patterns import (
+    get_honda_images_base_url,
+    TILE_PATTERNS,
+    RESOLUTIONS,
+    calculate_tiles_per_level
+)
+
+
+def level_resolution(year: str, view_type: str, config: ConfigInfo, level: int) -> dict:
+    """Resolución de un nivel: la del XML; RESOLUTIONS solo si el XML no la declara"""
+    if level < len(config.level_sizes):
+        return config.level_sizes[level]
+    return RESOLUTIONS[year][view_type][level]
+
+
+def level_grid(year: str, view_type: str, config: ConfigInfo, level: int) -> Tuple[int, int]:
+    """(tiles_x, tiles_y) de un nivel, redondeando hacia arriba para los tiles de borde"""
+    tile_size = config.tile_size or TILE_PATTERNS[config.technology]["tile_size"]
+    return calculate_tiles_per_level(level_resolution(year, view_type, config, level), tile_size)
+
+
+def plan_levels(config: ConfigInfo, quality_level: int = 0) -> List[int]:
+    """Niveles a descargar para una calidad: desde quality_level hasta el más grueso"""
+    return list(range(quality_level, config.levels))
+
+
+# Marcadores de leveltileurl en el XML -> campos de los patrones de TILE_PATTERNS
+XML_TILE_TOKENS = {
+    "object2vr": {"%c": "{column}", "%r": "{row}", "%l": "{level}", "%x": "{x}", "%y": "{y}"},
+    "pano2vr": {"%c": "{face}", "%l": "{level}", "%x": "{x}", "%y": "{y}"}
+}
+
+
+def tile_pattern(config: ConfigInfo) -> str:
+    """
+    Patrón de paths de tiles del XML (leveltileurl) con campos de formato
+    TILE_PATTERNS solo si el XML no lo declara o usa marcadores desconocidos
+    """
+    static = TILE_PATTERNS[config.technology]["pattern"]
+    if not config.tile_pattern:
+        return static
+    tokens = XML_TILE_TOKENS[config.technology]
+    pattern = config.tile_pattern.strip().replace("{", "{{").replace("}", "}}")
+    pattern = re.sub(r"%[a-z]", lambda match: tokens.get(match.group(0), match.group(0)), pattern)
+    if pattern.startswith("./"):
+        pattern = pattern[2:]
+    group_field = "{column}" if config.technology == "object2vr" else "{face}"
+    if "%" in pattern or "://" in pattern or pattern.startswith("/") or \
+            any(field not in pattern for field in (group_field, "{level}", "{x}", "{y}")):
+        print(f"[PLAN] leveltileurl no soportado ({config.tile_pattern}), usando {static}")
+        return static
+    return pattern
+
+
+def tile_relative_path(technology: str, group: int, level: int, x: int, y: int,
+                       row: int = 0, pattern: Optional[str] = None) -> str:
+    """Path del tile relativo a la URL base de imágenes (mismo layout que Honda)"""
+    pattern = pattern or TILE_PATTERNS[technology]["pattern"]
+    if technology == "object2vr":
+        return pattern.format(column=group, row=row, level=level, x=x, y=y)
+    return pattern.format(face=group, level=level, x=x, y=y)
+
+
+_TILE_PATH_REGEX: Dict[str, "re.Pattern"] = {}
+
+
+def parse_tile_path(technology: str, relative_path: str,
+                    pattern: Optional[str] = None) -> Optional[Tuple[int, int, int, int, int]]:
+    """(grupo, nivel, x, y, fila) de un path relativo de tile; None si no sigue el patrón"""
+    pattern = pattern or TILE_PATTERNS[technology]["pattern"]
+    if pattern not in _TILE_PATH_REGEX:
+        regex = re.escape(pattern)
+        for name in ("column", "row", "face", "level", "x", "y"):
+            regex = regex.replace(re.escape("{" + name + "}"), f"(?P<{name}>\\d+)", 1)
+        regex = regex.replace(re.escape("{{"), re.escape("{")).replace(re.escape("}}"), re.escape("}"))
+        _TILE_PATH_REGEX[pattern] = re.compile(regex + "$")
+    match = _TILE_PATH_REGEX[pattern].match(relative_path)
+    if not match:
+        return None
+    fields = match.groupdict()
+    group = fields.get("column") if technology == "object2vr" else fields.get("face")
+    return int(group), int(fields["level"]), int(fields["x"]), int(fields["y"]), int(fields.get("row") or 0)
+
+
+def tile_groups(config: ConfigInfo) -> int:
+    """Columnas (Object2VR) o caras del cubo (Pano2VR)"""
+    if config.technology == "object2vr":
+        return config.columns or TILE_PATTERNS["object2vr"]["columns"]
+    return config.faces or TILE_PATTERNS["pano2vr"]["faces"]
+
+
+def tile_rows(config: ConfigInfo) -> int:
+    """Filas de un objeto Object2VR (ángulos verticales); Pano2VR siempre 1"""
+    if config.technology == "object2vr":
+        return config.rows or 1
+    return 1
+
+
+# Estado de cada tile dentro del plan (array de bytes)
+TILE_PENDING = 0
+TILE_DONE = 1
+TILE_MISSING = 2
+TILE_FAILED = 3
+TILE_UNCHANGED = 4
+TILE_RESUMED = 5
+
+# Orden de descarga de un plan
+ORDER_SEQUENTIAL = "sequential"    # Tal cual el plan (nivel -> fila -> columna/cara -> y -> x)
+ORDER_PROGRESSIVE = "progressive"  # Nivel más grueso primero: el viewer es usable antes
+
+TILE_STATUS_NAMES = {
+    TILE_PENDING: "pending",
+    TILE_DONE: "done",
+    TILE_MISSING: "missing",
+    TILE_FAILED: "failed",
+    TILE_UNCHANGED: "unchanged",
+    TILE_RESUMED: "resumed"
+}
+
+# Estados con el tile en disco y utilizable por el viewer
+TILE_USABLE = (TILE_DONE, TILE_UNCHANGED, TILE_RESUMED)
+
+
+def counts_usable(counts: Dict[str, int]) -> bool:
+    """Todos los tiles contados (p. ej. de un nivel) quedaron en disco y utilizables"""
+    total = sum(counts.values())
+    usable = sum(counts.get(TILE_STATUS_NAMES[code], 0) for code in TILE_USABLE)
+    return total > 0 and usable == total
+
+
+class TilePlan:
+    """
+    Plan de tiles en arrays columnares de enteros (no un TileInfo por tile)
+    - groups (columna/cara), rows (fila Object2VR), levels, xs, ys: coordenadas del tile i
+    - status / sizes: se rellenan mientras corre el job
+    Las URLs y paths se generan bajo demanda desde el patrón del XML (ver tile_pattern)
+    """
+
+    __slots__ = ("year", "view_type", "technology", "base_url", "pattern",
+                 "groups", "rows", "levels", "xs", "ys", "status", "sizes", "level_offsets")
+
+    def __init__(self, year: str, view_type: str, technology: str, pattern: Optional[str] = None):
+        self.year = year
+        self.view_type = view_type
+        self.technology = technology
+        self.base_url = get_honda_images_base_url(year, view_type)
+        self.pattern = pattern or TILE_PATTERNS[technology]["pattern"]
+        self.groups = array('H')
+        self.rows = array('H')
+        self.levels = array('B')
+        self.xs = array('H')
+        self.ys = array('H')
+        self.status = array('B')
+        self.sizes = array('q')
+        # nivel -> (primer índice, filas, grupos, tiles_x, tiles_y) para ubicar un tile sin recorrer el plan
+        self.level_offsets: Dict[int, Tuple[int, int, int, int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def add_level(self, level: int, groups: int, tiles_x: int, tiles_y: int, rows: int = 1):
+        """Agregar la grilla completa de un nivel (relleno en bloque, sin bucles Python por tile)"""
+        per_group = tiles_x * tiles_y
+        per_row = groups * per_group
+        count = rows * per_row
+        self.level_offsets[level] = (len(self), rows, groups, tiles_x, tiles_y)
+        group_ys = array('H', [y for y in range(tiles_y) for _ in range(tiles_x)])
+        row_groups = array('H', [group for group in range(groups) for _ in range(per_group)])
+
+        for row in range(rows):
+            self.rows.extend(array('H', [row]) * per_row)
+        self.groups.extend(row_groups * rows)
+        self.levels.extend(array('B', [level]) * count)
+        self.xs.extend(array('H', range(tiles_x)) * (tiles_y * groups * rows))
+        self.ys.extend(group_ys * (groups * rows))
+        self.status.extend(array('B', [TILE_PENDING]) * count)
+        self.sizes.extend(array('q', [0]) * count)
+
+    def relative_path(self, i: int) -> str:
+        return tile_relative_path(self.technology, self.groups[i], self.levels[i], self.xs[i], self.ys[i],
+                                  self.rows[i], self.pattern)
+
+    def url(self, i: int) -> str:
+        return self.base_url + self.relative_path(i)
+
+    def index_of(self, relative_path: str) -> Optional[int]:
+        """Índice del tile con ese path relativo (p. ej. observado en el navegador); None si no está en el plan"""
+        coordinates = parse_tile_path(self.technology, relative_path, self.pattern)
+        if coordinates is None or coordinates[1] not in self.level_offsets:
+            return None
+        group, level, x, y, row = coordinates
+        start, rows, groups, tiles_x, tiles_y = self.level_offsets[level]
+        if row >= rows or group >= groups or x >= tiles_x or y >= tiles_y:
+            return None
+        return start + ((row * groups + group) * tiles_y + y) * tiles_x + x
+
+    def mark(self, i: int, status: int, size: int = 0):
+        self.status[i] = status
+        if size:
+            self.sizes[i] = size
+
+    def tile_info(self, i: int) -> TileInfo:
+        """TileInfo del tile i (para APIs que aún esperan el modelo pydantic)"""
+        is_object = self.technology == "object2vr"
+        return TileInfo(
+            url=self.url(i),
+            level=self.levels[i],
+            column=self.groups[i] if is_object else None,
+            row=self.rows[i] if is_object else None,
+            face=None if is_object else self.groups[i],
+            tile_path=self.relative_path(i),
+            x=self.xs[i],
+            y=self.ys[i],
+            downloaded=self.status[i] in TILE_USABLE,
+            file_size=self.sizes[i] or None
+        )
+
+    def to_tile_infos(self) -> List[TileInfo]:
+        return [self.tile_info(i) for i in range(len(self))]
+
+    def indices(self, level: Optional[int] = None) -> Iterator[int]:
+        """Índices del plan (opcionalmente solo un nivel)"""
+        if level is None:
+            return iter(range(len(self)))
+        return (i for i, tile_level in enumerate(self.levels) if tile_level == level)
+
+    def phases(self, ordering: str = ORDER_SEQUENTIAL) -> List[Tuple[List[int], Iterator[int]]]:
+        """
+        Fases de descarga como (niveles, índices perezosos)
+        - sequential: una sola fase con todo el plan
+        - progressive: una fase por nivel, del más grueso (número mayor) al más fino
+        Los índices no cambian entre modos (los nombres tile_XXXX.jpg son estables)
+        """
+        levels = sorted(set(self.levels), reverse=True)
+        if ordering != ORDER_PROGRESSIVE:
+            return [(levels, self.indices())]
+        return [([level], self.indices(level)) for level in levels]
+
+    def level_size(self, levels: Iterable[int]) -> int:
+        """Tiles del plan en esos niveles"""
+        return sum(self.levels.count(level) for level in levels)
+
+    def counts(self, level: Optional[int] = None) -> Dict[str, int]:
+        """Tiles por estado (opcionalmente solo un nivel)"""
+        if level is not None:
+            return status_counts(self.status[i] for i in self.indices(level))
+        return {TILE_STATUS_NAMES[code]: self.status.count(code)
+                for code in TILE_STATUS_NAMES if self.status.count(code)}
+
+    def total_bytes(self) -> int:
+        return sum(self.sizes)
+
+
+def status_counts(statuses: Iterable[int]) -> Dict[str, int]:
+    """Conteo por nombre de estado de una secuencia de códigos TILE_*"""
+    counts: Dict[str, int] = {}
+    for code in statuses:
+        name = TILE_STATUS_NAMES[code]
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def build_tile_plan(year: str, view_type: str, config: ConfigInfo,
+                    levels: Optional[Iterable[int]] = None) -> TilePlan:
+    """
+    Plan exacto de tiles para los niveles pedidos (por defecto todos)
+    Orden: nivel -> fila -> columna/cara -> y -> x
+    Paths con el leveltileurl del XML; las filas solo cuentan si el patrón las distingue (%r)
+    """
+    levels = list(range(config.levels)) if levels is None else list(levels)
+    plan = TilePlan(year, view_type, config.technology, tile_pattern(config))
+    rows = tile_rows(config) if "{row}" in plan.pattern else 1
+
+    for level in levels:
+        if level >= config.levels:
+            print(f"[PLAN] Nivel {level} no existe en la configuración ({config.levels} niveles)")
+            continue
+
+        tiles_x, tiles_y = level_grid(year, view_type, config, level)
+        plan.add_level(level, tile_groups(config), tiles_x, tiles_y, rows)
+
+    return plan
+
@@ -0,0 +1,118 @@
+"""
+WORKER DE EXTRACCIÓN DISTRIBUIDA
+Reclama shards de la cola durable (SQLite en el volumen compartido), los
+descarga con el engine de este proceso y renueva el lease con heartbeats.
+Correr desde backend/ (mismas rutas relativas que la API), uno o más por nodo:
+
+    python -m app.worker
+    python -m app.worker --queue /mnt/shared/downloads/.cache/jobs.sqlite3 --share 4
+    python -m app.worker --exit-when-idle     # Terminar cuando no quede trabajo
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+from typing import Dict
+
+from app.services.job_queue import JOB_QUEUE_PATH, QUEUE_SETTINGS, ShardQueue, new_worker_id
+from app.services.manifest import TileManifest
+from app.services.sharding import download_shard, merge_shard_manifests, share_origin_limits
+
+
+def finish_job(spec: Dict, shards: int, status: str):
+    """Job terminado (done o failed): fusionar los manifests parciales en el principal"""
+    manifest = TileManifest.load(Path(spec["manifest_path"]))
+    merge_shard_manifests(manifest, shards)
+    manifest.save()
+    print(f"[WORKER] Job {spec['extraction_id']} terminado ({status}): manifest fusionado en {manifest.path}")
+
+
+def finish_jobs(queue: ShardQueue):
+    """Fusionar los manifests de todos los jobs terminados que nadie fusionó todavía"""
+    while True:
+        job = queue.claim_merge()
+        if job is None:
+            return
+        finish_job(job["spec"], job["shards"], job["status"])
+
+
+async def run_claim(queue: ShardQueue, worker_id: str, claim: Dict):
+    """Descargar un shard reclamado renovando el lease mientras dure"""
+    job_id, shard = claim["job_id"], claim["shard"]
+    spec = {**claim["spec"], "shard": shard, "groups": claim["groups"]}
+    latest = {"progress": None}
+
+    def report(update: Dict):
+        latest["progress"] = update["progress"]
+
+    print(f"[WORKER] {worker_id}: shard {job_id}/{shard} (columnas/caras {claim['groups']}, "
+          f"intento {claim['attempt']})")
+    lease_lost = False
+    # Con el lease perdido el manifest parcial ya es del nuevo dueño: no volver a escribirlo
+    task = asyncio.create_task(download_shard(spec, report, still_owner=lambda: not lease_lost))
+    while not task.done():
+        await asyncio.wait({task}, timeout=queue.settings["heartbeat_interval"])
+        if task.done():
+            break
+        if not await asyncio.to_thread(queue.heartbeat, worker_id, job_id, shard, latest["progress"]):
+            # Otro worker reclamó el shard (nuestro lease venció): no seguir escribiendo
+            print(f"[WORKER] {worker_id}: lease perdido en {job_id}/{shard}, abandonando")
+            lease_lost = True
+            task.cancel()
+
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        if lease_lost:
+            return
+        raise
+    except Exception as e:
+        print(f"[WORKER] {worker_id}: error en {job_id}/{shard}: {e}")
+        await asyncio.to_thread(queue.fail, worker_id, job_id, shard, str(e) or type(e).__name__)
+    else:
+        await asyncio.to_thread(queue.complete, worker_id, job_id, shard, result)
+        print(f"[WORKER] {worker_id}: shard {job_id}/{shard} listo ({result['tile_status']})")
+    # Si el job terminó (sea cual sea el estado final) se fusionan sus manifests
+    await asyncio.to_thread(finish_jobs, queue)
+
+
+async def work(queue: ShardQueue, worker_id: str, exit_when_idle: bool = False):
+    await asyncio.to_thread(queue.register_worker, worker_id)
+    print(f"[WORKER] {worker_id} escuchando {queue.path}")
+    while True:
+        claim = await asyncio.to_thread(queue.claim, worker_id)
+        # claim() puede cerrar jobs cuyos shards agotaron los reclamos: fusionarlos también
+        await asyncio.to_thread(finish_jobs, queue)
+        if claim is None:
+            # Con leases activos de otros workers hay que seguir: si mueren, se reclaman
+            if exit_when_idle and not await asyncio.to_thread(queue.open_shards):
+                print(f"[WORKER] {worker_id}: sin shards pendientes, terminando")
+                return
+            await asyncio.to_thread(queue.heartbeat, worker_id)
+            await asyncio.sleep(queue.settings["poll_interval"])
+            continue
+        await run_claim(queue, worker_id, claim)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de extracción distribuida (cola de shards en SQLite)")
+    parser.add_argument("--queue", type=Path, default=JOB_QUEUE_PATH, help="Base SQLite compartida")
+    parser.add_argument("--worker-id", default=None, help="Identificador (por defecto host + sufijo aleatorio)")
+    parser.add_argument("--share", type=int, default=1,
+                        help="Workers que comparten los límites hacia el origen (cada uno usa 1/share)")
+    parser.add_argument("--lease-seconds", type=float, default=QUEUE_SETTINGS["lease_seconds"],
+                        help="Vigencia del lease (el heartbeat se envía cada tercio de este tiempo)")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Terminar cuando no haya shards pendientes")
+    args = parser.parse_args()
+
+    if args.share > 1:
+        share_origin_limits(args.share)
+    queue = ShardQueue(args.queue, {
+        "lease_seconds": args.lease_seconds,
+        "heartbeat_interval": min(QUEUE_SETTINGS["heartbeat_interval"], args.lease_seconds / 3)
+    })
+    asyncio.run(work(queue, args.worker_id or new_worker_id(), args.exit_when_idle))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cwd(tmp_path, monkeypatch):
+    """Los paths de la app son relativos a downloads/: cada test corre en su carpeta temporal"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,50 @@
+import asyncio
+from pathlib import Path
+
+from app.services.blob_store import BlobStore, hash_file, write_file
+
+
+def blobs(store: BlobStore):
+    return [path for path in store.root.glob("??/*") if path.is_file()]
+
+
+def test_publish_links_source_and_dest_to_one_blob():
+    store = BlobStore(Path("blobs"))
+    source, dest = Path("honda_original/skin.js"), Path("system/assets/skin.js")
+    write_file(source, "skin 2024")
+
+    asyncio.run(store.publish_file(source, dest))
+
+    [blob] = blobs(store)
+    assert blob.name == hash_file(source)[2:]
+    assert dest.read_text() == "skin 2024"
+    assert source.stat().st_ino == dest.stat().st_ino == blob.stat().st_ino
+
+
+def test_rewriting_a_published_source_leaves_blob_and_copies_intact():
+    """Refrescar un asset (otro año, otro contenido) no debe cambiar el inodo compartido"""
+    store = BlobStore(Path("blobs"))
+    source, dest = Path("2024/skin.js"), Path("published/2024/skin.js")
+    write_file(source, "skin 2024")
+    asyncio.run(store.publish_file(source, dest))
+
+    write_file(source, b"skin 2026")
+
+    assert source.read_bytes() == b"skin 2026"
+    assert dest.read_text() == "skin 2024"
+    [blob] = blobs(store)
+    assert blob.read_text() == "skin 2024"
+    assert hash_file(blob)[2:] == blob.name
+
+
+def test_identical_content_is_deduplicated():
+    store = BlobStore(Path("blobs"))
+    write_file(Path("a/tile.jpg"), b"x" * 600)
+    write_file(Path("b/tile.jpg"), b"x" * 600)
+
+    asyncio.run(store.publish_file(Path("a/tile.jpg"), Path("out/a.jpg")))
+    asyncio.run(store.publish_file(Path("b/tile.jpg"), Path("out/b.jpg")))
+
+    assert len(blobs(store)) == 1
+    assert store.dedup_hits == 1
+    assert Path("out/a.jpg").stat().st_ino == Path("out/b.jpg").stat().st_ino
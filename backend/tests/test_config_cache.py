@@ -0,0 +1,66 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.services.config_cache import ConfigCache
+
+
+class SlowCache(ConfigCache):
+    """_refresh sin red: tarda lo suficiente para que haya llamadores concurrentes"""
+
+    def __init__(self, error: Exception = None):
+        super().__init__(Path("cache"))
+        self.calls = 0
+        self.error = error
+
+    async def _refresh(self, year, view_type, entry):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.error:
+            raise self.error
+        return f"config-{self.calls}"
+
+
+async def leader_and_waiter(cache: ConfigCache):
+    leader = asyncio.create_task(cache.get("2024", "exterior"))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(cache.get("2024", "exterior"))
+    await asyncio.sleep(0.01)
+    return leader, waiter
+
+
+def test_concurrent_gets_share_one_refresh():
+    async def main():
+        cache = SlowCache()
+        leader, waiter = await leader_and_waiter(cache)
+        return await asyncio.gather(leader, waiter), cache
+
+    results, cache = asyncio.run(main())
+    assert results == ["config-1", "config-1"]
+    assert cache.calls == 1
+
+
+def test_cancelled_leader_does_not_strand_waiters():
+    async def main():
+        cache = SlowCache()
+        leader, waiter = await leader_and_waiter(cache)
+        leader.cancel()
+        result = await asyncio.wait_for(waiter, 1)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return result, cache
+
+    result, cache = asyncio.run(main())
+    assert result == "config-2"  # El que esperaba hizo su propia descarga
+    assert cache._inflight == {}
+
+
+def test_leader_error_reaches_waiters():
+    async def main():
+        cache = SlowCache(ValueError("origen caído"))
+        leader, waiter = await leader_and_waiter(cache)
+        return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
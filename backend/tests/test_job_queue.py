@@ -0,0 +1,72 @@
+import time
+from pathlib import Path
+
+from app.services.job_queue import ShardQueue
+from app.services.tile_downloader import TileProgress
+
+PROGRESS = TileProgress().as_dict()
+
+
+def make_queue(**settings) -> ShardQueue:
+    return ShardQueue(Path("queue.db"), {"lease_seconds": 30.0, "max_attempts": 3, **settings})
+
+
+def test_claim_hands_each_shard_out_once():
+    queue = make_queue()
+    job_id = queue.enqueue({"extraction_id": "e1"}, groups=4, shards=2)
+
+    first, second = queue.claim("w1"), queue.claim("w2")
+
+    assert (first["shard"], first["groups"]) == (0, (0, 2))
+    assert (second["shard"], second["groups"]) == (1, (2, 4))
+    assert first["spec"] == {"extraction_id": "e1"} and first["attempt"] == 1
+    assert queue.claim("w3") is None
+    assert queue.job_status(job_id)["status"] == "leased"
+
+
+def test_heartbeat_renews_the_lease_of_its_owner_only():
+    queue = make_queue()
+    job_id = queue.enqueue({}, groups=1, shards=1)
+    claim = queue.claim("w1")
+
+    assert queue.heartbeat("w1", job_id, claim["shard"], PROGRESS)
+    assert not queue.heartbeat("w2", job_id, claim["shard"], PROGRESS)
+
+
+def test_expired_lease_is_reclaimed_and_the_old_owner_loses_it():
+    queue = make_queue(lease_seconds=0.05)
+    job_id = queue.enqueue({}, groups=1, shards=1)
+    queue.claim("w1")
+    time.sleep(0.1)
+
+    reclaim = queue.claim("w2")
+
+    assert reclaim["shard"] == 0 and reclaim["attempt"] == 2
+    assert not queue.heartbeat("w1", job_id, 0, PROGRESS)
+    assert not queue.complete("w1", job_id, 0, {"progress": PROGRESS})
+    assert queue.complete("w2", job_id, 0, {"progress": PROGRESS})
+    assert queue.job_status(job_id)["status"] == "done"
+
+
+def test_exhausted_reclaims_fail_the_job_and_it_is_merged_once():
+    queue = make_queue(lease_seconds=0.05, max_attempts=1)
+    job_id = queue.enqueue({"extraction_id": "e1"}, groups=1, shards=1)
+    queue.claim("w1")
+    time.sleep(0.1)
+
+    assert queue.claim("w2") is None
+    assert queue.job_status(job_id)["status"] == "failed"
+    merge = queue.claim_merge()
+    assert (merge["job_id"], merge["status"], merge["shards"]) == (job_id, "failed", 1)
+    assert queue.claim_merge() is None
+
+
+def test_fail_requeues_until_max_attempts():
+    queue = make_queue(max_attempts=2)
+    job_id = queue.enqueue({}, groups=1, shards=1)
+
+    queue.claim("w1")
+    assert not queue.fail("w1", job_id, 0, "timeout")
+    queue.claim("w1")
+    assert queue.fail("w1", job_id, 0, "timeout")
+    assert queue.job_status(job_id)["status"] == "failed"
@@ -0,0 +1,34 @@
+import pytest
+
+from app.services.rate_limit import OriginRateLimiter, RATE_LIMIT_SETTINGS
+
+
+def make_limiter() -> OriginRateLimiter:
+    return OriginRateLimiter(RATE_LIMIT_SETTINGS, path=None)
+
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_non_positive_rates_are_rejected(rate):
+    limiter = make_limiter()
+    with pytest.raises(ValueError):
+        limiter.set_budget("example.test", requests_per_second=rate)
+    assert limiter.budget("example.test") == limiter.default
+
+
+def test_none_means_unlimited_and_host_overrides_default():
+    limiter = make_limiter()
+    limiter.set_budget("example.test", requests_per_second=None, bytes_per_second=1000)
+
+    assert limiter.budget("example.test")["requests_per_second"] is None
+    assert limiter.budget("example.test")["bytes_per_second"] == 1000
+    assert limiter.budget("other.test") == limiter.default
+
+
+def test_share_splits_every_budget():
+    limiter = make_limiter()
+    limiter.set_budget("example.test", bytes_per_second=1000)
+
+    limiter.share(4)
+
+    assert limiter.default["requests_per_second"] == RATE_LIMIT_SETTINGS["default"]["requests_per_second"] / 4
+    assert limiter.budget("example.test")["bytes_per_second"] == 250
@@ -0,0 +1,44 @@
+import asyncio
+
+from app.services.retry import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, CircuitBreaker
+
+SETTINGS = {"window": 4, "min_requests": 4, "failure_rate": 0.5, "open_seconds": 0.01, "probe_poll": 0.005}
+
+
+def tripped_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("example.test", SETTINGS)
+    for _ in range(4):
+        breaker.record(False)
+    assert breaker.state == CIRCUIT_OPEN
+    return breaker
+
+
+def test_high_failure_rate_opens_the_circuit():
+    breaker = tripped_breaker()
+    assert breaker.trips == 1
+
+
+def test_only_the_probe_closes_the_circuit():
+    async def main():
+        breaker = tripped_breaker()
+        probe = await breaker.wait_ready()
+        assert probe and breaker.state == CIRCUIT_HALF_OPEN
+        breaker.record(True)  # Request que estaba en vuelo: no decide
+        assert breaker.state == CIRCUIT_HALF_OPEN
+        breaker.record(True, probe=True)
+        return breaker
+
+    assert asyncio.run(main()).state == CIRCUIT_CLOSED
+
+
+def test_released_probe_lets_another_request_probe():
+    async def main():
+        breaker = tripped_breaker()
+        assert await breaker.wait_ready()
+        waiter = asyncio.create_task(breaker.wait_ready())
+        await asyncio.sleep(0.02)
+        assert not waiter.done()  # Una sola prueba a la vez
+        breaker.release_probe()  # La prueba se canceló sin respuesta del host
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(main()) is True
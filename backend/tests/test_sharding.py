@@ -0,0 +1,85 @@
+import asyncio
+from pathlib import Path
+
+from app.services import sharding
+from app.services.manifest import TileManifest
+
+# Object2VR de 2 columnas x 1 fila, un nivel de un tile por columna
+CONFIG_XML = ('<vrobject><input columns="2" rows="1" tilesize="512" leveltileurl="tiles/c%c_l%l_%y_%x.jpg"/>'
+              '<level width="512" height="512"/></vrobject>')
+
+
+class StubEngine:
+    """DownloadEngine sin red: la columna 0 existe, la 1 da 404"""
+
+    def __init__(self):
+        self.urls = []
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def limit_job_bandwidth(self, job_id, mbps):
+        pass
+
+    async def download_to_file(self, url, path, **kwargs):
+        self.urls.append(url)
+        if "/c1_" in url:
+            return {"status": 404, "stored": False, "coalesced": False, "attempts": 1, "error": None}
+        content = b"x" * 600
+        for destination in (path, *kwargs.get("extra_destinations", ())):
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            destination.write_bytes(content)
+        return {"status": 200, "stored": True, "coalesced": False, "attempts": 1, "error": None,
+                "size": len(content), "sha256": "0" * 64, "etag": None, "last_modified": None,
+                "deduplicated": False, "hedged": False, "hedge_won": False}
+
+
+def shard_spec(**overrides):
+    return {
+        "shard": 0, "shards": 1, "groups": [0, 2], "levels": [0],
+        "year": "2024", "view_type": "exterior",
+        "config_content": CONFIG_XML, "config_url": "https://example.test/config.xml",
+        "extraction_id": "e1", "manifest_path": "job/manifest.json",
+        "base_url": "https://example.test", "headers": {},
+        "honda_original_base": "job/honda_original", "system_base": "job/system",
+        "max_bandwidth_mbps": None, "hedge": False, "incremental": False, "ordering": "progressive",
+        **overrides
+    }
+
+
+def run_shard_with_stub(monkeypatch, spec, still_owner=None):
+    engine = StubEngine()
+    monkeypatch.setattr(sharding, "get_download_engine", lambda: engine)
+    reports = []
+    result = asyncio.run(sharding.download_shard(spec, reports.append, still_owner))
+    return result, reports, engine
+
+
+def test_download_shard_runs_a_phase_and_reports_level_status(monkeypatch):
+    result, reports, engine = run_shard_with_stub(monkeypatch, shard_spec())
+
+    assert len(engine.urls) == 2
+    assert result["tile_status"] == {"done": 1, "missing": 1}
+    assert result["progress"]["downloaded"] == 1 and result["progress"]["skipped"] == 1
+    phase = reports[-1]
+    assert phase["levels_done"] == [0]
+    assert phase["level_status"] == {0: {"done": 1, "missing": 1}}
+
+    partial = TileManifest.load(sharding.shard_manifest_path(Path("job/manifest.json"), 0))
+    assert set(partial.entries) == {"tiles/c0_l0_0_0.jpg", "tiles/c1_l0_0_0.jpg"}
+
+
+def test_download_shard_only_touches_its_groups(monkeypatch):
+    result, _, engine = run_shard_with_stub(monkeypatch, shard_spec(groups=[1, 2]))
+
+    assert [url.rsplit("/", 1)[1] for url in engine.urls] == ["c1_l0_0_0.jpg"]
+    assert result["tile_status"] == {"missing": 1}
+
+
+def test_download_shard_does_not_write_manifest_after_losing_the_lease(monkeypatch):
+    run_shard_with_stub(monkeypatch, shard_spec(), still_owner=lambda: False)
+
+    assert not sharding.shard_manifest_path(Path("job/manifest.json"), 0).exists()
@@ -0,0 +1,61 @@
+from app.services.honda_service import parse_config
+from app.services.tile_plan import (
+    ORDER_PROGRESSIVE, TILE_DONE, TILE_FAILED, build_tile_plan, counts_usable, parse_tile_path, tile_pattern
+)
+
+
+def object2vr_config(leveltileurl: str, columns: int = 2, rows: int = 2):
+    """Dos niveles: 1024x512 (2x1 tiles de 512) y 512x512 (1 tile)"""
+    return parse_config(
+        f'<vrobject><input columns="{columns}" rows="{rows}" tilesize="512" leveltileurl="{leveltileurl}"/>'
+        '<level width="1024" height="512"/><level width="512" height="512"/></vrobject>',
+        "https://example.test/config.xml"
+    )
+
+
+def test_xml_pattern_with_rows_gives_one_path_per_tile():
+    config = object2vr_config("img/r%r/c%c_l%l_%y_%x.jpg")
+    plan = build_tile_plan("2024", "exterior", config, [0, 1])
+
+    paths = [plan.relative_path(i) for i in plan.indices()]
+    assert len(plan) == 2 * 2 * (2 + 1)  # filas x columnas x (tiles nivel 0 + nivel 1)
+    assert len(set(paths)) == len(paths)
+    assert "img/r1/c0_l0_0_1.jpg" in paths
+
+
+def test_index_of_round_trips_every_path():
+    config = object2vr_config("img/r%r/c%c_l%l_%y_%x.jpg")
+    plan = build_tile_plan("2024", "exterior", config, [0, 1])
+
+    for i in plan.indices():
+        assert plan.index_of(plan.relative_path(i)) == i
+    assert plan.index_of("img/r9/c0_l0_0_0.jpg") is None
+    assert parse_tile_path("object2vr", "img/r1/c1_l0_0_1.jpg", plan.pattern) == (1, 0, 1, 0, 1)
+
+
+def test_unsupported_xml_pattern_falls_back_to_default():
+    assert tile_pattern(object2vr_config("tiles/c%c_l%l_%q_%x.jpg")) == "tiles/c{column}_l{level}_{y}_{x}.jpg"
+    assert tile_pattern(object2vr_config("https://cdn.test/c%c_l%l_%y_%x.jpg")) == \
+        "tiles/c{column}_l{level}_{y}_{x}.jpg"
+
+
+def test_progressive_phases_start_with_the_coarsest_level():
+    plan = build_tile_plan("2024", "exterior", object2vr_config("tiles/c%c_l%l_%y_%x.jpg", rows=1), [0, 1])
+
+    phases = plan.phases(ORDER_PROGRESSIVE)
+
+    assert [levels for levels, _ in phases] == [[1], [0]]
+    assert [plan.levels[i] for i in phases[0][1]] == [1, 1]
+
+
+def test_level_counts_decide_preview_readiness():
+    plan = build_tile_plan("2024", "exterior", object2vr_config("tiles/c%c_l%l_%y_%x.jpg", rows=1), [0, 1])
+    coarse = list(plan.indices(1))
+
+    plan.mark(coarse[0], TILE_DONE, 600)
+    assert not counts_usable(plan.counts(1))  # Un tile pendiente
+    plan.mark(coarse[1], TILE_FAILED)
+    assert not counts_usable(plan.counts(1))
+    plan.mark(coarse[1], TILE_DONE, 600)
+    assert counts_usable(plan.counts(1))
+    assert not counts_usable({})
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia por asset del extractor Selenium con los sleeps fijos
+anteriores (driver.get + time.sleep) vs. las esperas por condición actuales
+(document.readyState / red en calma, con tope duro). Mismo navegador del
+pool para ambas variantes; requiere Chrome y red hacia Honda.
+Las dos variantes se MIDEN: la anterior ejecuta su camino real (navegación +
+el sleep fijo que tenía cada asset, ver LEGACY_SLEEPS), no la estimación del
+reporte de tiempos. Cada URL se carga una vez antes (cache caliente para
+ambas) y el orden de las variantes se alterna.
+
+Uso: python benchmark_selenium_waits.py [año] [interior|exterior] [tiles]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+from app.services.browser_pool import browser_pool
+from app.services.honda_selenium_extractor import HondaSeleniumExtractor, LEGACY_SLEEPS, timing_report
+from app.utils.patterns import get_honda_config_url, get_honda_images_base_url, TILE_PATTERNS
+
+
+def asset_urls(year: str, view_type: str, tiles: int):
+    """Las mismas URLs que visita el extractor, más los primeros tiles del nivel 0"""
+    player_name = "pano2vr_player.js" if view_type == "interior" else "object2vr_player.js"
+    viewer_base = f"https://www.honda.mx/web/img/cars/models/city/{year}/city_{year}_{view_type[:3]}_360"
+    urls = [
+        ("config_xml", get_honda_config_url(year, view_type)),
+        ("viewer_html", f"{viewer_base}/index.html"),
+        ("skin_js", f"{viewer_base}/skin.js"),
+        ("player_js", f"{viewer_base}/{player_name}")
+    ]
+    technology = "pano2vr" if view_type == "interior" else "object2vr"
+    pattern = TILE_PATTERNS[technology]["pattern"]
+    base_url = get_honda_images_base_url(year, view_type)
+    for group in range(tiles):
+        path = (pattern.format(face=group, level=0, x=0, y=0) if technology == "pano2vr"
+                else pattern.format(column=group, level=0, x=0, y=0))
+        urls.append(("tile", base_url + path))
+    return urls
+
+
+def main():
+    year = sys.argv[1] if len(sys.argv) > 1 else "2026"
+    view_type = sys.argv[2] if len(sys.argv) > 2 else "exterior"
+    tiles = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    extractor = HondaSeleniumExtractor()
+    if not extractor.setup_driver():
+        print("❌ No hay navegador disponible (Chrome/Edge)")
+        return
+
+    def run_legacy(asset: str, url: str):
+        # Variante anterior: navegación + sleep fijo
+        started = time.monotonic()
+        extractor.driver.get(url)
+        time.sleep(LEGACY_SLEEPS[asset])
+        legacy.append((asset, time.monotonic() - started))
+
+    legacy = []
+    try:
+        urls = asset_urls(year, view_type, tiles)
+        for i, (asset, url) in enumerate(urls):
+            # Calentar cache/conexión: ninguna variante paga la primera carga
+            extractor.driver.get(url)
+            # Variante actual: navegación + espera por condición (queda en extractor.timings)
+            variants = [lambda: run_legacy(asset, url), lambda: extractor._load_and_wait(asset, url)]
+            for run in (variants if i % 2 == 0 else reversed(variants)):
+                run()
+    finally:
+        extractor.cleanup_driver()
+        browser_pool.close()
+
+    report = timing_report(extractor.timings)
+    measured = {}
+    for asset, seconds in legacy:
+        measured.setdefault(asset, []).append(seconds)
+
+    print(f"⏱️  Honda City {year} {view_type}: {len(urls)} navegaciones medidas por variante")
+    print(f"{'asset':<12} {'n':>3} {'sleep fijo':>12} {'condición':>12} {'ahorro':>10}")
+    for asset, entry in report["assets"].items():
+        old = sum(measured[asset]) / len(measured[asset])
+        print(f"{asset:<12} {entry['count']:>3} {old:>11.3f}s {entry['avg_seconds']:>11.3f}s "
+              f"{old - entry['avg_seconds']:>9.3f}s")
+    old_total = sum(seconds for _, seconds in legacy)
+    print(f"Total: {old_total:.2f}s con sleeps fijos vs {report['total_seconds']:.2f}s con esperas "
+          f"por condición ({old_total / max(report['total_seconds'], 0.001):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: plan de tiles como lista de TileInfo (pydantic) vs TilePlan
+(arrays columnares). Mide tiempo de construcción y memoria asignada para
+todos los niveles de todos los años/vistas conocidos.
+
+Uso: python benchmark_tile_plan.py [repeticiones]
+"""
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+from app.models.honda import ConfigInfo, TileInfo
+from app.services.tile_plan import build_tile_plan, level_grid, tile_groups
+from app.utils.patterns import (
+    get_honda_images_base_url,
+    get_honda_config_url,
+    TILE_PATTERNS,
+    RESOLUTIONS
+)
+
+
+def synthetic_config(year: str, view_type: str) -> ConfigInfo:
+    """ConfigInfo equivalente al XML real (resoluciones conocidas, sin red)"""
+    technology = "object2vr" if view_type == "exterior" else "pano2vr"
+    sizes = RESOLUTIONS[year][view_type]
+    return ConfigInfo(
+        url=get_honda_config_url(year, view_type),
+        content="",
+        technology=technology,
+        columns=TILE_PATTERNS["object2vr"]["columns"] if technology == "object2vr" else None,
+        faces=TILE_PATTERNS["pano2vr"]["faces"] if technology == "pano2vr" else None,
+        levels=len(sizes),
+        max_resolution=sizes[0],
+        tile_pattern=TILE_PATTERNS[technology]["pattern"],
+        level_sizes=sizes,
+        tile_size=TILE_PATTERNS[technology]["tile_size"]
+    )
+
+
+def build_tile_list(year: str, view_type: str, config: ConfigInfo):
+    """Implementación anterior: un TileInfo con su URL por cada tile"""
+    base_url = get_honda_images_base_url(year, view_type)
+    pattern = TILE_PATTERNS[config.technology]["pattern"]
+    is_object = config.technology == "object2vr"
+    tiles = []
+    for level in range(config.levels):
+        tiles_x, tiles_y = level_grid(year, view_type, config, level)
+        for group in range(tile_groups(config)):
+            for y in range(tiles_y):
+                for x in range(tiles_x):
+                    if is_object:
+                        path = pattern.format(column=group, level=level, x=x, y=y)
+                    else:
+                        path = pattern.format(face=group, level=level, x=x, y=y)
+                    tiles.append(TileInfo(
+                        url=base_url + path,
+                        level=level,
+                        column=group if is_object else None,
+                        face=None if is_object else group,
+                        x=x,
+                        y=y
+                    ))
+    return tiles
+
+
+def measure(label: str, builder, catalogs, repeat: int):
+    """Tiempo medio de construcción y pico de memoria de un plan completo"""
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plans = [builder(year, view_type, config) for year, view_type, config in catalogs]
+        elapsed.append(time.perf_counter() - start)
+        del plans
+
+    tracemalloc.start()
+    plans = [builder(year, view_type, config) for year, view_type, config in catalogs]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(len(plan) for plan in plans)
+    avg = sum(elapsed) / len(elapsed)
+    print(f"{label:<16} tiles={total:>7}  tiempo={avg * 1000:9.2f} ms  "
+          f"memoria={peak / (1024 * 1024):8.2f} MB  ({peak / total:6.1f} B/tile)")
+    return avg, peak
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    catalogs = [
+        (year, view_type, synthetic_config(year, view_type))
+        for year in RESOLUTIONS
+        for view_type in RESOLUTIONS[year]
+    ]
+
+    print(f"📐 Catálogos: {len(catalogs)} (todos los niveles), repeticiones: {repeat}")
+    list_time, list_mem = measure("List[TileInfo]", build_tile_list, catalogs, repeat)
+    plan_time, plan_mem = measure("TilePlan", build_tile_plan, catalogs, repeat)
+
+    print(f"⚡ Construcción: {list_time / plan_time:.1f}x más rápida")
+    print(f"💾 Memoria: {list_mem / plan_mem:.1f}x menor")
+
+    # Verificar que ambos planes describen exactamente los mismos tiles
+    for year, view_type, config in catalogs:
+        plan = build_tile_plan(year, view_type, config)
+        assert [t.url for t in build_tile_list(year, view_type, config)] == [plan.url(i) for i in plan.indices()]
+    print("✅ Mismas URLs en el mismo orden")
+
+
+if __name__ == "__main__":
+    main()
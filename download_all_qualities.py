@@ -4,11 +4,18 @@ Script para descargar las 3 calidades de Honda City 2026 Interior
 """
 
 import asyncio
+import sys
 import requests
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import time
 
+# Plan de tiles compartido con el backend (derivado del pano.xml real)
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+from app.services.honda_service import parse_config
+from app.services.tile_plan import build_tile_plan, plan_levels
+from app.utils.patterns import get_honda_config_url
+
 def download_quality(quality_level: int):
     """Descargar una calidad específica"""
     
@@ -32,24 +39,22 @@ def download_quality(quality_level: int):
     system_base.mkdir(parents=True, exist_ok=True)
     (system_base / "images").mkdir(parents=True, exist_ok=True)
     
-    # Generar lista de archivos
-    files_to_download = []
-    
-    # Tiles del interior (6 caras x 2 niveles x 2 columnas x 2 tiles = 48 archivos)
-    for cf in range(6):  # cf_0 a cf_5
-        for l in [1, 2]:  # l_1 y l_2
-            for c in range(2):  # c_0 y c_1
-                for tile in range(2):  # tile_0.jpg y tile_1.jpg
-                    file_path = f"tiles/node1/cf_{cf}/l_{l}/c_{c}/tile_{tile}.jpg"
-                    files_to_download.append(file_path)
-    
-    print(f"📋 Total archivos: {len(files_to_download)}")
-    
     # Headers
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
     }
     
+    # Generar lista de archivos desde la configuración real (grilla exacta por nivel)
+    config_url = get_honda_config_url(year, view_type)
+    config_response = requests.get(config_url, headers=headers, timeout=15)
+    config_response.raise_for_status()
+    config = parse_config(config_response.text, config_url)
+    
+    levels = plan_levels(config, quality_level)
+    tile_plan = build_tile_plan(year, view_type, config, levels)
+    
+    print(f"📋 Total archivos: {len(tile_plan)} (niveles {levels})")
+    
     def download_file(file_info):
         file_path, index = file_info
         try:
@@ -87,19 +92,30 @@ def download_quality(quality_level: int):
     failed = 0
     skipped = 0
     
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        file_list = [(file, i) for i, file in enumerate(files_to_download)]
-        results = executor.map(download_file, file_list)
-        
-        for result in results:
-            if result['status'] == 'success':
-                downloaded += 1
-                if downloaded % 10 == 0:
-                    print(f"   📊 Progreso: {downloaded} descargados")
-            elif result['status'] == 'skip':
-                skipped += 1
-            else:
-                failed += 1
+    def count(result):
+        nonlocal downloaded, failed, skipped
+        if result['status'] == 'success':
+            downloaded += 1
+            if downloaded % 10 == 0:
+                print(f"   📊 Progreso: {downloaded} descargados")
+        elif result['status'] == 'skip':
+            skipped += 1
+        else:
+            failed += 1
+    
+    # Ventana acotada de futures: el plan se recorre perezosamente en vez de
+    # crear un future por archivo de golpe
+    max_workers = 4
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for i in tile_plan.indices():
+            pending.add(executor.submit(download_file, (tile_plan.relative_path(i), i)))
+            if len(pending) >= max_workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    count(future.result())
+        for future in pending:
+            count(future.result())
     
     print(f"\n📊 CALIDAD {quality_level} COMPLETADA:")
     print(f"   ✅ Descargados: {downloaded}")
@@ -5,12 +5,18 @@ Recrear el proceso original de descubrimiento automático
 """
 
 import requests
+import sys
 import threading
 import time
 from pathlib import Path
 import json
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+# Limitador por origen compartido con el backend (mismos presupuestos que el endpoint admin)
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+from app.services.rate_limit import OriginRateLimiter, RATE_LIMITS_PATH
+
 class HondaDiscovery:
     def __init__(self):
         self.session = requests.Session()
@@ -28,12 +34,15 @@ class HondaDiscovery:
         
         self.found_files = []
         self.working_base_urls = []
+        # Token bucket requests/s + bytes/s por host (reemplaza los sleeps fijos)
+        self.limiter = OriginRateLimiter.load(BACKEND_DIR / RATE_LIMITS_PATH)
         
-    def test_url(self, url, delay=0.1):
+    def test_url(self, url):
         """Probar una URL específica con evasión de bloqueos"""
         try:
-            time.sleep(delay)  # Anti-rate limiting
+            self.limiter.acquire_request_sync(url)  # Anti-rate limiting
             response = self.session.get(url, timeout=10)
+            self.limiter.consume_bytes_sync(url, len(response.content))
             
             if response.status_code == 200 and len(response.content) > 0:
                 print(f"✅ ENCONTRADO: {url} ({len(response.content)} bytes)")
@@ -96,7 +105,7 @@ class HondaDiscovery:
             success_count = 0
             
             for test_file in test_files:
-                if self.test_url(f"{base_url}/{test_file}", 0.2):
+                if self.test_url(f"{base_url}/{test_file}"):
                     success_count += 1
             
             if success_count > 0:
@@ -127,7 +136,7 @@ class HondaDiscovery:
                         for c in range(3):   # Hasta 3 columnas por cara
                             for tile in range(3):  # Hasta 3 tiles por columna
                                 tile_url = f"{base_url}/tiles/node1/cf_{cf}/l_{l}/c_{c}/tile_{tile}.jpg"
-                                future = executor.submit(self.test_url, tile_url, 0.1)
+                                future = executor.submit(self.test_url, tile_url)
                                 futures.append((future, tile_url))
                 
                 for future, url in futures:
@@ -146,7 +155,7 @@ class HondaDiscovery:
                         for y in range(2):   # Hasta 2 filas
                             for x in range(2):   # Hasta 2 tiles por celda
                                 tile_url = f"{base_url}/tiles/c{c}_l{l}_{y}_{x}.jpg"
-                                future = executor.submit(self.test_url, tile_url, 0.1)
+                                future = executor.submit(self.test_url, tile_url)
                                 futures.append((future, tile_url))
                 
                 for future, url in futures:
@@ -176,7 +185,7 @@ class HondaDiscovery:
         
         for asset in asset_files:
             asset_url = f"{base_url}/{asset}"
-            if self.test_url(asset_url, 0.2):
+            if self.test_url(asset_url):
                 found_assets.append(asset_url)
         
         print(f"📊 Total assets encontrados: {len(found_assets)}")